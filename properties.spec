@@ -0,0 +1,15 @@
+# Runtime verification properties, checked by `python manage.py verify`
+# See runtime_verification/spec.py for the format
+
+# The names are those the properties had before they were written here, the Verification table keeps them
+name: It is never the case that The number of items is over the capacity holds
+pattern: absence
+event: max_conveyor > 5
+
+name: It is always the case that Items entering the system are one of red, white, yellow, blue holds
+pattern: universality
+event: items_except(1, 2, 3, 4) == 0
+
+name: Total number of items in the system reaches ”1 holds eventually
+pattern: existence
+event: total >= 1
@@ -1,35 +1,36 @@
 import json
-import random
+from array import array
 from datetime import datetime, timedelta
 
-import requests
+from django.http import HttpResponse, StreamingHttpResponse
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from warehouse_cloud.settings import settings
 
-from . import models, warehouse
-from .models import Sensory, Inventory, Order, Message, Status
-
-# Experiment Variables
-experiment_type = 'SAS'
-dm_type = 'ORL'
-target = warehouse.Warehouse(True)
+from . import edge, models, outbox, timeseries
+from .models import Sensory, Order, Message, Status
+from .warehouses import warehouses
 
 # Serializer
 class SensoryListSerializer(serializers.ListSerializer):
     def create(self, validated_data):
-        sensory_data_list = [Sensory(**item) for item in validated_data]
-        return Sensory.objects.bulk_create(sensory_data_list)
+        timeseries.append(validated_data)
+        return [Sensory(**item) for item in validated_data]
 
 
 class SensorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Sensory
-        fields = '__all__'
+        # Readings are appended to segments and have no row of their own
+        fields = ['sensorID', 'value', 'datetime']
         list_serializer_class = SensoryListSerializer
 
+    def create(self, validated_data):
+        timeseries.append([validated_data])
+        return Sensory(**validated_data)
+
 
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -63,17 +64,140 @@ class SensoryViewSet(viewsets.ModelViewSet):
     time_parameter = openapi.Parameter('time', openapi.IN_QUERY, description="search time limitation in minutes",
                                        required=False, type=openapi.TYPE_INTEGER)
 
-    @swagger_auto_schema(manual_parameters=[sensorID_parameter, time_parameter])
+    cursor_parameter = openapi.Parameter('cursor', openapi.IN_QUERY,
+                                         description="return the points after this cursor (from 'next')",
+                                         required=False, type=openapi.TYPE_STRING)
+    limit_parameter = openapi.Parameter('limit', openapi.IN_QUERY, description="maximum number of points",
+                                        required=False, type=openapi.TYPE_INTEGER)
+    layout_parameter = openapi.Parameter('layout', openapi.IN_QUERY,
+                                         description="rows, columnar (timestamp/value arrays) or binary "
+                                                     "(float64 timestamp, value pairs)",
+                                         required=False, type=openapi.TYPE_STRING,
+                                         enum=['rows', 'columnar', 'binary'])
+    stream_parameter = openapi.Parameter('stream', openapi.IN_QUERY, description="stream the response",
+                                         required=False, type=openapi.TYPE_BOOLEAN)
+
+    @swagger_auto_schema(manual_parameters=[sensorID_parameter, time_parameter, cursor_parameter, limit_parameter,
+                                            layout_parameter, stream_parameter])
     def list(self, request, *args, **kwargs):
         sensorID = request.query_params.get('sensorID')
-        queryset = self.queryset.filter(sensorID__exact=sensorID)
-
-        if request.query_params.get('date'):
-            queryset = queryset.filter(
-                datetime__gt=datetime.now() - timedelta(minutes=int(request.query_params.get('time'))))
-
-        serializer = SensorySerializer(queryset, many=True)
-        return Response(serializer.data)
+        start = None
+        if request.query_params.get('time'):
+            start = datetime.now() - timedelta(minutes=int(request.query_params.get('time')))
+
+        cursor = request.query_params.get('cursor')
+        try:
+            after = timeseries.parse_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response("Invalid cursor", status=400)
+        limit = int(request.query_params['limit']) if request.query_params.get('limit') else None
+        layout = request.query_params.get('layout', 'rows')
+        if layout not in ('rows', 'columnar', 'binary'):
+            return Response("Invalid layout", status=400)
+
+        chunks = timeseries.page(sensorID, start, after, limit)
+
+        if request.query_params.get('stream') in ('1', 'true', 'True'):
+            if layout == 'binary':
+                return StreamingHttpResponse(self.stream_binary(chunks), content_type='application/octet-stream')
+            if layout == 'columnar':
+                return StreamingHttpResponse(self.stream_columnar(chunks), content_type='application/x-ndjson')
+            return StreamingHttpResponse(self.stream_rows(sensorID, chunks), content_type='application/json')
+
+        timestamps = array('d')
+        values = array('d')
+        for chunk_timestamps, chunk_values in chunks:
+            timestamps.extend(chunk_timestamps)
+            values.extend(chunk_values)
+
+        next_cursor = None
+        if limit is not None and len(timestamps) == limit and limit > 0:
+            next_cursor = timeseries.next_cursor(timestamps, after)
+
+        if layout == 'binary':
+            response = HttpResponse(timeseries.interleave(timestamps, values),
+                                    content_type='application/octet-stream')
+            response['X-Count'] = len(timestamps)
+            if next_cursor is not None:
+                response['X-Next-Cursor'] = next_cursor
+            return response
+
+        if layout == 'columnar':
+            data = {'sensorID': sensorID, 'timestamp': timestamps.tolist(), 'value': values.tolist()}
+        else:
+            data = [{'sensorID': sensorID, 'value': value, 'datetime': datetime.fromtimestamp(timestamp)}
+                    for timestamp, value in zip(timestamps, values)]
+
+        if cursor is None and limit is None:
+            return Response(data)
+        return Response({'results': data, 'next': next_cursor})
+
+    start_parameter = openapi.Parameter('start', openapi.IN_QUERY, description="window start (epoch seconds)",
+                                        required=False, type=openapi.TYPE_NUMBER)
+    end_parameter = openapi.Parameter('end', openapi.IN_QUERY, description="window end (epoch seconds)",
+                                      required=False, type=openapi.TYPE_NUMBER)
+    method_parameter = openapi.Parameter('method', openapi.IN_QUERY,
+                                         description="buckets (min/max/mean/count per bucket) or lttb",
+                                         required=False, type=openapi.TYPE_STRING, enum=['buckets', 'lttb'])
+    bucket_parameter = openapi.Parameter('bucket', openapi.IN_QUERY, description="bucket size in seconds",
+                                         required=False, type=openapi.TYPE_INTEGER)
+    points_parameter = openapi.Parameter('points', openapi.IN_QUERY, description="number of points for lttb",
+                                         required=False, type=openapi.TYPE_INTEGER)
+
+    @swagger_auto_schema(manual_parameters=[sensorID_parameter, time_parameter, start_parameter, end_parameter,
+                                            method_parameter, bucket_parameter, points_parameter])
+    @action(detail=False, methods=['get'])
+    def aggregate(self, request, *args, **kwargs):
+        sensorID = request.query_params.get('sensorID')
+        start = None
+        end = None
+        if request.query_params.get('time'):
+            start = datetime.now() - timedelta(minutes=int(request.query_params.get('time')))
+        if request.query_params.get('start'):
+            start = datetime.fromtimestamp(float(request.query_params['start']))
+        if request.query_params.get('end'):
+            end = datetime.fromtimestamp(float(request.query_params['end']))
+
+        method = request.query_params.get('method', 'buckets')
+        if method == 'lttb':
+            points = int(request.query_params.get('points', 1000))
+            timestamps, values = timeseries.lttb(*timeseries.load(sensorID, start, end), points)
+            return Response({'sensorID': sensorID, 'timestamp': timestamps.tolist(), 'value': values.tolist()})
+
+        if method != 'buckets':
+            return Response("Invalid method", status=400)
+
+        bucket = int(request.query_params.get('bucket', 60))
+        if bucket <= 0:
+            return Response("Invalid bucket", status=400)
+
+        result = timeseries.aggregate(sensorID, bucket, start, end)
+        data = {'sensorID': sensorID, 'bucket': bucket}
+        for key, column in result.items():
+            data[key] = column.tolist()
+        return Response(data)
+
+    @staticmethod
+    def stream_rows(sensorID, chunks):
+        separator = '['
+        for timestamps, values in chunks:
+            rows = [json.dumps({'sensorID': sensorID, 'value': value,
+                                'datetime': datetime.fromtimestamp(timestamp).isoformat()})
+                    for timestamp, value in zip(timestamps, values)]
+            yield separator + ','.join(rows)
+            separator = ','
+
+        yield '[]' if separator == '[' else ']'
+
+    @staticmethod
+    def stream_columnar(chunks):
+        for timestamps, values in chunks:
+            yield json.dumps({'timestamp': timestamps.tolist(), 'value': values.tolist()}) + '\n'
+
+    @staticmethod
+    def stream_binary(chunks):
+        for timestamps, values in chunks:
+            yield timeseries.interleave(timestamps, values)
 
 
 # Customer View
@@ -84,41 +208,38 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(responses={400: "Bad Request", 204: "System is not running"})
     def create(self, request, *args, **kwargs):
-        if len(Status.objects.all()) == 0:
-            current_state = Status()
-        else:
-            current_state = Status.objects.all()[0]
-
-        if not current_state.status:
+        warehouse_id = int(request.data.get('warehouse', 0))
+        if not is_running(warehouse_id):
             return Response("System is not running", status=204)
 
-        response = super().create(request, *args, **kwargs)
-        order_data = Order.objects.filter(id=response.data['id'])[0]
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        order_message = {'sender': models.CLOUD,
-                         'title': 'Order Created',
-                         'msg': json.dumps(response.data)}
+        def handler(target):
+            order_data = serializer.save()
+            order_message = {'warehouse': warehouse_id,
+                             'sender': models.CLOUD,
+                             'title': 'Order Created',
+                             'msg': json.dumps(serializer.data)}
+
+            order_data.status = target.place_order(target.state.add_order(order_data), target.experiment_type)
+            if order_data.status == 2:
+                outbox.enqueue([edge.REPOSITORY, edge.SHIPMENT], order_message)
+            else:
+                outbox.enqueue([edge.SHIPMENT], order_message)
+            return order_data
+
+        serializer = OrderSerializer(warehouses.run(warehouse_id, handler))
+        return Response(serializer.data, status=201)
 
-        item_type = response.data['item_type']
-        shipment_ready = len(Inventory.objects.filter(item_type=item_type, stored=3))
-        order_shipment = Order.objects.filter(item_type=item_type, status=3)
 
-        if experiment_type == 'SAS':
-            for i in range(3):
-                rep = Inventory.objects.filter(stored=i)
-                if target.stuck[i] and rep[0].item_type == item_type:
-                    shipment_ready += 1
+def is_running(warehouse_id):
+    return Status.objects.filter(warehouse=warehouse_id, status=True).exists()
 
-        if shipment_ready <= len(order_shipment):
-            requests.post(settings['edge_repository_address'] + '/api/message/', data=order_message)
-            order_data.status = 2
-        else:
-            order_data.status = 3
-        order_data.save()
 
-        requests.post(settings['edge_shipment_address'] + '/api/message/', data=order_message)
-        serializer = OrderSerializer(order_data)
-        return Response(serializer.data, status=201)
+def set_running(warehouse_id, status):
+    if Status.objects.filter(warehouse=warehouse_id).update(status=status) == 0:
+        Status.objects.create(warehouse=warehouse_id, status=status)
 
 
 class MessageViewSet(viewsets.ModelViewSet):
@@ -128,44 +249,29 @@ class MessageViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(responses={400: "Bad request", 204: "Invalid Message Title / Invalid Message Sender"})
     def create(self, request, *args, **kwargs):
-        global experiment_type, dm_type, target
         super().create(request, *args, **kwargs)
+        warehouse_id = int(request.data.get('warehouse', 0))
         sender = int(request.data['sender'])
         title = request.data['title']
 
         if sender == models.USER:
             if title == 'Start' or title == 'Stop':
                 msg = json.loads(request.data['msg'])
-                if len(Status.objects.all()) == 0:
-                    current_state = Status()
-                else:
-                    current_state = Status.objects.all()[0]
 
                 if title == 'Start':
-                    experiment_type = msg['experiment_type']
-
-                    current_state.status = True
-                    Inventory.objects.all().delete()
-                    Order.objects.all().delete()
-
-                    if experiment_type == 'SAS':
-                        dm_type = msg['dm_type']
-                        if dm_type == 'AAAA':
-                            target = warehouse.Warehouse(True)
-                        else:
-                            target = warehouse.Warehouse(False)
+                    # The decision mode only changes for SAS experiments
+                    dm_type = msg['dm_type'] if msg['experiment_type'] == 'SAS' else None
+                    target = warehouses.start(warehouse_id, msg['experiment_type'], dm_type)
+                    set_running(warehouse_id, True)
 
                 elif title == 'Stop':
-                    current_state.status = False
-
-                current_state.save()
+                    target = warehouses.run(warehouse_id, self.stop)
 
-                start_message = {'sender': models.CLOUD,
+                start_message = {'warehouse': warehouse_id,
+                                 'sender': models.CLOUD,
                                  'title': title,
-                                 'msg': experiment_type}
-                requests.post(settings['edge_classification_address'] + '/api/message/', data=start_message)
-                requests.post(settings['edge_repository_address'] + '/api/message/', data=start_message)
-                requests.post(settings['edge_shipment_address'] + '/api/message/', data=start_message)
+                                 'msg': target.experiment_type}
+                outbox.enqueue(edge.ALL, start_message)
 
                 return Response(status=201)
 
@@ -174,303 +280,106 @@ class MessageViewSet(viewsets.ModelViewSet):
                 anomaly_0 = False if int(msg['anomaly_0']) == 0 else True
                 anomaly_2 = False if int(msg['anomaly_2']) == 0 else True
 
-                num_orders = len(Order.objects.all()) - len(Order.objects.filter(status=4))
-                if num_orders == 0 and target.tick > target.order_total:
-                    result = {
-                        'tick': target.tick,
-                        'reward': target.reward,
-                        'alert': "ended"
-                    }
-                    current_state = Status.objects.all()[0]
-                    current_state.status = False
-                    current_state.save()
-
-                    start_message = {'sender': models.CLOUD,
-                                     'title': "Stop",
-                                     'msg': experiment_type}
-                    requests.post(settings['edge_classification_address'] + '/api/message/', data=start_message)
-                    requests.post(settings['edge_repository_address'] + '/api/message/', data=start_message)
-                    requests.post(settings['edge_shipment_address'] + '/api/message/', data=start_message)
-
-                    return Response(result, status=201)
-
-                target.reward -= num_orders * target.reward_wait
-                target.tick += 1
-
-                # ORL
-                if dm_type == 'ORL' and target.old_state is not None:
-                    target.rl_model.push_optimize(target.old_state, target.old_decision,
-                                                  target.reward - target.old_reward, target.get_state())
-                    target.old_state = None
-                    target.old_reward = target.reward
-
-                # New anomaly
-                if target.current_anomaly[0] == -1 and anomaly_0:
-                    target.current_anomaly[0] = target.tick
-                if target.current_anomaly[2] == -1 and anomaly_2:
-                    target.current_anomaly[2] = target.tick
-
-                # Move c to r
-                c_decision = 3
-                # Decision making
-                if target.need_decision():
-                    if dm_type == 'Random':
-                        candidate = target.get_available()
-                        if len(candidate) != 0:
-                            c_decision = random.choice(candidate)
-                    else:
-                        target.old_state = target.get_state()
-                        model = target.rl_model
-                        if target.anomaly_state() != 0 and dm_type == 'AAAA':
-                            if target.current_anomaly[0] != -1:
-                                model = target.a_rl_models[0]
-                            else:
-                                model = target.a_rl_models[2]
-                        target.old_decision = model.select_tactic(target.get_state(), target.available())
-                        c_decision = int(target.old_decision)
-
-                elif target.recent_c != 0:
-                    avail = target.get_available()
-                    if len(avail) != 0:
-                        c_decision = avail[0]
-
-                # R to S
-                r_decision = [False] * 3
-                s_items = Inventory.objects.filter(stored=3)
-                shipment_cap = target.cap_conveyor - len(s_items) - target.stuck.count(True)
-                for i in [1, 0, 2]:
-                    inventory_list = Inventory.objects.filter(stored=i)
-                    if not target.stuck[i] and len(inventory_list) != 0 and shipment_cap > 0:
-                        target_item = inventory_list[0]
-                        orders = Order.objects.filter(item_type=target_item.item_type, status=2).order_by('made')
-                        if len(orders) != 0:
-                            r_decision[i] = True
-                            shipment_cap -= 1
-                            target.r_wait[i] = 0
-                            orders[0].status = 3
-                            orders[0].save()
-                        elif target.r_wait[i] > target.cap_wait:
-                            r_decision[i] = True
-                            shipment_cap -= 1
-                            target.r_wait[i] = 0
-                        else:
-                            target.r_wait[i] += 1
-
-                # Make stuck
-                for i in [0, 2]:
-                    if target.current_anomaly[i] != -1 and r_decision[i] and target.stuck[i] == 0:
-                        target.stuck[i] = True
-                        r_decision[i] = False
-                        target.count[i] += 1
-
-                    elif target.current_anomaly[i] != -1 and target.stuck[i] and target.count[i] < target.anomaly_wait:
-                        target.count[i] += 1
-
-                    elif target.current_anomaly[i] != -1 and target.stuck[i] and target.count[i] == target.anomaly_wait:
-                        target.count[i] = 0
-                        r_decision[i] = True
-                        target.stuck[i] = False
-
-                # Solve anomaly
-                for i in [0, 2]:
-                    if target.current_anomaly[i] != -1 and target.current_anomaly[i] + target.anomaly_duration < target.tick:
-                        if target.stuck[i]:
-                            r_decision[i] = True
-                            target.stuck[i] = False
-                        target.count[i] = 0
-                        target.current_anomaly[i] = -1
-
-                # s
-                s_decision = 3
-                if target.recent_s != 0:
-                    target_item = Inventory.objects.filter(item_type=target.recent_s, stored=3)[0]
-                    orders = Order.objects.filter(item_type=target_item.item_type, status=3).order_by('made')
-                    if len(orders) != 0:
-                        s_decision = orders[0].dest
-                        target.s_wait = 0
-                    elif target.s_wait > target.cap_wait:
-                        s_decision = -1
-                        target.s_wait = 0
-                    else:
-                        target.s_wait += 1
-
-                # Request Item
-                request = ''
-                for i in range(1, 5):
-                    need = len(Order.objects.filter(item_type=i)) - len(Order.objects.filter(item_type=i, status=4))
-                    if target.get_inventory(i) < need:
-                        target.c[i - 1] += target.item_buy
-                        request += str(i) + ' &'
-
-                inventories = []
-                for i in range(4):
-                    items = Inventory.objects.filter(stored=i).order_by('updated')
-                    ans = ''
-                    for item in items:
-                        ans += str(item.item_type) + ','
-                    inventories.append(ans)
-
-                result = {
-                    'tick': target.tick - 1,
-                    'reward': target.reward,
-                    'request': request,
-                    'recent_c': target.recent_c,
-                    'c_decision': c_decision,
-                    'r_decision': r_decision,
-                    's_decision': s_decision,
-                    'anomaly_0': 1 if target.current_anomaly[0] != -1 else 0,
-                    'anomaly_2': 1 if target.current_anomaly[2] != -1 else 0,
-                    'stuck_0': 1 if target.stuck[0] else 0,
-                    'stuck_2': 1 if target.stuck[2] else 0,
-                    'inventory_0': inventories[0],
-                    'inventory_1': inventories[1],
-                    'inventory_2': inventories[2],
-                    'inventory_3': inventories[3],
-                    'order_r_1': len(Order.objects.filter(item_type=1, status=2)),
-                    'order_r_2': len(Order.objects.filter(item_type=2, status=2)),
-                    'order_r_3': len(Order.objects.filter(item_type=3, status=2)),
-                    'order_r_4': len(Order.objects.filter(item_type=4, status=2)),
-                    'order_s_1': len(Order.objects.filter(item_type=1, status=3)),
-                    'order_s_2': len(Order.objects.filter(item_type=2, status=3)),
-                    'order_s_3': len(Order.objects.filter(item_type=3, status=3)),
-                    'order_s_4': len(Order.objects.filter(item_type=4, status=3))
-                }
-
-                target.c_allow = c_decision
-                target.r_allow = r_decision
-                target.s_allow = s_decision
-
-                return Response(result, status=201)
+                def handler(target):
+                    result = target.process(anomaly_0, anomaly_2, target.dm_type)
+                    if result.get('alert') == "ended":
+                        self.stop(target)
 
-            return Response("Invalid Message Title", status=204)
-
-        elif sender == models.EDGE_CLASSIFICATION:
-            if title == 'Classification Processed':
-                msg = json.loads(request.data['msg'])
-                item_type = int(msg['item_type'])
-                stored = int(msg['stored'])
-
-                target.c_allow = 3
-                target.recent_c = 0
-
-                # Modify Inventory DB
-                target_item = Inventory(item_type=item_type, stored=stored)
-                target_item.save()
-                if target.c[item_type - 1] != 0:
-                    target.c[item_type - 1] -= 1
-
-                return Response(status=201)
-
-            elif title == 'SAS Check':
-                target.recent_c = int(request.data['msg'])
-
-                if target.c_allow == 3:
-                    return Response(status=204)
+                        start_message = {'warehouse': warehouse_id,
+                                         'sender': models.CLOUD,
+                                         'title': "Stop",
+                                         'msg': target.experiment_type}
+                        outbox.enqueue(edge.ALL, start_message)
+                    return result
 
-                selected_tactic = target.c_allow
-                return Response(int(selected_tactic), status=201)
+                return Response(warehouses.run(warehouse_id, handler), status=201)
 
             return Response("Invalid Message Title", status=204)
 
-        elif sender == models.EDGE_REPOSITORY:
-            if title == 'Order Processed':
-                stored = int(request.data['msg'])
-                target.r_allow[stored] = False
+        status, data = handle_edge(warehouse_id, sender, title, request.data['msg'])
+        return Response(data, status=status)
 
-                # Modify Inventory DB
-                target_item = Inventory.objects.filter(stored=stored)[0]
-                target_item.stored = models.SHIPMENT
-                target_item.save()
+    @staticmethod
+    def stop(target):
+        target.state.flush()
+        set_running(target.state.warehouse, False)
+        return target
 
-                # Modify Order DB
-                if experiment_type != 'SAS':
-                    target_orders = Order.objects.filter(item_type=target_item.item_type, status=2)
-                    if len(target_orders) != 0:
-                        target_orders[0].status = 3
-                        target_orders[0].save()
 
-                return Response(status=201)
+def shipment_check(warehouse_id, recent_s, record=False):
+    # The check moves the item to the shipment conveyor when it is still in the repository. Callers that do not
+    # store every check record the ones that moved an item, so the message log keeps every change of the inventory
+    def handler(target):
+        shipment = len(target.state.conveyor(models.SHIPMENT))
+        tactic = target.shipment_check(recent_s)
+        if record and len(target.state.conveyor(models.SHIPMENT)) != shipment:
+            Message.objects.create(warehouse=warehouse_id, sender=models.EDGE_SHIPMENT, title='SAS Check',
+                                   msg=str(recent_s))
+        return tactic
+    return handler
 
-            elif title == 'SAS Check':
-                location = int(request.data['msg'])
-                if not target.r_allow[location]:
-                    return Response(status=204)
 
-                return Response(status=201)
+def handle_edge(warehouse_id, sender, title, msg, record_checks=False):
+    # Edge messages, from the message API or an edge channel; returns the status and the answer
+    if sender == models.EDGE_CLASSIFICATION:
+        if title == 'Classification Processed':
+            msg = json.loads(msg)
+            item_type = int(msg['item_type'])
+            stored = int(msg['stored'])
 
-            elif title == 'Anomaly Occurred':
-                location = int(request.data['msg'])
-                return Response(status=201)
+            warehouses.run(warehouse_id, lambda target: target.classification_processed(item_type, stored))
+            return 201, None
 
-            elif title == 'Anomaly Solved':
-                location = int(request.data['msg'])
-                return Response(status=201)
+        elif title == 'SAS Check':
+            recent_c = int(msg)
+            selected_tactic = warehouses.run(warehouse_id, lambda target: target.classification_check(recent_c))
+            if selected_tactic == 3:
+                return 204, None
 
-            return Response("Invalid Message Title", status=204)
+            return 201, int(selected_tactic)
 
-        elif sender == models.EDGE_SHIPMENT:
-            if title == 'Order Processed':
-                order_data = json.loads(request.data['msg'])
-                item_type = int(order_data['item_type'])
-                dest = order_data['dest']
-
-                target.s_allow = 3
-                target.recent_s = 0
-
-                # Modify Inventory DB
-                target_item = Inventory.objects.filter(item_type=item_type,
-                                                       stored=models.SHIPMENT).order_by('updated')[0]
-                target_item.stored = models.COMPLETED
-                target_item.save()
-
-                if dest == -1:
-                    target.reward -= target.reward_trash
-                else:
-                    # Modify Order DB
-                    orders = Order.objects.filter(item_type=item_type, dest=dest, status=3)
-                    if len(orders) != 0:
-                        target_order = orders[0]
-                        target_order.status = 4
-                        target_order.save()
-                        target.reward += target.reward_order
+        return 204, "Invalid Message Title"
 
-                return Response(status=201)
+    elif sender == models.EDGE_REPOSITORY:
+        if title == 'Order Processed':
+            stored = int(msg)
+            warehouses.run(warehouse_id, lambda target: target.repository_processed(stored, target.experiment_type))
+            return 201, None
 
-            elif title == 'SAS Check':
-                target.recent_s = int(request.data['msg'])
+        elif title == 'SAS Check':
+            location = int(msg)
+            if not warehouses.run(warehouse_id, lambda target: target.repository_check(location)):
+                return 204, None
 
-                items = Inventory.objects.filter(item_type=target.recent_s,
-                                                 stored=models.SHIPMENT).order_by('updated')
-                if len(items) == 0:
-                    idx = 0
-                    while idx < 5:
-                        rep = Inventory.objects.filter(stored=1).order_by('updated')
-                        if len(rep) > idx and rep[idx].item_type == target.recent_s:
-                            rep[0].stored = 3
-                            rep[0].save()
-                            break
+            return 201, None
 
-                        rep = Inventory.objects.filter(stored=0).order_by('updated')
-                        if len(rep) > idx and rep[idx].item_type == target.recent_s:
-                            rep[0].stored = 3
-                            rep[0].save()
-                            break
+        elif title == 'Anomaly Occurred':
+            location = int(msg)
+            return 201, None
 
-                        rep = Inventory.objects.filter(stored=2).order_by('updated')
-                        if len(rep) > idx and rep[idx].item_type == target.recent_s:
-                            rep[0].stored = 3
-                            rep[0].save()
-                            break
+        elif title == 'Anomaly Solved':
+            location = int(msg)
+            return 201, None
 
-                        idx += 1
+        return 204, "Invalid Message Title"
 
-                if target.s_allow == 3:
-                    return Response(status=204)
+    elif sender == models.EDGE_SHIPMENT:
+        if title == 'Order Processed':
+            order_data = json.loads(msg)
+            item_type = int(order_data['item_type'])
+            dest = int(order_data['dest'])
 
-                selected_tactic = target.s_allow
-                return Response(int(selected_tactic), status=201)
+            warehouses.run(warehouse_id, lambda target: target.shipment_processed(item_type, dest))
+            return 201, None
 
-            return Response("Invalid Message Title", status=204)
+        elif title == 'SAS Check':
+            recent_s = int(msg)
+            selected_tactic = warehouses.run(warehouse_id, shipment_check(warehouse_id, recent_s, record_checks))
+            if selected_tactic == 3:
+                return 204, None
+
+            return 201, int(selected_tactic)
 
-        return Response("Invalid Message Sender", status=204)
+        return 204, "Invalid Message Title"
 
+    return 204, "Invalid Message Sender"
@@ -0,0 +1,78 @@
+import copy
+import logging
+import os
+import threading
+
+import torch
+from torch import optim
+from warehouse_cloud.settings import BASE_DIR, settings
+
+from . import rl
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    def __init__(self, directory, mmap=False):
+        self.directory = directory
+        self.mmap = mmap
+        self.models = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def load_state_dict(self, path):
+        if self.mmap:
+            try:
+                return torch.load(path, map_location=rl.cuda_device, mmap=True)
+            except TypeError:
+                # torch < 2.1 cannot memory-map checkpoints
+                logger.warning('Memory-mapped loading is not supported by torch %s', torch.__version__)
+                self.mmap = False
+        return torch.load(path, map_location=rl.cuda_device)
+
+    def get(self, name):
+        # Read-only inference copy shared by every warehouse, or None if the checkpoint cannot be loaded
+        with self.lock:
+            if name in self.models:
+                return self.models[name]
+            if name in self.errors:
+                return None
+
+            path = os.path.join(self.directory, name + '.pth')
+            try:
+                model = rl.DQN()
+                model.load_state_dict(self.load_state_dict(path))
+            except Exception as e:
+                logger.exception('Loading model %s from %s failed', name, path)
+                self.errors[name] = e
+                return None
+
+            model.eval()
+            for parameter in model.parameters():
+                parameter.requires_grad_(False)
+            self.models[name] = model
+            return model
+
+    def trainable(self, name):
+        # Private copy for a warehouse that keeps training its model
+        shared = self.get(name)
+        if shared is None:
+            return None
+
+        model = copy.deepcopy(shared)
+        for parameter in model.parameters():
+            parameter.requires_grad_(True)
+        model.optimizer = optim.RMSprop(model.parameters())
+        return model
+
+    def reload(self, name=None):
+        with self.lock:
+            if name is None:
+                self.models = {}
+                self.errors = {}
+            else:
+                self.models.pop(name, None)
+                self.errors.pop(name, None)
+
+
+registry = ModelRegistry(os.path.join(BASE_DIR, 'model'), mmap=settings.get('model_mmap', False))
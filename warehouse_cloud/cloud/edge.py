@@ -0,0 +1,44 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from warehouse_cloud.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CLASSIFICATION = 'edge_classification_address'
+REPOSITORY = 'edge_repository_address'
+SHIPMENT = 'edge_shipment_address'
+ALL = [CLASSIFICATION, REPOSITORY, SHIPMENT]
+
+
+class Dispatcher:
+    def __init__(self, timeout=2.0, retries=3, backoff=0.2):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        # One pooled keep-alive connection set shared by every delivery thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(ALL), pool_maxsize=8)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, edge, message, path='/api/message/', **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(settings[edge] + path, timeout=self.timeout, **kwargs)
+                if response.status_code < 500:
+                    return response
+                logger.warning('%s answered %d to %s', edge, response.status_code, message.get('title'))
+            except requests.RequestException as e:
+                logger.warning('Sending %s to %s failed: %s', message.get('title'), edge, e)
+
+            if attempt < self.retries:
+                time.sleep(self.backoff * (2 ** attempt))
+
+        return None
+
+
+dispatcher = Dispatcher(timeout=settings.get('edge_timeout', 2.0), retries=settings.get('edge_retries', 3))
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+from urllib.parse import parse_qs
+
+from . import api, models
+from .warehouses import warehouses
+
+PATH = '/api/check/'
+MAX_WAIT = 30.0
+
+
+class Notifier:
+    def __init__(self):
+        # Long polls waiting for a decision of their warehouse, woken up from the warehouse threads
+        self.waiters = {}
+        self.decisions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, warehouse_id):
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self.lock:
+            self.waiters.setdefault(warehouse_id, set()).add(waiter)
+        return waiter
+
+    def unsubscribe(self, warehouse_id, waiter):
+        with self.lock:
+            self.waiters.get(warehouse_id, set()).discard(waiter)
+
+    def notify(self, warehouse_id):
+        # Runs on the warehouse's thread after a commit, most commits (the checks themselves) decide nothing new
+        target = warehouses.warehouses.get(warehouse_id)
+        if target is None:
+            return
+        current = (target.c_allow, tuple(target.r_allow), target.s_allow)
+        with self.lock:
+            if self.decisions.get(warehouse_id) == current:
+                return
+            self.decisions[warehouse_id] = current
+            waiters = list(self.waiters.get(warehouse_id, ()))
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+
+notifier = Notifier()
+warehouses.listeners.append(notifier.notify)
+
+
+def tactic(allow):
+    return None if allow == 3 else int(allow)
+
+
+def check(warehouse_id, sender, value):
+    # Same answers as the SAS Check message: the tactic, True, or None when nothing may move.
+    # Returns the check and a read of the same decision for a long poll, None for an unknown sender. A check without
+    # a read is run again after every new decision
+    if sender == models.EDGE_CLASSIFICATION:
+        def handler(target):
+            return tactic(target.classification_check(value))
+
+        def read(target):
+            return tactic(target.c_allow)
+    elif sender == models.EDGE_REPOSITORY:
+        def handler(target):
+            return True if target.repository_check(value) else None
+        read = handler
+    elif sender == models.EDGE_SHIPMENT:
+        check_shipment = api.shipment_check(warehouse_id, value, record=True)
+
+        # The check also brings the item from the repository, which may have arrived while the poll waited
+        def handler(target):
+            return tactic(check_shipment(target))
+        read = None
+    else:
+        return None
+    return handler, read
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def respond(send, status, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def parse(scope, body):
+    params = {key: values[0] for key, values in parse_qs(scope['query_string'].decode()).items()}
+    if body:
+        headers = dict(scope['headers'])
+        if headers.get(b'content-type', b'').startswith(b'application/json'):
+            params.update(json.loads(body))
+        else:
+            params.update({key: values[0] for key, values in parse_qs(body.decode()).items()})
+    return params
+
+
+async def handle(scope, receive, send):
+    # SAS Check without the serializer and, unless it moved an item, the Message row. Optionally held open until a
+    # decision is made
+    try:
+        params = parse(scope, await read_body(receive))
+        warehouse_id = int(params.get('warehouse', 0))
+        handlers = check(warehouse_id, int(params['sender']), int(params['msg']))
+        wait = min(float(params.get('wait', 0)), MAX_WAIT)
+    except (KeyError, ValueError):
+        await respond(send, 400, b'"Bad request"')
+        return
+
+    if handlers is None:
+        await respond(send, 204)
+        return
+    handler, read = handlers
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    # Other processes do not wake this one up, so a shared warehouse is read again every second
+    recheck = 1.0 if warehouses.shared else None
+    waiter = notifier.subscribe(warehouse_id)
+    try:
+        # Waiting only looks again after the warehouse made a new decision
+        try:
+            answer = await asyncio.wrap_future(warehouses.future(warehouse_id, handler))
+        except (LookupError, TypeError, ValueError):
+            await respond(send, 400, b'"Bad request"')
+            return
+        while answer is None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(waiter[1].wait(), remaining if recheck is None else min(remaining, recheck))
+            except asyncio.TimeoutError:
+                if recheck is None:
+                    break
+            waiter[1].clear()
+            if read is None:
+                answer = await asyncio.wrap_future(warehouses.future(warehouse_id, handler))
+            else:
+                answer = await asyncio.wrap_future(warehouses.future(warehouse_id, read, readonly=True))
+    finally:
+        notifier.unsubscribe(warehouse_id, waiter)
+
+    if answer is None:
+        await respond(send, 204)
+    elif answer is True:
+        await respond(send, 201)
+    else:
+        await respond(send, 201, json.dumps(answer).encode())
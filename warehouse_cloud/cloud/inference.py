@@ -0,0 +1,84 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+
+import torch
+
+from . import rl
+
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceService:
+    def __init__(self, max_batch=64, max_wait=0.001, timeout=1.0):
+        # Decisions are batched per model object: warehouses share the registry models (Random, AAAA and the
+        # anomaly models), an ORL warehouse decides with its own trainer's copy and is only batched with itself
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+
+        self.requests = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='inference', daemon=True)
+                self.thread.start()
+
+    def select_tactic(self, model, state, available):
+        if not any(available):
+            return None
+
+        self.start()
+        future = Future()
+        self.requests.put((model, state, available, future))
+        try:
+            return torch.LongTensor([[future.result(self.timeout)]]).to(rl.cuda_device)
+        except TimeoutError:
+            # The service is stuck or overloaded, the decision is made in the calling thread instead
+            logger.warning('Batched decision timed out after %.3fs', self.timeout)
+            return model.select_tactic(state, available)
+
+    def collect(self):
+        batch = [self.requests.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.requests.get(timeout=self.max_wait) if self.max_wait > 0
+                             else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+
+            # Concurrent decisions for the same model share one forward pass
+            groups = {}
+            for request in batch:
+                groups.setdefault(id(request[0]), []).append(request)
+
+            for requests in groups.values():
+                try:
+                    self.evaluate(requests)
+                except Exception as e:
+                    for request in requests:
+                        request[3].set_exception(e)
+
+    @staticmethod
+    def evaluate(requests):
+        model = requests[0][0]
+        with torch.inference_mode():
+            states = torch.tensor([request[1] for request in requests], dtype=torch.float32, device=rl.cuda_device)
+            mask = torch.tensor([request[2] for request in requests], dtype=torch.bool, device=rl.cuda_device)
+            selected = rl.masked_argmax(model.model(states), mask).tolist()
+
+        for request, tactic in zip(requests, selected):
+            request[3].set_result(tactic)
+
+
+service = InferenceService()
@@ -0,0 +1,111 @@
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from cloud import api, models
+from cloud.models import Experiment, Inventory, Order
+from cloud.state import WarehouseState
+from cloud.warehouses import build, warehouses
+
+
+def legacy_tick_queries():
+    # The per-tick query pattern before the in-memory state and snapshot
+    len(Order.objects.all()) - len(Order.objects.filter(status=4))
+    for i in range(4):
+        len(Inventory.objects.filter(stored=i))
+        list(Inventory.objects.filter(stored=i).order_by('updated'))
+    for i in range(1, 5):
+        list(Order.objects.filter(item_type=i, status=2).order_by('made')[:1])
+        len(Order.objects.filter(item_type=i)) - len(Order.objects.filter(item_type=i, status=4))
+        len(Inventory.objects.filter(item_type=i, stored__lt=4))
+        len(Order.objects.filter(item_type=i, status=2))
+        len(Order.objects.filter(item_type=i, status=3))
+
+
+def measure(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+class Command(BaseCommand):
+    help = 'Measure Process tick latency while completed inventory and orders accumulate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[0, 10000, 100000, 1000000])
+        parser.add_argument('--ticks', type=int, default=50)
+        parser.add_argument('--batch', type=int, default=10000)
+        parser.add_argument('--explain', action='store_true')
+
+    def handle(self, *args, **options):
+        # Everything is written inside one transaction that is rolled back at the end
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def populate(self, count, batch):
+        made = datetime.now() - timedelta(days=30)
+        while count > 0:
+            size = min(count, batch)
+            Inventory.objects.bulk_create([Inventory(item_type=random.randint(1, 4), stored=models.COMPLETED)
+                                           for _ in range(size)])
+            Order.objects.bulk_create([Order(made=made, completed=made, item_type=random.randint(1, 4),
+                                             dest=random.randint(0, 2), status=Order.STATUS4)
+                                       for _ in range(size)])
+            count -= size
+
+    def run(self, options):
+        Inventory.objects.all().delete()
+        Order.objects.all().delete()
+
+        # A small live warehouse so that every tick has decisions to make
+        for i in range(4):
+            Inventory.objects.bulk_create([Inventory(item_type=random.randint(1, 4), stored=i) for _ in range(3)])
+        Order.objects.bulk_create([Order(item_type=random.randint(1, 4), dest=random.randint(0, 2),
+                                         status=random.choice([Order.STATUS2, Order.STATUS3])) for _ in range(8)])
+
+        Experiment.objects.update_or_create(warehouse=0, defaults={'experiment_type': 'SAS', 'dm_type': 'Random'})
+        # Messages have to see the rows of this transaction
+        warehouses.inline = True
+        view = api.MessageViewSet.as_view({'post': 'create'})
+        factory = APIRequestFactory()
+        process = {'sender': models.USER, 'title': 'Process',
+                   'msg': json.dumps({'anomaly_0': 0, 'anomaly_2': 0})}
+
+        def tick():
+            view(factory.post('/api/message/', process, format='json'))
+
+        self.stdout.write('%10s %10s %10s %10s %10s' % ('history', 'legacy', 'load', 'snapshot', 'tick'))
+        populated = 0
+        for size in sorted(options['sizes']):
+            self.populate(size - populated, options['batch'])
+            populated = size
+
+            legacy = measure(legacy_tick_queries, 5)
+            load = measure(lambda: WarehouseState().load(), 5)
+
+            target = build(0, 'SAS', 'Random')
+            target.state.load()
+            # What the tick reads instead of the database
+            snapshot = measure(target.state.snapshot, 5)
+            warehouses.warehouses[0] = target
+            warehouses.versions[0] = None
+            latency = measure(tick, options['ticks'])
+
+            self.stdout.write('%10d %8.2fms %8.2fms %8.3fms %8.3fms' % (size, legacy, load, snapshot, latency))
+
+        if options['explain']:
+            # The reads of WarehouseState.load, the tick itself does not query
+            inventory = Inventory.objects.filter(warehouse=0)
+            self.stdout.write(inventory.filter(stored__lt=models.COMPLETED).order_by('updated', 'id').explain())
+            self.stdout.write(inventory.filter(stored=models.COMPLETED).explain())
+            self.stdout.write(Order.objects.filter(warehouse=0).exclude(status=Order.STATUS4).order_by('id').explain())
@@ -0,0 +1,40 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from cloud.simulator import sweep
+
+
+class Command(BaseCommand):
+    help = 'Evaluate decision modes over seeds and anomaly settings in parallel worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dm-types', nargs='+', default=['Random', 'ORL', 'AAAA'],
+                            choices=['Random', 'ORL', 'AAAA'])
+        parser.add_argument('--anomaly', choices=['on', 'off', 'both'], default='both')
+        parser.add_argument('--seeds', type=int, default=10, help='number of seeds per setting')
+        parser.add_argument('--episodes', type=int, default=10, help='episodes per seed')
+        parser.add_argument('--max-ticks', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--output', default=None, help='write the report as JSON')
+
+    def handle(self, *args, **options):
+        anomalies = {'on': [True], 'off': [False], 'both': [True, False]}[options['anomaly']]
+
+        started = time.perf_counter()
+        report = sweep(options['dm_types'], anomalies, range(options['seeds']), episodes=options['episodes'],
+                       max_ticks=options['max_ticks'], workers=options['workers'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write('%-8s %-8s %8s %10s %8s %8s %8s %8s %12s' % (
+            'dm_type', 'anomaly', 'episodes', 'reward', 'std', 'ticks', 'trash', 'complete', 'us/decision'))
+        for row in sorted(report, key=lambda row: (row['dm_type'], not row['anomaly'])):
+            self.stdout.write('%-8s %-8s %8d %10.1f %8.1f %8.1f %8.2f %8.1f %12.1f' % (
+                row['dm_type'], 'on' if row['anomaly'] else 'off', row['episodes'], row['reward'],
+                row['reward_std'], row['ticks'], row['trash'], row['completed'], row['decision_latency'] * 1e6))
+        self.stdout.write('%d episodes in %.1fs' % (sum(row['episodes'] for row in report), elapsed))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
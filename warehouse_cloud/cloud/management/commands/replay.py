@@ -0,0 +1,46 @@
+import datetime
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from runtime_verification import spec
+from warehouse_cloud.settings import BASE_DIR, settings
+
+from cloud import trace
+
+
+class Command(BaseCommand):
+    help = 'Verify past experiments by replaying the recorded messages through the runtime verification properties'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spec', default=settings.get('rv_spec', 'properties.spec'))
+        parser.add_argument('--warehouse', type=int, default=None)
+        parser.add_argument('--since', type=datetime.datetime.fromisoformat, default=None)
+        parser.add_argument('--until', type=datetime.datetime.fromisoformat, default=None)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        replay = trace.Replay(spec.load(os.path.join(BASE_DIR, options['spec'])))
+
+        started = time.perf_counter()
+        status = replay.run(trace.trace(options['warehouse'], options['since'], options['until'],
+                                        options['chunk_size']))
+        elapsed = time.perf_counter() - started
+
+        for now, name, result in replay.changes:
+            self.stdout.write('%s %s: %s' % (now.isoformat(), name, result))
+        for name, result in status.items():
+            self.stdout.write('%s %s' % ('PASS' if result else 'FAIL', name))
+
+        self.stdout.write('%d messages (%d invalid) in %.2fs (%.0f messages/minute)' % (
+            replay.messages, replay.invalid, elapsed, replay.messages / elapsed * 60 if elapsed > 0 else 0))
+        if replay.missing:
+            self.stdout.write('%d moves of items that are not in the trace, their SAS Check was not recorded, the '
+                              'item counts after them are too low' % replay.missing)
+        for warehouse in sorted(replay.conveyors):
+            self.stdout.write('warehouse %d: %d items in the system, %d open orders, %d completed, %d trash' % (
+                warehouse, sum(len(conveyor) for conveyor in replay.conveyors[warehouse]),
+                sum(replay.orders[warehouse].values()), replay.completed[warehouse], replay.trash[warehouse]))
+            if replay.starts.get(warehouse, 0) > 1:
+                self.stdout.write('warehouse %d: %d experiments, Start deleted the orders of all but the last, their '
+                                  'orders are not counted' % (warehouse, replay.starts[warehouse]))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cloud.simulator import Simulator, summarize
+
+
+class Command(BaseCommand):
+    help = 'Run warehouse episodes against simulated edges, without robots or HTTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dm-type', default='Random', choices=['Random', 'ORL', 'AAAA'])
+        parser.add_argument('--episodes', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--no-anomaly', action='store_true')
+        parser.add_argument('--max-ticks', type=int, default=1000)
+        parser.add_argument('--verbose', action='store_true')
+
+    def handle(self, *args, **options):
+        simulator = Simulator(options['dm_type'], seed=options['seed'], anomaly=not options['no_anomaly'],
+                              max_ticks=options['max_ticks'])
+
+        started = time.perf_counter()
+        results = simulator.run(options['episodes'])
+        elapsed = time.perf_counter() - started
+
+        if options['verbose']:
+            for i, result in enumerate(results):
+                self.stdout.write('%4d reward %6d ticks %4d trash %3d completed %3d' %
+                                  (i, result['reward'], result['ticks'], result['trash'], result['completed']))
+
+        summary = summarize(results)
+        self.stdout.write('%s: %d episodes in %.2fs (%.0f episodes/minute)' %
+                          (options['dm_type'], len(results), elapsed, len(results) / elapsed * 60))
+        self.stdout.write('reward %.1f, ticks %.1f, trash %.2f, completed %.1f, %.1fus per decision' % (
+            summary['reward'], summary['ticks'], summary['trash'], summary['completed'],
+            summary['decision_latency'] * 1e6))
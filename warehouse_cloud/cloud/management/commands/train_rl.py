@@ -0,0 +1,32 @@
+import torch
+from django.core.management.base import BaseCommand
+
+from cloud import rl
+
+
+class Command(BaseCommand):
+    help = 'Train a DQN offline from episodes recorded with rl_record_path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('episodes', help='recorded transitions (JSON lines)')
+        parser.add_argument('output', help='path of the trained checkpoint')
+        parser.add_argument('--initial', default='', help='checkpoint to start from')
+        parser.add_argument('--epochs', type=int, default=1)
+        parser.add_argument('--steps', type=int, default=8, help='gradient steps per replayed transition')
+        parser.add_argument('--target-update', type=int, default=100)
+        parser.add_argument('--tau', type=float, default=None)
+        parser.add_argument('--prioritized', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=128,
+                            help='minibatch size, no step is taken until this many transitions are recorded')
+
+    def handle(self, *args, **options):
+        model = rl.DQN(path=options['initial'], prioritized=options['prioritized'],
+                       target_update=options['target_update'], tau=options['tau'],
+                       batch_size=options['batch_size'])
+        episodes = rl.read_episodes(options['episodes'])
+
+        rl.train(model, episodes, epochs=options['epochs'], steps=options['steps'])
+        torch.save(model.state_dict(), options['output'])
+        self.stdout.write('Trained on %d episodes (%d transitions, %d gradient steps), saved to %s' %
+                          (len(episodes), sum(len(episode) for episode in episodes), model.updates,
+                           options['output']))
@@ -0,0 +1,48 @@
+import time
+
+import torch
+from django.core.management.base import BaseCommand
+
+from cloud import rl
+from cloud.vecenv import VecWarehouse
+
+
+class Command(BaseCommand):
+    help = 'Train a DQN online against many simulated warehouses stepped together'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='path of the trained checkpoint')
+        parser.add_argument('--initial', default='', help='checkpoint to start from')
+        parser.add_argument('--envs', type=int, default=1024)
+        parser.add_argument('--ticks', type=int, default=1000)
+        parser.add_argument('--steps', type=int, default=1, help='gradient steps per tick')
+        parser.add_argument('--anomaly-aware', action='store_true')
+        parser.add_argument('--no-anomaly', action='store_true')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--target-update', type=int, default=100)
+        parser.add_argument('--tau', type=float, default=None)
+        parser.add_argument('--prioritized', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=128,
+                            help='minibatch size, no step is taken until this many transitions are recorded')
+
+    def handle(self, *args, **options):
+        model = rl.DQN(path=options['initial'], prioritized=options['prioritized'],
+                       target_update=options['target_update'], tau=options['tau'],
+                       batch_size=options['batch_size'])
+        env = VecWarehouse(options['envs'], anomaly_aware=options['anomaly_aware'],
+                           anomaly=not options['no_anomaly'], seed=options['seed'])
+
+        started = time.perf_counter()
+        rl.train_vectorized(model, env, options['ticks'], steps=options['steps'])
+        elapsed = time.perf_counter() - started
+
+        torch.save(model.state_dict(), options['output'])
+        episodes = env.completed
+        self.stdout.write('%d environment ticks in %.2fs (%.0f per second), %d episodes, %d gradient steps' %
+                          (options['envs'] * options['ticks'], elapsed,
+                           options['envs'] * options['ticks'] / elapsed, len(episodes), model.updates))
+        if len(episodes) != 0:
+            self.stdout.write('mean reward %.1f over the last %d episodes' % (
+                sum(episode['reward'] for episode in episodes[-100:]) / len(episodes[-100:]),
+                len(episodes[-100:])))
+        self.stdout.write('Saved to %s' % options['output'])
@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from warehouse_cloud.settings import settings
+
+from cloud.rv import Verifier
+
+
+class Command(BaseCommand):
+    help = 'Check the runtime verification properties continuously, checkpointing them to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.get('rv_interval', 15.0),
+                            help='Seconds between verification cycles, fractions allowed')
+        parser.add_argument('--checkpoint-every', type=int, default=settings.get('rv_checkpoint_every', 1),
+                            help='Cycles between checkpoints')
+        parser.add_argument('--no-log', action='store_true', help='Do not write rv_log files')
+
+    def handle(self, *args, **options):
+        verifier = Verifier(options['interval'], max(options['checkpoint_every'], 1), log=not options['no_log'])
+        signal.signal(signal.SIGTERM, lambda signum, frame: verifier.stopped.set())
+
+        self.stdout.write('Verifying every %.3fs' % options['interval'])
+        verifier.start()
+        try:
+            while verifier.thread.is_alive():
+                verifier.thread.join(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            verifier.stop()
+        self.stdout.write('Stopped after %d cycles' % verifier.cycles)
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.9 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0002_auto_20211129_2209'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['stored', 'updated'], name='inventory_stored_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['stored', 'item_type', 'updated'], name='inventory_stored_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['item_type', 'status', 'made'], name='order_type_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['item_type', 'dest', 'status'], name='order_type_dest_status_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.9 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0003_inventory_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorySegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensorID', models.CharField(max_length=50)),
+                ('hour', models.DateTimeField()),
+                ('first', models.DateTimeField()),
+                ('last', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('minimum', models.FloatField()),
+                ('maximum', models.FloatField()),
+                ('total', models.FloatField()),
+                ('data', models.BinaryField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='sensory',
+            index=models.Index(fields=['sensorID', 'datetime'], name='sensory_sensor_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorysegment',
+            index=models.Index(fields=['sensorID', 'hour'], name='segment_sensor_hour_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.9 on 2026-10-18 14:05
+
+import datetime
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0004_sensorysegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Outbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.UUIDField(default=uuid.uuid4, unique=True)),
+                ('edge', models.CharField(max_length=50)),
+                ('sender', models.IntegerField(
+                    choices=[(0, 'User'), (1, 'Cloud'), (11, '[Edge] Classification'), (12, '[Edge] Repository'),
+                             (13, '[Edge] Shipment'), (21, '[Machine] Classification'), (22, '[Machine] Repository-1'),
+                             (23, '[Machine] Repository-2'), (24, '[Machine] Repository-3'),
+                             (25, '[Machine] Shipment')])),
+                ('title', models.CharField(default='', max_length=50)),
+                ('msg', models.TextField(blank=True, default='', null=True)),
+                ('created', models.DateTimeField(default=datetime.datetime.now)),
+                ('delivered', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outbox',
+            index=models.Index(fields=['edge', 'delivered', 'id'], name='outbox_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:20
+
+import datetime
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0005_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='warehouse',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='warehouse',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='warehouse',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='warehouse',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='status',
+            name='warehouse',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Experiment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('warehouse', models.IntegerField(unique=True)),
+                ('experiment_type', models.CharField(default='SAS', max_length=50)),
+                ('dm_type', models.CharField(default='ORL', max_length=50)),
+                ('variables', models.TextField(blank=True, default='')),
+                ('version', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=datetime.datetime.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['warehouse', 'stored'], name='inventory_warehouse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['warehouse', 'status'], name='order_warehouse_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0006_warehouse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='verification',
+            name='state',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0007_verification_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['datetime', 'id'], name='message_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['warehouse', 'datetime', 'id'], name='message_warehouse_time_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 3.2.9 on 2026-10-18 09:40
+
+from array import array
+from datetime import datetime
+
+from django.db import migrations
+
+BATCH = 1000
+
+
+def pack(points):
+    data = array('d')
+    for time, value in points:
+        data.append(time.timestamp())
+        data.append(value)
+    return data.tobytes()
+
+
+def segment(SensorySegment, sensor_id, hour, points):
+    values = [value for _, value in points]
+    return SensorySegment(sensorID=sensor_id, hour=hour, first=points[0][0], last=points[-1][0],
+                          count=len(points), minimum=min(values), maximum=max(values), total=sum(values),
+                          data=pack(points))
+
+
+def backfill(apps, schema_editor):
+    # Readings stored before the segments existed become one segment per sensor and hour
+    Sensory = apps.get_model('cloud', 'Sensory')
+    SensorySegment = apps.get_model('cloud', 'SensorySegment')
+
+    segments = []
+    key = None
+    points = []
+    for sensor_id, time, value in Sensory.objects.order_by('sensorID', 'datetime', 'id') \
+            .values_list('sensorID', 'datetime', 'value').iterator():
+        current = (sensor_id, time.replace(minute=0, second=0, microsecond=0))
+        if current != key and points:
+            segments.append(segment(SensorySegment, key[0], key[1], points))
+            points = []
+            if len(segments) >= BATCH:
+                SensorySegment.objects.bulk_create(segments)
+                segments = []
+        key = current
+        points.append((time, float(value)))
+
+    if points:
+        segments.append(segment(SensorySegment, key[0], key[1], points))
+    SensorySegment.objects.bulk_create(segments)
+    Sensory.objects.all().delete()
+
+
+def restore(apps, schema_editor):
+    # Downsampled segments come back as their mean point
+    Sensory = apps.get_model('cloud', 'Sensory')
+    SensorySegment = apps.get_model('cloud', 'SensorySegment')
+
+    rows = []
+    for sensor_id, first, last, count, total, data in SensorySegment.objects.order_by('id') \
+            .values_list('sensorID', 'first', 'last', 'count', 'total', 'data').iterator():
+        if data is None:
+            rows.append(Sensory(sensorID=sensor_id, datetime=first + (last - first) / 2, value=total / count))
+        else:
+            pairs = array('d')
+            pairs.frombytes(bytes(data))
+            rows.extend(Sensory(sensorID=sensor_id, datetime=datetime.fromtimestamp(timestamp), value=value)
+                        for timestamp, value in zip(pairs[0::2], pairs[1::2]))
+        if len(rows) >= BATCH:
+            Sensory.objects.bulk_create(rows)
+            rows = []
+    Sensory.objects.bulk_create(rows)
+    SensorySegment.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0008_message_time_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, restore),
+        migrations.RemoveIndex(
+            model_name='sensory',
+            name='sensory_sensor_time_idx',
+        ),
+    ]
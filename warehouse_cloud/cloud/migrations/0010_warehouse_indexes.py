@@ -0,0 +1,25 @@
+# Generated by Django 3.2.9 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0009_sensory_segments'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventory',
+            name='inventory_warehouse_idx',
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['warehouse', 'stored', 'updated', 'id'], name='inventory_warehouse_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['warehouse', 'item_type', 'status'], name='order_warehouse_type_idx'),
+        ),
+    ]
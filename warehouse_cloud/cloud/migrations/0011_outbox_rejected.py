@@ -0,0 +1,23 @@
+# Generated by Django 3.2.9 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0010_warehouse_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outbox',
+            name='rejected',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='status',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.9 on 2026-10-18 10:13
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cloud', '0011_outbox_rejected'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventory',
+            name='inventory_stored_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='inventory',
+            name='inventory_stored_type_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_type_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_type_dest_status_idx',
+        ),
+    ]
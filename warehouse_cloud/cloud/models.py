@@ -1,4 +1,5 @@
 import datetime
+import uuid
 
 from django.db import models
 
@@ -28,12 +29,19 @@ dest_choices = [
 
 
 class Inventory(models.Model):
+    warehouse = models.IntegerField(default=0)
     item_type = models.IntegerField(choices=item_type_choices)
     stored = models.IntegerField(choices=dest_choices)
     updated = models.DateTimeField(auto_now=datetime.datetime.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['warehouse', 'stored', 'updated', 'id'], name='inventory_warehouse_time_idx'),
+        ]
+
 
 class Order(models.Model):
+    warehouse = models.IntegerField(default=0)
     made = models.DateTimeField(default=datetime.datetime.now)
     completed = models.DateTimeField(null=True, blank=True)
     item_type = models.IntegerField(choices=item_type_choices)
@@ -51,13 +59,38 @@ class Order(models.Model):
     ]
     status = models.IntegerField(choices=order_status_choices, default=1)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['warehouse', 'status'], name='order_warehouse_idx'),
+            models.Index(fields=['warehouse', 'item_type', 'status'], name='order_warehouse_type_idx'),
+        ]
+
 
 class Sensory(models.Model):
+    # Describes one reading, readings are stored in SensorySegment
     sensorID = models.CharField(max_length=50)
     value = models.FloatField()
     datetime = models.DateTimeField()
 
 
+class SensorySegment(models.Model):
+    sensorID = models.CharField(max_length=50)
+    hour = models.DateTimeField()
+    first = models.DateTimeField()
+    last = models.DateTimeField()
+    count = models.IntegerField()
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+    total = models.FloatField()
+    # Packed float64 (timestamp, value) pairs, dropped when the segment is downsampled
+    data = models.BinaryField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sensorID', 'hour'], name='segment_sensor_hour_idx'),
+        ]
+
+
 USER = 0
 CLOUD = 1
 EDGE_CLASSIFICATION = 11
@@ -84,18 +117,58 @@ sender_choices = [
 
 
 class Message(models.Model):
+    warehouse = models.IntegerField(default=0)
     sender = models.IntegerField(choices=sender_choices)
     title = models.CharField(default='', max_length=50)
     msg = models.TextField(default='', blank=True, null=True)
     datetime = models.DateTimeField(default=datetime.datetime.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['datetime', 'id'], name='message_time_idx'),
+            models.Index(fields=['warehouse', 'datetime', 'id'], name='message_warehouse_time_idx'),
+        ]
+
+
+class Outbox(models.Model):
+    key = models.UUIDField(default=uuid.uuid4, unique=True)
+    edge = models.CharField(max_length=50)
+    warehouse = models.IntegerField(default=0)
+    sender = models.IntegerField(choices=sender_choices)
+    title = models.CharField(default='', max_length=50)
+    msg = models.TextField(default='', blank=True, null=True)
+    created = models.DateTimeField(default=datetime.datetime.now)
+    delivered = models.DateTimeField(null=True, blank=True)
+    # Set instead of delivered when the edge answered with a client error
+    rejected = models.DateTimeField(null=True, blank=True)
+    status = models.IntegerField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['edge', 'delivered', 'id'], name='outbox_pending_idx'),
+        ]
+
 
 class Status(models.Model):
+    warehouse = models.IntegerField(default=0)
     status = models.BooleanField(default=False)
     updated = models.DateTimeField(auto_now=datetime.datetime.now)
 
 
+class Experiment(models.Model):
+    # Shared copy of a warehouse's decision variables, so that every worker process sees the same warehouse
+    warehouse = models.IntegerField(unique=True)
+    experiment_type = models.CharField(default='SAS', max_length=50)
+    dm_type = models.CharField(default='ORL', max_length=50)
+    variables = models.TextField(default='', blank=True)
+    version = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=datetime.datetime.now)
+
+
 class Verification(models.Model):
     property_name = models.TextField(default='')
     verification_result = models.BooleanField(default=True)
     verified = models.DateTimeField(auto_now=datetime.datetime.now)
+    # Checkpoint of the property, restored when the verifier starts again
+    state = models.TextField(default='', blank=True)
@@ -0,0 +1,114 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from warehouse_cloud.settings import settings
+
+from . import edge
+from .models import Outbox
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(edges, message):
+    Outbox.objects.bulk_create([Outbox(edge=target_edge, warehouse=message.get('warehouse', 0),
+                                       sender=message['sender'], title=message['title'], msg=message['msg'])
+                                for target_edge in edges])
+    transaction.on_commit(worker.notify)
+
+
+def purge(now=None):
+    # Delivered messages are kept for a while to look into, rejected ones until they are looked into
+    if now is None:
+        now = datetime.now()
+    cutoff = now - timedelta(days=settings.get('outbox_retention_days', 7))
+    Outbox.objects.filter(delivered__lt=cutoff).delete()
+
+
+class OutboxWorker:
+    def __init__(self, interval=1.0, max_backoff=30.0):
+        self.interval = interval
+        self.max_backoff = max_backoff
+
+        # One delivery thread per edge, so retries against an edge that is down do not hold back the others
+        self.wakeups = {target_edge: threading.Event() for target_edge in edge.ALL}
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.stopped = threading.Event()
+
+    def start(self):
+        with self.lock:
+            for target_edge in edge.ALL:
+                thread = self.threads.get(target_edge)
+                if thread is None or not thread.is_alive():
+                    thread = threading.Thread(target=self.run, args=(target_edge,), name='outbox-' + target_edge,
+                                              daemon=True)
+                    self.threads[target_edge] = thread
+                    thread.start()
+
+    def notify(self):
+        self.start()
+        for wakeup in self.wakeups.values():
+            wakeup.set()
+
+    def stop(self):
+        self.stopped.set()
+        for wakeup in self.wakeups.values():
+            wakeup.set()
+        for thread in list(self.threads.values()):
+            thread.join()
+
+    def run(self, target_edge):
+        wakeup = self.wakeups[target_edge]
+        while not self.stopped.is_set():
+            wait = self.interval
+            try:
+                while self.deliver(target_edge):
+                    pass
+                failures = self.failures.get(target_edge, 0)
+                if failures > 0:
+                    wait = min(self.interval * (2 ** failures), self.max_backoff)
+            except Exception:
+                logger.exception('Outbox delivery to %s failed', target_edge)
+            finally:
+                close_old_connections()
+
+            # New messages do not cut a backoff short, the edge is still down
+            if wait > self.interval:
+                self.stopped.wait(wait)
+            else:
+                wakeup.wait(wait)
+            wakeup.clear()
+
+    def deliver(self, target_edge):
+        # Returns True when a row was delivered or rejected and more may be waiting
+        row = Outbox.objects.filter(edge=target_edge, delivered__isnull=True, rejected__isnull=True) \
+            .order_by('id').first()
+        if row is None:
+            return False
+
+        message = {'warehouse': row.warehouse, 'sender': row.sender, 'title': row.title, 'msg': row.msg}
+        response = edge.dispatcher.post(target_edge, message, data=message,
+                                        headers={'Idempotency-Key': str(row.key)})
+        if response is None:
+            # Keep the row, and the order, for the next attempt
+            Outbox.objects.filter(id=row.id).update(attempts=F('attempts') + 1)
+            self.failures[target_edge] = self.failures.get(target_edge, 0) + 1
+            return False
+
+        self.failures[target_edge] = 0
+        if response.status_code >= 400:
+            # Sending it again would not change the answer, the row stays in the table as rejected
+            logger.warning('%s rejected %s with %d', target_edge, row.title, response.status_code)
+            Outbox.objects.filter(id=row.id).update(rejected=datetime.now(), status=response.status_code,
+                                                    attempts=F('attempts') + 1)
+        else:
+            Outbox.objects.filter(id=row.id).update(delivered=datetime.now(), status=response.status_code,
+                                                    attempts=F('attempts') + 1)
+        return True
+
+
+worker = OutboxWorker()
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import threading
+from urllib.parse import parse_qs
+
+from django.db import close_old_connections
+
+from . import api, models
+from .models import Message
+from .warehouses import warehouses
+
+logger = logging.getLogger(__name__)
+
+PATH = '/ws/edge/'
+
+
+def decisions(target):
+    return target.c_allow, list(target.r_allow), target.s_allow
+
+
+class EdgeChannel:
+    def __init__(self, warehouse_id, sender, loop):
+        self.warehouse_id = warehouse_id
+        self.sender = sender
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.last = None
+
+    def decision(self, current):
+        # What this edge may do now, None when it has to wait
+        c_allow, r_allow, s_allow = current
+        if self.sender == models.EDGE_CLASSIFICATION:
+            return None if c_allow == 3 else int(c_allow)
+        if self.sender == models.EDGE_REPOSITORY:
+            return [i for i, allowed in enumerate(r_allow) if allowed] or None
+        return None if s_allow == 3 else int(s_allow)
+
+    def push(self, current):
+        # Only changed decisions are sent, a decision that was withdrawn is sent again when it comes back
+        decision = self.decision(current)
+        if decision == self.last:
+            return None
+        self.last = decision
+        if decision is None:
+            return None
+        return {'title': 'SAS Check', 'status': 201, 'msg': decision}
+
+    def refresh(self):
+        warehouses.future(self.warehouse_id, decisions, readonly=True).add_done_callback(self.refreshed)
+
+    def refreshed(self, future):
+        if future.exception() is None:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, future.result())
+
+    def receive(self, text):
+        # Edge events, handled like the same messages posted to /api/message/
+        data = json.loads(text)
+        title = data['title']
+        msg = data.get('msg', '')
+        if not isinstance(msg, str):
+            msg = json.dumps(msg)
+
+        # Checks are not stored, except those that move an item
+        if title != 'SAS Check':
+            Message.objects.create(warehouse=self.warehouse_id, sender=self.sender, title=title, msg=msg)
+        status, answer = api.handle_edge(self.warehouse_id, self.sender, title, msg, record_checks=True)
+
+        reply = {'title': title, 'status': status, 'msg': answer}
+        if 'id' in data:
+            reply['id'] = data['id']
+        return reply
+
+
+def receive_frame(channel, text):
+    # Runs on an executor thread, its connection is closed like that of a request so it does not outlive its use
+    close_old_connections()
+    try:
+        return channel.receive(text)
+    finally:
+        close_old_connections()
+
+
+class Channels:
+    def __init__(self):
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def add(self, channel):
+        with self.lock:
+            self.channels.setdefault(channel.warehouse_id, set()).add(channel)
+
+    def remove(self, channel):
+        with self.lock:
+            self.channels.get(channel.warehouse_id, set()).discard(channel)
+
+    def notify(self, warehouse_id):
+        # Runs on the warehouse's thread right after a message for it was committed
+        with self.lock:
+            channels = list(self.channels.get(warehouse_id, ()))
+        target = warehouses.warehouses.get(warehouse_id)
+        if len(channels) == 0 or target is None:
+            return
+
+        current = decisions(target)
+        for channel in channels:
+            channel.loop.call_soon_threadsafe(channel.queue.put_nowait, current)
+
+
+channels = Channels()
+warehouses.listeners.append(channels.notify)
+
+
+async def send_json(send, data):
+    await send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+
+async def serve(scope, receive, send):
+    # One persistent channel per edge: decisions are pushed as they are made, edge events come back as frames
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    params = {key: values[0] for key, values in parse_qs(scope['query_string'].decode()).items()}
+    try:
+        warehouse_id = int(params.get('warehouse', 0))
+        sender = int(params['sender'])
+    except (KeyError, ValueError):
+        sender = None
+    if sender not in (models.EDGE_CLASSIFICATION, models.EDGE_REPOSITORY, models.EDGE_SHIPMENT):
+        await send({'type': 'websocket.close', 'code': 4000})
+        return
+
+    await send({'type': 'websocket.accept'})
+    loop = asyncio.get_running_loop()
+    channel = EdgeChannel(warehouse_id, sender, loop)
+    channels.add(channel)
+    channel.refresh()
+
+    # Other processes do not notify this one, so a shared warehouse is read again every second
+    recheck = 1.0 if warehouses.shared else None
+    receiving = asyncio.ensure_future(receive())
+    pushing = asyncio.ensure_future(channel.queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receiving, pushing}, timeout=recheck,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if len(done) == 0:
+                channel.refresh()
+
+            if receiving in done:
+                message = receiving.result()
+                if message['type'] == 'websocket.disconnect':
+                    break
+
+                text = message.get('text') or (message.get('bytes') or b'').decode()
+                try:
+                    reply = await loop.run_in_executor(None, receive_frame, channel, text)
+                except (LookupError, TypeError, ValueError) as e:
+                    reply = {'status': 400, 'msg': str(e)}
+                except Exception as e:
+                    # The channel stays open, the edge learns that its frame was not handled
+                    logger.exception('Edge frame failed')
+                    reply = {'status': 500, 'msg': str(e)}
+                await send_json(send, reply)
+                receiving = asyncio.ensure_future(receive())
+
+            if pushing in done:
+                frame = channel.push(pushing.result())
+                if frame is not None:
+                    await send_json(send, frame)
+                pushing = asyncio.ensure_future(channel.queue.get())
+    finally:
+        receiving.cancel()
+        pushing.cancel()
+        channels.remove(channel)
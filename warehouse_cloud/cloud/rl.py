@@ -1,29 +1,123 @@
+import copy
+import json
 import math
 import random
-from collections import deque, namedtuple
 
+import numpy as np
 import torch
 from torch import nn, optim
 
-Transition = namedtuple('Transition', ('state', 'tactic', 'reward', 'next_state'))
 cuda_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+def masked_argmax(values, mask):
+    return values.masked_fill(~mask, float('-inf')).argmax(1)
+
+
 class Memory(object):
-    def __init__(self):
-        self.memory = deque(maxlen=10000)
+    def __init__(self, state_size, capacity=10000, prioritized=False, alpha=0.6, beta=0.4):
+        # Ring buffer over preallocated tensors, a sample is a single index operation per field
+        self.state_size = state_size
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+
+        self.states = None
+        self.position = 0
+        self.size = 0
+
+    def allocate(self):
+        # Done on the first push, models that only run inference never pay for the buffer
+        self.states = torch.zeros((self.capacity, self.state_size), device=cuda_device)
+        self.next_states = torch.zeros((self.capacity, self.state_size), device=cuda_device)
+        self.tactics = torch.zeros((self.capacity, 1), dtype=torch.long, device=cuda_device)
+        self.rewards = torch.zeros(self.capacity, device=cuda_device)
+        self.priorities = torch.zeros(self.capacity, device=cuda_device) if self.prioritized else None
+
+    def push(self, state, tactic, reward, next_state):
+        if self.states is None:
+            self.allocate()
+
+        i = self.position
+        self.states[i] = torch.as_tensor(state, dtype=torch.float32).view(-1)
+        self.tactics[i] = torch.as_tensor(tactic, dtype=torch.long).view(-1)
+        self.rewards[i] = float(reward)
+        self.next_states[i] = torch.as_tensor(next_state, dtype=torch.float32).view(-1)
+
+        if self.prioritized:
+            self.priorities[i] = self.priorities[:self.size].max() if self.size > 0 else 1.0
+
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, states, tactics, rewards, next_states):
+        # Batched push, one indexed write per field
+        if self.states is None:
+            self.allocate()
+
+        states = torch.as_tensor(states, dtype=torch.float32, device=cuda_device)
+        total = len(states)
+        states = states[-self.capacity:]
+        count = len(states)
+        if count == 0:
+            return
+
+        # Rows that would be overwritten within this batch are skipped, the rest land where pushes would put them
+        start = self.position + total - count
+        indices = (start + torch.arange(count, device=cuda_device)) % self.capacity
+        self.states[indices] = states
+        self.tactics[indices] = torch.as_tensor(tactics, dtype=torch.long, device=cuda_device)[-count:].view(-1, 1)
+        self.rewards[indices] = torch.as_tensor(rewards, dtype=torch.float32, device=cuda_device)[-count:]
+        self.next_states[indices] = torch.as_tensor(next_states, dtype=torch.float32,
+                                                    device=cuda_device)[-self.capacity:]
+
+        if self.prioritized:
+            self.priorities[indices] = self.priorities[:self.size].max() if self.size > 0 else 1.0
 
-    def push(self, *args):
-        self.memory.append(Transition(*args))
+        self.position = (self.position + total) % self.capacity
+        self.size = min(self.size + count, self.capacity)
 
     def sample(self, batch_size):
-        return random.sample(self.memory, batch_size)
+        if self.prioritized:
+            probabilities = self.priorities[:self.size] ** self.alpha
+            probabilities /= probabilities.sum()
+            indices = torch.multinomial(probabilities, batch_size, replacement=True)
+            weights = (self.size * probabilities[indices]) ** -self.beta
+            weights /= weights.max()
+        else:
+            indices = torch.randperm(self.size, device=cuda_device)[:batch_size]
+            weights = torch.ones(len(indices), device=cuda_device)
+
+        return indices, self.states[indices], self.tactics[indices], self.rewards[indices], \
+            self.next_states[indices], weights
+
+    def update_priorities(self, indices, errors):
+        if self.prioritized:
+            self.priorities[indices] = errors.abs() + 1e-6
 
     def __len__(self):
-        return len(self.memory)
+        return self.size
+
+
+class TargetNetwork:
+    # A plain holder, so the target copy is neither a submodule in checkpoints nor a parameter of the optimizer
+    def __init__(self, network):
+        self.network = copy.deepcopy(network)
+        for param in self.network.parameters():
+            param.requires_grad_(False)
+
+    def __call__(self, states):
+        return self.network(states)
+
+    def parameters(self):
+        return self.network.parameters()
+
+    def load(self, network):
+        self.network.load_state_dict(network.state_dict())
 
 
 class DQN(nn.Module):
-    def __init__(self, path=''):
+    def __init__(self, path='', prioritized=False, target_update=100, tau=None, batch_size=128):
         super(DQN, self).__init__()
         self.input_size = 10
         self.output_size = 3
@@ -38,23 +132,29 @@ class DQN(nn.Module):
         )
 
         self.steps = -1
-        self.memory = Memory()
+        self.memory = Memory(self.input_size, prioritized=prioritized)
         self.optimizer = optim.RMSprop(self.parameters())
 
+        # Either a hard copy every target_update steps, or a soft update with rate tau after every step
+        self.target_update = target_update
+        self.tau = tau
+        self.updates = 0
+        self.target_model = None
+        # No gradient step is taken until the replay memory holds one full batch
+        self.batch_size = batch_size
+
         if path != '':
             self.load_state_dict(torch.load(path, map_location=cuda_device))
             self.eval()
 
     def select_tactic(self, state, available):
-        state_tensor = torch.FloatTensor([state]).to(cuda_device)
-
-        result = self.model(state_tensor).view(self.output_size)
-        result_sort = result.sort(descending=True)
+        if not any(available):
+            return None
 
-        for i in range(self.output_size):
-            selected = result_sort.indices[i]
-            if available[selected]:
-                return torch.LongTensor([[selected]]).to(cuda_device)
+        with torch.inference_mode():
+            result = self.model(torch.tensor([state], dtype=torch.float32, device=cuda_device))
+            selected = masked_argmax(result, torch.tensor([available], dtype=torch.bool, device=cuda_device))
+        return torch.LongTensor([[int(selected[0])]]).to(cuda_device)
 
     def select_train_tactic(self, state, available):
         sample = random.random()
@@ -71,33 +171,110 @@ class DQN(nn.Module):
                 candidate.append(i)
         return torch.LongTensor([[random.choice(candidate)]]).to(cuda_device)
 
-    def optimize_model(self):
-        if len(self.memory) < 128:
-            return
+    def sync_target(self):
+        if self.target_model is None:
+            self.target_model = TargetNetwork(self.model)
+        else:
+            self.target_model.load(self.model)
+
+    def update_target(self):
+        self.updates += 1
+        if self.tau is not None:
+            with torch.no_grad():
+                for target, source in zip(self.target_model.parameters(), self.model.parameters()):
+                    target.mul_(1 - self.tau).add_(source, alpha=self.tau)
+        elif self.updates % self.target_update == 0:
+            self.sync_target()
 
-        transitions = self.memory.sample(128)
-        batch = Transition(*zip(*transitions))
+    def optimize_model(self, steps=1):
+        # Returns the number of gradient steps taken, 0 while the memory is smaller than a batch
+        if len(self.memory) < self.batch_size:
+            return 0
 
-        next_state_batch = torch.cat(batch.next_state)
-        state_batch = torch.cat(batch.state)
-        tactic_batch = torch.cat(batch.tactic)
-        reward_batch = torch.cat(batch.reward)
+        if self.target_model is None:
+            self.sync_target()
 
-        selected_tactics = self.model(state_batch).gather(1, tactic_batch)
-        next_state_values = self.model(next_state_batch).min(1)[0].detach()
-        expected_values = (next_state_values * 0.99) + reward_batch
+        criterion = nn.SmoothL1Loss(reduction='none')
+        for _ in range(steps):
+            indices, state_batch, tactic_batch, reward_batch, next_state_batch, weights = \
+                self.memory.sample(self.batch_size)
 
-        criterion = nn.SmoothL1Loss()
-        loss = criterion(selected_tactics, expected_values.unsqueeze(1))
+            selected_tactics = self.model(state_batch).gather(1, tactic_batch)
+            with torch.no_grad():
+                next_state_values = self.target_model(next_state_batch).min(1)[0]
+            expected_values = (next_state_values * 0.99) + reward_batch
+
+            loss = (criterion(selected_tactics, expected_values.unsqueeze(1)).squeeze(1) * weights).mean()
+            self.memory.update_priorities(indices, (selected_tactics.squeeze(1) - expected_values).detach())
+
+            self.optimizer.zero_grad()
+            loss.backward()
+            for param in self.parameters():
+                param.grad.data.clamp_(-1, 1)
+            self.optimizer.step()
+            self.update_target()
+        return steps
 
-        self.optimizer.zero_grad()
-        loss.backward()
-        for param in self.parameters():
-            param.grad.data.clamp_(-1, 1)
-        self.optimizer.step()
+    def push(self, state, tactic_tensor, reward, next_state):
+        self.memory.push(state, tactic_tensor, reward, next_state)
 
     def push_optimize(self, state, tactic_tensor, reward, next_state):
-        self.memory.push(torch.FloatTensor([state]).to(cuda_device), tactic_tensor,
-                         torch.FloatTensor([reward]).to(cuda_device),
-                         torch.FloatTensor([next_state]).to(cuda_device))
+        self.push(state, tactic_tensor, reward, next_state)
         self.optimize_model()
+
+
+def record(path, episode, state, tactic, reward, next_state):
+    with open(path, 'a') as f:
+        f.write(json.dumps({'episode': episode, 'state': state, 'tactic': int(tactic), 'reward': reward,
+                            'next_state': next_state}) + '\n')
+
+
+def read_episodes(path):
+    episodes = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                transition = json.loads(line)
+                episodes.setdefault(transition['episode'], []).append(transition)
+    return list(episodes.values())
+
+
+def train(model, episodes, epochs=1, steps=8):
+    # Offline training: replay whole episodes into the memory, then take `steps` gradient steps per transition
+    model.train()
+    for _ in range(epochs):
+        for episode in episodes:
+            for transition in episode:
+                model.push(transition['state'], transition['tactic'], transition['reward'],
+                           transition['next_state'])
+            model.optimize_model(steps=steps * len(episode))
+    model.eval()
+    return model
+
+
+def train_vectorized(model, env, ticks, steps=1):
+    # Online training on a VecWarehouse: one forward pass per tick decides for every environment
+    model.train()
+    states, info = env.reset()
+    for _ in range(ticks):
+        decide = info['decide']
+        available = info['available']
+
+        with torch.no_grad():
+            values = model.model(torch.as_tensor(states, device=cuda_device))
+            tactics = masked_argmax(values, torch.as_tensor(available, device=cuda_device)).cpu().numpy()
+
+        # Same exploration schedule as select_train_tactic, per decision
+        eps_threshold = 0.05 + 0.9 * math.exp(-1. * model.steps / 200)
+        explore = env.random.random(env.num_envs) < eps_threshold
+        tactics = np.where(explore, env.sample_actions(available), tactics)
+        model.steps += int(decide.sum())
+
+        next_states, rewards, dones, info = env.step(tactics)
+        ended = np.where(dones[:, None], info['terminal'], next_states)
+        model.memory.extend(states[decide], tactics[decide], rewards[decide], ended[decide])
+        model.optimize_model(steps=steps)
+        states = next_states
+
+    model.eval()
+    return model
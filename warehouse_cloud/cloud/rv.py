@@ -1,38 +1,109 @@
-import datetime
+import json
+import logging
+import os
+import threading
 import time
 
-from runtime_verification import event, scope, property
+from django.db import connection
+from runtime_verification import checkpoint, cycle, spec
+from runtime_verification.counters import counters
+from warehouse_cloud.settings import BASE_DIR, settings
 
-globally_scope = scope.GloballyScope()
+from .models import Verification
+from .warehouses import warehouses
 
-inventory_over_event = event.InventoryOverEvent()
-absence_property = property.Absence(inventory_over_event, globally_scope)
+logger = logging.getLogger(__name__)
 
-item_type_valid_event = event.ItemTypeValidEvent()
-universality_property = property.Universality(item_type_valid_event, globally_scope)
+# Compiled once, the events of all properties share one count of the items per cycle
+properties = spec.load(os.path.join(BASE_DIR, settings.get('rv_spec', 'properties.spec')))
 
-item_number_event = event.ItemNumberEvent(1)
-existence_property = property.Existence(item_number_event, globally_scope)
 
-properties = [
-    absence_property,
-    universality_property,
-    existence_property
-]
-
-
-def run(seconds):
-    time.sleep(seconds)
-    run_verification()
+def run_verification(log=True):
+    with cycle.Cycle() as current:
+        # Every cycle counts the items again, except those of warehouses that run in this process
+        counters.ensure()
+        for prop in properties:
+            prop.check()
 
+    if log:
+        write_log(current.now)
+    return current.now
 
-def run_verification():
-    for prop in properties:
-        prop.check()
 
-    date_time_name = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+def write_log(now):
+    date_time_name = now.strftime("%Y-%m-%d-%H-%M-%S")
     with open('rv_log/' + date_time_name + '.txt', 'w') as text_file:
         for prop in properties:
             text_file.write(prop.name + '\n')
             text_file.write(str(prop.status) + '\n')
             text_file.write('\n')
+
+
+def restore():
+    rows = {row.property_name: row for row in Verification.objects.filter(property_name__in=[
+        prop.name for prop in properties]).exclude(state='')}
+    for prop in properties:
+        row = rows.get(prop.name)
+        if row is not None:
+            checkpoint.load(prop, json.loads(row.state))
+    return len(rows)
+
+
+class Verifier:
+    def __init__(self, interval=15.0, checkpoint_every=1, log=True):
+        # Properties stay in memory between cycles, the database only keeps a checkpoint of them
+        self.interval = interval
+        self.checkpoint_every = checkpoint_every
+        self.log = log
+        self.cycles = 0
+        self.saved = {}
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='rv', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        if not warehouses.shared:
+            # Warehouses of this process are followed in memory once their state loads, only this process changes them
+            counters.subscribe()
+        try:
+            restore()
+            deadline = time.monotonic()
+            while not self.stopped.is_set():
+                try:
+                    run_verification(self.log)
+                    self.cycles += 1
+                    if self.cycles % self.checkpoint_every == 0:
+                        self.checkpoint()
+                except Exception:
+                    logger.exception('Verification cycle failed')
+                    connection.close()
+
+                # Cycles start on a fixed schedule, a slow cycle skips the starts it missed
+                deadline += self.interval
+                now = time.monotonic()
+                if deadline < now:
+                    deadline = now
+                self.stopped.wait(deadline - now)
+        finally:
+            try:
+                self.checkpoint()
+            finally:
+                connection.close()
+
+    def checkpoint(self):
+        # Only properties that changed since the last checkpoint are written
+        for prop in properties:
+            state = json.dumps(checkpoint.dump(prop))
+            if self.saved.get(prop.name) == state:
+                continue
+            Verification.objects.update_or_create(property_name=prop.name, defaults={
+                'verification_result': prop.status, 'state': state})
+            self.saved[prop.name] = state
@@ -0,0 +1,175 @@
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+from .models import SHIPMENT, Order
+from .state import WarehouseState
+from .warehouse import Warehouse
+
+
+class Simulator:
+    def __init__(self, dm_type='Random', seed=None, anomaly=True, experiment_type='SAS', max_ticks=1000):
+        self.dm_type = dm_type
+        self.experiment_type = experiment_type
+        self.anomaly = anomaly
+        self.max_ticks = max_ticks
+        self.random = random.Random(seed)
+
+        self.warehouse = None
+        self.trainer = None
+        self.reset()
+
+    def reset(self):
+        # Warehouse logic against an in-memory state, the online model keeps learning across episodes
+        self.warehouse = Warehouse(self.dm_type == 'AAAA', state=WarehouseState(persist=False),
+                                   trainable=self.dm_type == 'ORL' and self.trainer is None, threaded=False)
+        if self.trainer is not None:
+            self.warehouse.trainer = self.trainer
+        self.trainer = self.warehouse.trainer
+        self.warehouse.random = self.random
+
+        self.ordered = 0
+        self.classifying = 0
+        self.result = None
+
+    # Customer
+    def make_orders(self):
+        warehouse = self.warehouse
+        while self.ordered < warehouse.order_total and warehouse.tick >= self.ordered * warehouse.order_delay:
+            order = warehouse.state.new_order(self.random.randint(1, 4), self.random.randint(0, 2))
+            warehouse.place_order(order, self.experiment_type)
+            self.ordered += 1
+
+    # Edges
+    def classification(self):
+        warehouse = self.warehouse
+        if self.classifying != 0 and warehouse.c_allow != 3:
+            warehouse.classification_processed(self.classifying, warehouse.c_allow)
+            self.classifying = 0
+
+        if self.classifying == 0:
+            candidate = [i + 1 for i, count in enumerate(warehouse.c) if count > 0]
+            if len(candidate) != 0:
+                self.classifying = self.random.choice(candidate)
+        warehouse.classification_check(self.classifying)
+
+    def repository(self):
+        warehouse = self.warehouse
+        for i in range(3):
+            if warehouse.repository_check(i):
+                warehouse.repository_processed(i, self.experiment_type)
+
+    def shipment(self):
+        warehouse = self.warehouse
+        if warehouse.recent_s != 0 and warehouse.s_allow != 3:
+            warehouse.shipment_processed(warehouse.recent_s, warehouse.s_allow)
+
+        head = warehouse.state.first_item(SHIPMENT)
+        warehouse.shipment_check(head.item_type if head is not None else 0)
+
+    def anomalies(self):
+        if not self.anomaly:
+            return False, False
+
+        warehouse = self.warehouse
+        occurred = []
+        for i in [0, 2]:
+            occurred.append(warehouse.current_anomaly[i] == -1 and
+                            self.random.random() < 1 / warehouse.anomaly_mtbf)
+        return occurred[0], occurred[1]
+
+    def step(self):
+        self.make_orders()
+        self.repository()
+        self.shipment()
+        self.classification()
+
+        anomaly_0, anomaly_2 = self.anomalies()
+        self.result = self.warehouse.process(anomaly_0, anomaly_2, self.dm_type)
+        return self.result.get('alert') != "ended"
+
+    def run_episode(self):
+        self.reset()
+        started = time.perf_counter()
+        while self.warehouse.tick < self.max_ticks and self.step():
+            pass
+
+        warehouse = self.warehouse
+        completed = sum(warehouse.state.order_count(i, Order.STATUS4) for i in range(1, 5))
+        return {
+            'dm_type': self.dm_type,
+            'anomaly': self.anomaly,
+            'reward': warehouse.reward,
+            'ticks': warehouse.tick,
+            'ended': self.result is not None and self.result.get('alert') == "ended",
+            'completed': completed,
+            'trash': warehouse.trash,
+            'decisions': warehouse.decisions,
+            'decision_latency': warehouse.decision_time / warehouse.decisions if warehouse.decisions else 0.0,
+            'elapsed': time.perf_counter() - started,
+        }
+
+    def run(self, episodes):
+        return [self.run_episode() for _ in range(episodes)]
+
+
+def init_worker():
+    # Every worker process loads its own models, one torch thread each so the workers do not compete
+    import django
+    django.setup()
+    torch.set_num_threads(1)
+
+
+def seed_run(seed):
+    # The simulator draws from its own Random, replay sampling and exploration use the global generators
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def run_config(config):
+    dm_type, anomaly, seed, episodes, max_ticks = config
+    if seed is not None:
+        seed_run(seed)
+    simulator = Simulator(dm_type, seed=seed, anomaly=anomaly, max_ticks=max_ticks)
+    return config, simulator.run(episodes)
+
+
+def summarize(results):
+    decisions = sum(result['decisions'] for result in results)
+    decision_time = sum(result['decision_latency'] * result['decisions'] for result in results)
+    rewards = [result['reward'] for result in results]
+    return {
+        'episodes': len(results),
+        'reward': statistics.mean(rewards),
+        'reward_std': statistics.pstdev(rewards),
+        'ticks': statistics.mean(result['ticks'] for result in results),
+        'ended': sum(1 for result in results if result['ended']),
+        'completed': statistics.mean(result['completed'] for result in results),
+        'trash': statistics.mean(result['trash'] for result in results),
+        'decisions': decisions,
+        'decision_latency': decision_time / decisions if decisions else 0.0,
+    }
+
+
+def sweep(dm_types, anomalies, seeds, episodes=1, max_ticks=1000, workers=None):
+    # One task per policy, anomaly setting and seed, results grouped by policy and anomaly setting
+    configs = [(dm_type, anomaly, seed, episodes, max_ticks)
+               for dm_type in dm_types for anomaly in anomalies for seed in seeds]
+
+    grouped = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        for config, results in executor.map(run_config, configs):
+            grouped.setdefault((config[0], config[1]), []).extend(results)
+
+    report = []
+    for (dm_type, anomaly), results in grouped.items():
+        summary = summarize(results)
+        summary['dm_type'] = dm_type
+        summary['anomaly'] = anomaly
+        report.append(summary)
+    return report
@@ -0,0 +1,325 @@
+import bisect
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Inventory, Order, COMPLETED
+
+# Called as listener(state, item_type, src, dest) when an item of a persisted warehouse is added (src None) or moved.
+# item_type is None when the whole warehouse was loaded or reset.
+listeners = []
+
+
+class Item:
+    __slots__ = ('id', 'item_type', 'stored', 'updated')
+
+    def __init__(self, id, item_type, stored, updated):
+        self.id = id
+        self.item_type = item_type
+        self.stored = stored
+        self.updated = updated
+
+
+class OrderRecord:
+    __slots__ = ('id', 'item_type', 'dest', 'status')
+
+    def __init__(self, id, item_type, dest, status):
+        self.id = id
+        self.item_type = item_type
+        self.dest = dest
+        self.status = status
+
+    def __lt__(self, other):
+        return self.id < other.id
+
+
+class Savepoint:
+    def __init__(self, state):
+        # The state before the caller's transaction: the containers, and the fields of every record they hold
+        self.loaded = state.loaded
+        self.conveyors = [list(conveyor) for conveyor in state.conveyors]
+        self.orders = {key: list(orders) for key, orders in state.orders.items()}
+        self.order_counts = dict(state.order_counts)
+        self.completed_items = state.completed_items
+        self.next_order_id = state.next_order_id
+        self.created_items = list(state.created_items)
+        self.moved_items = dict(state.moved_items)
+        self.changed_orders = dict(state.changed_orders)
+
+        items = itertools.chain(itertools.chain.from_iterable(state.conveyors), state.created_items,
+                                state.moved_items.values())
+        self.items = [(item, item.id, item.stored, item.updated) for item in items]
+        orders = itertools.chain(itertools.chain.from_iterable(state.orders.values()), state.changed_orders.values())
+        self.statuses = [(order, order.status) for order in orders]
+
+    def restore(self, state):
+        for item, item_id, stored, updated in self.items:
+            item.id = item_id
+            item.stored = stored
+            item.updated = updated
+        for order, status in self.statuses:
+            order.status = status
+
+        state.loaded = self.loaded
+        state.conveyors = [deque(conveyor) for conveyor in self.conveyors]
+        state.orders = self.orders
+        state.order_counts = self.order_counts
+        state.completed_items = self.completed_items
+        state.next_order_id = self.next_order_id
+        state.created_items = self.created_items
+        state.moved_items = self.moved_items
+        state.changed_orders = self.changed_orders
+
+
+class Snapshot:
+    def __init__(self, conveyors, order_counts):
+        self.conveyors = conveyors
+        self.order_counts = order_counts
+
+    def count_items(self, item_type):
+        count = 0
+        for conveyor in self.conveyors:
+            count += conveyor.count(item_type)
+        return count
+
+    def order_count(self, item_type, status):
+        return self.order_counts.get((item_type, status), 0)
+
+    def total_orders(self, item_type=None):
+        return sum(count for (i, _), count in self.order_counts.items() if item_type is None or i == item_type)
+
+    def open_orders(self, item_type=None):
+        return sum(count for (i, status), count in self.order_counts.items()
+                   if status != Order.STATUS4 and (item_type is None or i == item_type))
+
+
+def count_orders(warehouse=0):
+    order_counts = {}
+    for row in Order.objects.filter(warehouse=warehouse).values('item_type', 'status') \
+            .annotate(count=Count('id')).order_by():
+        order_counts[(row['item_type'], row['status'])] = row['count']
+    return order_counts
+
+
+class WarehouseState:
+    def __init__(self, persist=True, batch_size=64, flush_interval=1.0, warehouse=0):
+        self.warehouse = warehouse
+        self.persist = persist
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+
+        self.loaded = not persist
+        self.savepoint = None
+        self.next_order_id = 1
+        self.last_flush = time.monotonic()
+        self._clear()
+
+    def _clear(self):
+        # Conveyors 0-2 are the repository, 3 is the shipment conveyor
+        self.conveyors = [deque() for _ in range(COMPLETED)]
+        self.orders = {}
+        self.order_counts = {}
+        self.completed_items = 0
+
+        # New items get their id when they are inserted, several warehouses share the Inventory table
+        self.created_items = []
+        self.moved_items = {}
+        self.changed_orders = {}
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def load(self):
+        with self.lock:
+            self._clear()
+            inventory = Inventory.objects.filter(warehouse=self.warehouse)
+            for item_id, item_type, stored, updated in inventory.filter(stored__lt=COMPLETED) \
+                    .order_by('updated', 'id').values_list('id', 'item_type', 'stored', 'updated'):
+                self.conveyors[stored].append(Item(item_id, item_type, stored, updated))
+            self.completed_items = inventory.filter(stored=COMPLETED).count()
+
+            self.order_counts = count_orders(self.warehouse)
+            for order_id, item_type, dest, status in Order.objects.filter(warehouse=self.warehouse) \
+                    .exclude(status=Order.STATUS4).order_by('id').values_list('id', 'item_type', 'dest', 'status'):
+                self.orders.setdefault((item_type, status), []).append(OrderRecord(order_id, item_type, dest, status))
+
+            self.loaded = True
+            self.last_flush = time.monotonic()
+            self.notify(None, None, None)
+
+    def reset(self):
+        with self.lock:
+            self._clear()
+            self.loaded = True
+            self.notify(None, None, None)
+
+    def notify(self, item_type, src, dest):
+        if self.persist:
+            for listener in listeners:
+                listener(self, item_type, src, dest)
+
+    # Inventory
+    def conveyor(self, stored):
+        self.ensure_loaded()
+        return self.conveyors[stored]
+
+    def first_item(self, stored, item_type=None):
+        for item in self.conveyor(stored):
+            if item_type is None or item.item_type == item_type:
+                return item
+        return None
+
+    def add_item(self, item_type, stored):
+        with self.lock:
+            self.ensure_loaded()
+            item = Item(None, item_type, stored, datetime.now())
+            self.conveyors[stored].append(item)
+            self.created_items.append(item)
+            self.notify(item_type, None, stored)
+        self.maybe_flush()
+        return item
+
+    def move_item(self, src, dest, item_type=None):
+        with self.lock:
+            item = self.first_item(src, item_type)
+            if item is None:
+                return None
+
+            self.conveyors[src].remove(item)
+            item.stored = dest
+            item.updated = datetime.now()
+            if dest == COMPLETED:
+                self.completed_items += 1
+            else:
+                self.conveyors[dest].append(item)
+
+            # Items that are not inserted yet are written with their latest position
+            if item.id is not None:
+                self.moved_items[item.id] = item
+            self.notify(item.item_type, src, dest)
+        self.maybe_flush()
+        return item
+
+    # Order
+    def _count_order(self, item_type, status, delta):
+        key = (item_type, status)
+        self.order_counts[key] = self.order_counts.get(key, 0) + delta
+
+    def order_count(self, item_type, status):
+        self.ensure_loaded()
+        return self.order_counts.get((item_type, status), 0)
+
+    def first_order(self, item_type, status, dest=None):
+        self.ensure_loaded()
+        for order in self.orders.get((item_type, status), ()):
+            if dest is None or order.dest == dest:
+                return order
+        return None
+
+    def add_order(self, order):
+        with self.lock:
+            self.ensure_loaded()
+            record = OrderRecord(order.id, order.item_type, order.dest, order.status)
+            self._count_order(record.item_type, record.status, 1)
+            bisect.insort(self.orders.setdefault((record.item_type, record.status), []), record)
+        return record
+
+    def new_order(self, item_type, dest):
+        # Orders that only exist in memory (simulation), persisted orders come from the Order table
+        with self.lock:
+            order = OrderRecord(self.next_order_id, item_type, dest, Order.STATUS1)
+            self.next_order_id += 1
+        return self.add_order(order)
+
+    def set_order_status(self, order, status):
+        with self.lock:
+            self.orders[(order.item_type, order.status)].remove(order)
+            self._count_order(order.item_type, order.status, -1)
+
+            order.status = status
+            self._count_order(order.item_type, status, 1)
+            if status != Order.STATUS4:
+                bisect.insort(self.orders.setdefault((order.item_type, status), []), order)
+
+            self.changed_orders[order.id] = order
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            self.ensure_loaded()
+            return Snapshot([[item.item_type for item in conveyor] for conveyor in self.conveyors],
+                            dict(self.order_counts))
+
+    # Transactions
+    def begin(self):
+        # Everything from here on, flushed or not, belongs to the caller's transaction
+        with self.lock:
+            self.savepoint = Savepoint(self)
+
+    def commit(self):
+        with self.lock:
+            self.savepoint = None
+
+    def rollback(self):
+        # Back to the state before begin: writes of earlier messages are pending again, those of the rolled back
+        # transaction are gone from memory as they are from the database
+        with self.lock:
+            savepoint, self.savepoint = self.savepoint, None
+            if savepoint is None:
+                return
+
+            savepoint.restore(self)
+            if self.loaded:
+                self.notify(None, None, None)
+
+    # Write-through
+    def pending(self):
+        return len(self.created_items) + len(self.moved_items) + len(self.changed_orders)
+
+    def maybe_flush(self):
+        if not self.persist:
+            return
+
+        if self.pending() >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.persist:
+            return
+
+        with self.lock:
+            items = self.created_items
+            created = [Inventory(warehouse=self.warehouse, item_type=item.item_type, stored=item.stored,
+                                 updated=item.updated) for item in items]
+            moved = [Inventory(id=item.id, item_type=item.item_type, stored=item.stored, updated=item.updated)
+                     for item in self.moved_items.values()]
+            changed = [Order(id=order.id, status=order.status) for order in self.changed_orders.values()]
+
+            self.created_items = []
+            self.moved_items = {}
+            self.changed_orders = {}
+            self.last_flush = time.monotonic()
+
+            if len(created) + len(moved) + len(changed) == 0:
+                return
+
+            with transaction.atomic():
+                if created:
+                    if connection.features.can_return_rows_from_bulk_insert:
+                        Inventory.objects.bulk_create(created)
+                    else:
+                        for row in created:
+                            row.save(force_insert=True)
+                    for item, row in zip(items, created):
+                        item.id = row.id
+                if moved:
+                    Inventory.objects.bulk_update(moved, ['stored', 'updated'])
+                if changed:
+                    Order.objects.bulk_update(changed, ['status'])
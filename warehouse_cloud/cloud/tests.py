@@ -1 +1,1009 @@
-# Create your tests here.
+import asyncio
+import concurrent.futures
+import io
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+import torch
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from runtime_verification import cycle, spec
+from runtime_verification.counters import InventoryCounters
+
+from . import checkpoints, edge, fastpath, inference, models, outbox, push, rl, rv, simulator, state, timeseries, trace
+from .models import Inventory, Order, Outbox, SHIPMENT, COMPLETED
+from .simulator import Simulator
+from .state import WarehouseState
+from .trainer import Trainer
+from .vecenv import VecWarehouse
+from .warehouses import WarehouseRegistry, warehouses
+
+
+class SensorySegmentMigrationTest(TransactionTestCase):
+    before = [('cloud', '0008_message_time_idx')]
+    after = [('cloud', '0009_sensory_segments')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_readings_are_moved_to_segments(self):
+        apps = self.migrate(self.before)
+        Sensory = apps.get_model('cloud', 'Sensory')
+        Sensory.objects.bulk_create([
+            Sensory(sensorID='t', datetime=datetime(2026, 1, 1, 10, 5), value=1.0),
+            Sensory(sensorID='t', datetime=datetime(2026, 1, 1, 10, 50), value=3.0),
+            Sensory(sensorID='t', datetime=datetime(2026, 1, 1, 11, 0), value=5.0),
+            Sensory(sensorID='h', datetime=datetime(2026, 1, 1, 10, 0), value=7.0),
+        ])
+
+        apps = self.migrate(self.after)
+        self.assertEqual(apps.get_model('cloud', 'Sensory').objects.count(), 0)
+        self.assertEqual(apps.get_model('cloud', 'SensorySegment').objects.count(), 3)
+
+        timestamps, values = timeseries.load('t')
+        self.assertEqual(list(values), [1.0, 3.0, 5.0])
+        self.assertEqual(timestamps[0], datetime(2026, 1, 1, 10, 5).timestamp())
+
+
+class SensoryApiTest(TestCase):
+    def test_post_returns_the_stored_readings(self):
+        client = APIClient()
+        readings = [{'sensorID': 't', 'value': 1.5, 'datetime': '2026-01-01T10:00:00'},
+                    {'sensorID': 't', 'value': 2.5, 'datetime': '2026-01-01T10:00:01'}]
+        response = client.post('/api/sensory/', readings, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dict(reading) for reading in response.data], readings)
+
+        response = client.get('/api/sensory/', {'sensorID': 't'})
+        self.assertEqual([reading['value'] for reading in response.data], [1.5, 2.5])
+
+
+class SensoryPageTest(TestCase):
+    def test_points_sharing_a_timestamp_are_not_dropped_between_pages(self):
+        time = datetime(2026, 1, 1, 10, 0)
+        timeseries.append([{'sensorID': 't', 'datetime': time, 'value': float(i)} for i in range(5)] +
+                          [{'sensorID': 't', 'datetime': datetime(2026, 1, 1, 10, 1), 'value': 5.0}])
+
+        client = APIClient()
+        values = []
+        cursor = None
+        while True:
+            params = {'sensorID': 't', 'limit': 2}
+            if cursor is not None:
+                params['cursor'] = cursor
+            response = client.get('/api/sensory/', params)
+            values.extend(reading['value'] for reading in response.data['results'])
+            cursor = response.data['next']
+            if cursor is None:
+                break
+
+        self.assertEqual(sorted(values), [0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+
+    def test_bare_timestamp_cursor_skips_every_point_at_it(self):
+        time = datetime(2026, 1, 1, 10, 0)
+        timeseries.append([{'sensorID': 't', 'datetime': time, 'value': 1.0},
+                           {'sensorID': 't', 'datetime': time, 'value': 2.0}])
+
+        response = APIClient().get('/api/sensory/', {'sensorID': 't', 'cursor': repr(time.timestamp())})
+        self.assertEqual(response.data['results'], [])
+
+
+class SensoryAggregateTest(TestCase):
+    def setUp(self):
+        # 10:00-10:59 and 11:00-11:59 one point a minute, value = minute of the day
+        timeseries.append([{'sensorID': 't', 'datetime': datetime(2026, 1, 1, 10 + i // 60, i % 60),
+                            'value': float(600 + i)} for i in range(120)])
+
+    def test_hours_cut_by_the_range_only_count_points_inside_it(self):
+        result = timeseries.aggregate('t', 3600, datetime(2026, 1, 1, 10, 30), datetime(2026, 1, 1, 11, 9))
+        self.assertEqual(list(result['count']), [30, 10])
+        self.assertEqual(list(result['min']), [630.0, 660.0])
+        self.assertEqual(list(result['max']), [659.0, 669.0])
+
+    def test_whole_hours_match_the_points(self):
+        result = timeseries.aggregate('t', 3600)
+        self.assertEqual(list(result['count']), [60, 60])
+        self.assertEqual(list(result['mean']), [629.5, 689.5])
+
+    def test_sub_hour_buckets_only_count_points_inside_the_range(self):
+        result = timeseries.aggregate('t', 600, datetime(2026, 1, 1, 10, 25), datetime(2026, 1, 1, 10, 52))
+        self.assertEqual(list(result['count']), [5, 10, 10, 3])
+        self.assertEqual(result['min'][0], 625.0)
+        self.assertEqual(result['max'][-1], 652.0)
+        self.assertEqual(list(result['mean']), [627.0, 634.5, 644.5, 651.0])
+
+    def test_downsampled_hours_keep_their_counts(self):
+        timeseries.apply_retention(datetime(2026, 1, 3))
+        result = timeseries.aggregate('t', 600)
+        self.assertEqual(list(result['count']), [60, 60])
+        self.assertEqual(list(result['min']), [600.0, 660.0])
+        self.assertEqual(list(result['mean']), [629.5, 689.5])
+
+
+class Answer:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class DispatcherTest(TestCase):
+    def setUp(self):
+        self.dispatcher = edge.Dispatcher(timeout=1.0, retries=2, backoff=0.1)
+        self.message = {'sender': models.CLOUD, 'title': 'Stop', 'msg': 'SAS'}
+        sleep = mock.patch.object(edge.time, 'sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def post(self, *answers):
+        with mock.patch.object(self.dispatcher.session, 'post', side_effect=answers) as post, \
+                self.assertLogs('cloud.edge', 'WARNING'):
+            response = self.dispatcher.post(edge.SHIPMENT, self.message, json=self.message)
+        return response, post
+
+    def test_connection_errors_and_server_errors_are_retried_with_backoff(self):
+        response, post = self.post(edge.requests.ConnectionError('refused'), Answer(503), Answer(201))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.1, 0.2])
+        self.assertEqual(post.call_args.kwargs['timeout'], 1.0)
+
+    def test_gives_up_after_the_retries(self):
+        response, post = self.post(*[edge.requests.Timeout('slow')] * 3)
+        self.assertIsNone(response)
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_client_errors_are_not_retried(self):
+        with mock.patch.object(self.dispatcher.session, 'post', return_value=Answer(400)) as post:
+            self.assertEqual(self.dispatcher.post(edge.SHIPMENT, self.message).status_code, 400)
+        self.assertEqual(post.call_count, 1)
+        self.sleep.assert_not_called()
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.worker = outbox.OutboxWorker()
+
+    def test_rows_are_delivered_in_order_once(self):
+        for i in range(3):
+            outbox.enqueue([edge.SHIPMENT], {'sender': models.CLOUD, 'title': 'Order Created', 'msg': str(i)})
+
+        sent = []
+        with mock.patch.object(edge.dispatcher, 'post',
+                               side_effect=lambda target, message, **kwargs: sent.append(message['msg']) or
+                               Answer(201)):
+            while self.worker.deliver(edge.SHIPMENT):
+                pass
+
+        self.assertEqual(sent, ['0', '1', '2'])
+        self.assertFalse(Outbox.objects.filter(delivered__isnull=True).exists())
+
+    def test_failed_rows_stay_pending(self):
+        outbox.enqueue([edge.SHIPMENT], {'sender': models.CLOUD, 'title': 'Stop', 'msg': 'SAS'})
+        with mock.patch.object(edge.dispatcher, 'post', return_value=None):
+            self.assertFalse(self.worker.deliver(edge.SHIPMENT))
+
+        row = Outbox.objects.get()
+        self.assertIsNone(row.delivered)
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual(self.worker.failures[edge.SHIPMENT], 1)
+
+
+    def test_rejected_rows_stay_visible_and_do_not_block_the_edge(self):
+        outbox.enqueue([edge.SHIPMENT], {'sender': models.CLOUD, 'title': 'Stop', 'msg': 'SAS'})
+        outbox.enqueue([edge.SHIPMENT], {'sender': models.CLOUD, 'title': 'Start', 'msg': 'SAS'})
+        with mock.patch.object(edge.dispatcher, 'post', side_effect=[Answer(400), Answer(201)]), \
+                self.assertLogs('cloud.outbox', 'WARNING'):
+            while self.worker.deliver(edge.SHIPMENT):
+                pass
+
+        rejected, delivered = Outbox.objects.order_by('id')
+        self.assertEqual((rejected.status, rejected.delivered is None, rejected.rejected is None), (400, True, False))
+        self.assertEqual((delivered.status, delivered.delivered is None, delivered.rejected is None), (201, False, True))
+
+    def test_purge_deletes_old_delivered_rows_only(self):
+        now = datetime(2026, 1, 10)
+        Outbox.objects.bulk_create([
+            Outbox(edge=edge.SHIPMENT, sender=models.CLOUD, title='old', delivered=datetime(2026, 1, 1)),
+            Outbox(edge=edge.SHIPMENT, sender=models.CLOUD, title='recent', delivered=datetime(2026, 1, 9)),
+            Outbox(edge=edge.SHIPMENT, sender=models.CLOUD, title='rejected', rejected=datetime(2026, 1, 1)),
+            Outbox(edge=edge.SHIPMENT, sender=models.CLOUD, title='pending'),
+        ])
+        outbox.purge(now)
+        self.assertEqual(set(Outbox.objects.values_list('title', flat=True)), {'recent', 'rejected', 'pending'})
+
+
+class OutboxConcurrencyTest(TransactionTestCase):
+    def test_an_edge_that_is_down_does_not_hold_back_the_others(self):
+        released = threading.Event()
+
+        def post(target, message, **kwargs):
+            if target == edge.CLASSIFICATION:
+                released.wait(5)
+                return None
+            return Answer(201)
+
+        worker = outbox.OutboxWorker(interval=0.05)
+        with mock.patch.object(edge.dispatcher, 'post', side_effect=post), mock.patch.object(outbox, 'worker', worker):
+            outbox.enqueue(edge.ALL, {'sender': models.CLOUD, 'title': 'Start', 'msg': 'SAS'})
+            worker.notify()
+
+            deadline = time.monotonic() + 5
+            while Outbox.objects.filter(delivered__isnull=False).count() < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            released.set()
+            worker.stop()
+
+        self.assertEqual(set(Outbox.objects.filter(delivered__isnull=False).values_list('edge', flat=True)),
+                         {edge.REPOSITORY, edge.SHIPMENT})
+
+
+class TrainerPublishTest(TestCase):
+    def test_weights_are_not_written_into_a_copy_that_is_being_read(self):
+        trainer = Trainer(torch.nn.Linear(2, 1), threaded=False)
+        published = threading.Event()
+
+        def publish_twice():
+            trainer.publish()
+            trainer.publish()
+            published.set()
+
+        with trainer.reading() as model:
+            before = [parameter.clone() for parameter in model.parameters()]
+            with torch.no_grad():
+                for parameter in trainer.training.parameters():
+                    parameter.add_(1.0)
+
+            publisher = threading.Thread(target=publish_twice)
+            publisher.start()
+            # The second publish has to wait for this reader, the copy it reads stays as it was
+            self.assertFalse(published.wait(0.2))
+            for parameter, original in zip(model.parameters(), before):
+                self.assertTrue(torch.equal(parameter, original))
+
+        self.assertTrue(published.wait(5))
+        publisher.join()
+        self.assertEqual(trainer.version, 2)
+        with trainer.reading() as model:
+            for parameter, source in zip(model.parameters(), trainer.training.parameters()):
+                self.assertTrue(torch.equal(parameter, source))
+
+
+class ModelRegistryTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.saved = rl.DQN()
+        torch.save(self.saved.state_dict(), os.path.join(self.directory.name, 'dqn.pth'))
+
+    def assertSameWeights(self, model):
+        for parameter, saved in zip(model.parameters(), self.saved.parameters()):
+            self.assertTrue(torch.equal(parameter, saved))
+
+    def test_loaded_model_is_shared_and_frozen(self):
+        registry = checkpoints.ModelRegistry(self.directory.name)
+        model = registry.get('dqn')
+
+        self.assertSameWeights(model)
+        self.assertIs(registry.get('dqn'), model)
+        self.assertFalse(model.training)
+        self.assertFalse(any(parameter.requires_grad for parameter in model.parameters()))
+
+    def test_trainable_copy_leaves_the_shared_model_alone(self):
+        registry = checkpoints.ModelRegistry(self.directory.name)
+        model = registry.trainable('dqn')
+        with torch.no_grad():
+            for parameter in model.parameters():
+                parameter.add_(1.0)
+
+        self.assertIsNot(model, registry.get('dqn'))
+        self.assertTrue(all(parameter.requires_grad for parameter in model.parameters()))
+        self.assertSameWeights(registry.get('dqn'))
+
+    def test_memory_mapped_loading(self):
+        self.assertSameWeights(checkpoints.ModelRegistry(self.directory.name, mmap=True).get('dqn'))
+
+    def test_torch_without_mmap_falls_back_to_a_plain_load(self):
+        load = torch.load
+
+        def old_load(path, map_location=None, **kwargs):
+            if 'mmap' in kwargs:
+                raise TypeError("load() got an unexpected keyword argument 'mmap'")
+            return load(path, map_location=map_location)
+
+        registry = checkpoints.ModelRegistry(self.directory.name, mmap=True)
+        with mock.patch.object(checkpoints.torch, 'load', old_load), self.assertLogs('cloud.checkpoints', 'WARNING'):
+            model = registry.get('dqn')
+
+        self.assertSameWeights(model)
+        self.assertFalse(registry.mmap)
+
+    def test_corrupt_checkpoint_is_reported_once_until_reloaded(self):
+        with open(os.path.join(self.directory.name, 'broken.pth'), 'wb') as f:
+            f.write(b'not a checkpoint')
+        registry = checkpoints.ModelRegistry(self.directory.name)
+
+        with self.assertLogs('cloud.checkpoints', 'ERROR'):
+            self.assertIsNone(registry.get('broken'))
+        with mock.patch.object(checkpoints.torch, 'load') as load:
+            self.assertIsNone(registry.get('broken'))
+            self.assertIsNone(registry.trainable('broken'))
+        load.assert_not_called()
+        self.assertIn('broken', registry.errors)
+
+        torch.save(self.saved.state_dict(), os.path.join(self.directory.name, 'broken.pth'))
+        registry.reload('broken')
+        self.assertSameWeights(registry.get('broken'))
+
+
+class FixedModel:
+    # Stands in for a DQN: the same Q-values for every state, counting the forward passes and their batch sizes
+    def __init__(self, values):
+        self.values = torch.tensor(values, dtype=torch.float32)
+        self.batches = []
+
+    def model(self, states):
+        self.batches.append(len(states))
+        return self.values.repeat(len(states), 1)
+
+    def select_tactic(self, state, available):
+        return torch.LongTensor([[-1]])
+
+
+class InferenceServiceTest(TestCase):
+    def request(self, service, model, available):
+        future = concurrent.futures.Future()
+        service.requests.put((model, [0.0] * 10, available, future))
+        return future
+
+    def test_requests_for_a_model_share_one_masked_forward_pass(self):
+        service = inference.InferenceService(max_wait=0.05)
+        first, second = FixedModel([[3.0, 2.0, 1.0]]), FixedModel([[1.0, 2.0, 3.0]])
+        futures = [self.request(service, first, [True, True, True]),
+                   self.request(service, first, [False, True, True]),
+                   self.request(service, second, [True, True, False]),
+                   self.request(service, first, [False, False, True])]
+        service.start()
+
+        self.assertEqual([future.result(5) for future in futures], [0, 1, 1, 2])
+        self.assertEqual((first.batches, second.batches), ([3], [1]))
+
+    def test_errors_reach_the_caller(self):
+        model = FixedModel([[1.0, 2.0]])
+        service = inference.InferenceService()
+        with self.assertRaises(RuntimeError):
+            service.select_tactic(model, [0.0] * 10, [True, True, True])
+
+    def test_no_available_conveyor_needs_no_decision(self):
+        self.assertIsNone(inference.InferenceService().select_tactic(FixedModel([[1.0]]), [0.0], [False] * 3))
+
+    def test_decision_falls_back_to_the_caller_after_the_timeout(self):
+        service = inference.InferenceService(timeout=0.05)
+        with mock.patch.object(service, 'start'), self.assertLogs('cloud.inference', 'WARNING'):
+            tactic = service.select_tactic(FixedModel([[1.0, 2.0, 3.0]]), [0.0] * 10, [True, True, True])
+        self.assertEqual(tactic.item(), -1)
+
+
+class MemoryTest(TestCase):
+    def fill(self, memory, values):
+        for value in values:
+            memory.push([value] * 2, 1, value, [value + 1] * 2)
+
+    def test_push_wraps_around_and_keeps_the_newest(self):
+        memory = rl.Memory(2, capacity=3)
+        self.fill(memory, range(5))
+
+        self.assertEqual((len(memory), memory.position), (3, 2))
+        self.assertEqual(memory.rewards.tolist(), [3.0, 4.0, 2.0])
+        self.assertEqual(memory.next_states[:, 0].tolist(), [4.0, 5.0, 3.0])
+
+    def test_extend_wraps_around_like_push(self):
+        pushed, extended = rl.Memory(2, capacity=3), rl.Memory(2, capacity=3)
+        self.fill(pushed, range(5))
+        self.fill(extended, range(1))
+        values = torch.arange(1, 5, dtype=torch.float32)
+        extended.extend(values.view(-1, 1).repeat(1, 2), [1] * 4, values, (values + 1).view(-1, 1).repeat(1, 2))
+
+        self.assertEqual((len(extended), extended.position), (len(pushed), pushed.position))
+        for field in ('states', 'tactics', 'rewards', 'next_states'):
+            self.assertTrue(torch.equal(getattr(extended, field), getattr(pushed, field)))
+
+    def test_sample_size(self):
+        memory = rl.Memory(2, capacity=8)
+        self.fill(memory, range(5))
+        indices, states, tactics, rewards, next_states, weights = memory.sample(4)
+
+        self.assertEqual([len(field) for field in (indices, states, tactics, rewards, next_states, weights)], [4] * 6)
+        self.assertEqual(len(set(indices.tolist())), 4)
+        self.assertTrue(all(index < 5 for index in indices.tolist()))
+        # Fewer rows than asked for: every row once, with a weight per row
+        indices, *_, weights = memory.sample(10)
+        self.assertEqual(sorted(indices.tolist()), [0, 1, 2, 3, 4])
+        self.assertEqual(len(weights), 5)
+
+    def test_prioritized_sampling_follows_updated_priorities(self):
+        torch.manual_seed(0)
+        memory = rl.Memory(2, capacity=8, prioritized=True)
+        self.fill(memory, range(4))
+        self.assertEqual(memory.priorities[:4].tolist(), [1.0] * 4)
+
+        indices, *_ = memory.sample(6)
+        self.assertEqual(len(indices), 6)
+        memory.update_priorities(torch.tensor([0, 1, 2]), torch.zeros(3))
+        memory.update_priorities(torch.tensor([3]), torch.tensor([-5.0]))
+        indices, *_, weights = memory.sample(32)
+
+        self.assertEqual(set(indices.tolist()), {3})
+        self.assertAlmostEqual(memory.priorities[3].item(), 5.0, places=4)
+        self.assertEqual(weights.max().item(), 1.0)
+        # A new row starts at the highest priority so it is seen at least once
+        self.fill(memory, [4])
+        self.assertAlmostEqual(memory.priorities[4].item(), 5.0, places=4)
+
+
+class DQNTest(TestCase):
+    def test_target_network_is_not_part_of_the_checkpoint_or_the_optimizer(self):
+        model = rl.DQN(batch_size=4)
+        for _ in range(4):
+            model.push([0.0] * model.input_size, 1, 1.0, [0.0] * model.input_size)
+
+        self.assertEqual(model.optimize_model(steps=2), 2)
+        self.assertIsNotNone(model.target_model)
+        self.assertFalse(any(key.startswith('target') for key in model.state_dict()))
+        self.assertEqual(len(list(model.parameters())), len(list(model.model.parameters())))
+        rl.DQN().load_state_dict(model.state_dict())
+
+    def test_no_step_until_the_memory_holds_a_batch(self):
+        model = rl.DQN(batch_size=4)
+        model.push([0.0] * model.input_size, 1, 1.0, [0.0] * model.input_size)
+        self.assertEqual(model.optimize_model(), 0)
+        self.assertEqual(model.updates, 0)
+
+
+class Scripted:
+    # Stands in for both random sources: orders come from item_types, every choice takes the first candidate
+    def __init__(self, item_types):
+        self.item_types = itertools.cycle(item_types)
+
+    # random.Random, used by Simulator and Warehouse
+    def randint(self, low, high):
+        return low if (low, high) == (0, 2) else next(self.item_types)
+
+    def choice(self, candidates):
+        return candidates[0]
+
+    def random(self, shape=None):
+        return 1.0 if shape is None else np.ones(shape)
+
+    # numpy Generator, used by VecWarehouse
+    def integers(self, low, high, size):
+        return np.array([next(self.item_types) for _ in range(size)])
+
+
+class VecWarehouseParityTest(TestCase):
+    def test_steps_match_the_simulator(self):
+        item_types = [1, 2, 3, 4, 4, 3, 2, 1, 1, 1, 2, 2, 3, 3, 4, 4, 1, 3, 2, 4]
+        simulator = Simulator('Random', anomaly=False)
+        simulator.random = Scripted(item_types)
+        simulator.warehouse.random = simulator.random
+        vec = VecWarehouse(1, anomaly=False)
+        vec.random = Scripted(item_types)
+
+        observation, info = vec.reset()
+        simulator.step()
+        for _ in range(200):
+            warehouse = simulator.warehouse
+            self.assertEqual(list(observation[0]), warehouse.get_state())
+            self.assertEqual(vec.reward[0], warehouse.reward)
+
+            # Decisions show up in the conveyors and orders the next observation sees
+            observation, rewards, dones, info = vec.step(vec.sample_actions(info['available']))
+            if dones[0]:
+                break
+            simulator.step()
+
+        self.assertFalse(simulator.step())
+        self.assertEqual(vec.completed[0]['reward'], simulator.warehouse.reward)
+        self.assertEqual(vec.completed[0]['completed'], 20)
+
+
+class SweepTest(TestCase):
+    def outcomes(self, report):
+        # Timings differ between runs, everything else follows from the seeds
+        return sorted((summary['dm_type'], summary['anomaly'], summary['reward'], summary['ticks'],
+                       summary['completed'], summary['trash'], summary['decisions']) for summary in report)
+
+    def test_same_seeds_give_the_same_results(self):
+        def run(parent_seed):
+            # Forked workers start from the parent's generators, which must not matter
+            random.seed(parent_seed)
+            np.random.seed(parent_seed)
+            torch.manual_seed(parent_seed)
+            # Enough episodes for the online model to start training on samples from its memory
+            return self.outcomes(simulator.sweep(['Random', 'ORL'], [True], [1, 2], episodes=10, max_ticks=300,
+                                                 workers=2))
+
+        first = run(10)
+        self.assertEqual([outcome[:2] for outcome in first], [('ORL', True), ('Random', True)])
+        self.assertEqual(run(20), first)
+
+
+class WarehouseStateTest(TestCase):
+    def test_flushed_state_loads_back(self):
+        state = WarehouseState(batch_size=1000, flush_interval=1000, warehouse=1)
+        state.reset()
+        for item_type, stored in [(1, 0), (2, 1), (3, 0)]:
+            state.add_item(item_type, stored)
+        state.move_item(0, SHIPMENT)
+        self.assertFalse(Inventory.objects.exists())
+
+        state.flush()
+        self.assertEqual(state.pending(), 0)
+        state.move_item(SHIPMENT, COMPLETED)
+        state.flush()
+
+        loaded = WarehouseState(warehouse=1)
+        self.assertEqual(loaded.snapshot().conveyors, [[3], [2], [], []])
+        self.assertEqual(loaded.completed_items, 1)
+        self.assertFalse(Inventory.objects.filter(warehouse=0).exists())
+
+    def test_orders_keep_their_status(self):
+        Order.objects.bulk_create([Order(warehouse=1, item_type=2, dest=0) for _ in range(2)])
+        first = Order.objects.order_by('id').first()
+        state = WarehouseState(batch_size=1000, flush_interval=1000, warehouse=1)
+        state.set_order_status(state.first_order(2, Order.STATUS1), Order.STATUS2)
+        state.flush()
+
+        self.assertEqual(Order.objects.get(id=first.id).status, Order.STATUS2)
+        loaded = WarehouseState(warehouse=1)
+        self.assertEqual(loaded.order_count(2, Order.STATUS1), 1)
+        self.assertEqual(loaded.first_order(2, Order.STATUS2).id, first.id)
+
+
+class WarehouseRegistryTest(TestCase):
+    def setUp(self):
+        self.registry = WarehouseRegistry()
+        self.registry.inline = True
+
+    def tearDown(self):
+        for target in self.registry.warehouses.values():
+            target.close()
+
+    def test_warehouse_is_anomaly_aware_until_started(self):
+        self.assertTrue(self.registry.handle(1, lambda target: target.anomaly_aware))
+
+        self.registry.handle_start(1, 'SAS', 'Random')
+        self.assertFalse(self.registry.handle(1, lambda target: target.anomaly_aware))
+        self.registry.handle_start(1, 'SAS', 'AAAA')
+        self.assertTrue(self.registry.handle(1, lambda target: target.anomaly_aware))
+
+    def test_failed_message_keeps_unflushed_items(self):
+        self.registry.handle_start(1, 'SAS', 'Random')
+        for item_type in [1, 2, 3]:
+            self.registry.handle(1, lambda target: target.classification_processed(item_type, 0))
+
+        with self.assertRaises(IndexError):
+            self.registry.handle(1, lambda target: target.repository_check(7))
+        self.assertEqual(self.registry.handle(1, lambda target: target.state.snapshot().conveyors[0]), [1, 2, 3])
+
+    def fail_after_flush(self, target):
+        # Changes the committed item and order, adds its own, writes all of it and then fails
+        target.state.move_item(0, 1)
+        target.state.set_order_status(target.state.first_order(2, Order.STATUS1), Order.STATUS2)
+        target.classification_processed(4, 2)
+        target.state.add_order(Order.objects.create(warehouse=1, item_type=3, dest=0))
+        target.state.flush()
+        raise ValueError
+
+    def test_rolled_back_flush_keeps_only_committed_writes(self):
+        self.registry.handle_start(1, 'SAS', 'Random')
+        order = Order.objects.create(warehouse=1, item_type=2, dest=0)
+        self.registry.handle(1, lambda target: target.state.add_order(order))
+        self.registry.handle(1, lambda target: target.classification_processed(1, 0))
+
+        with self.assertRaises(ValueError):
+            self.registry.handle(1, self.fail_after_flush)
+        state = self.registry.warehouses[1].state
+        self.assertFalse(Inventory.objects.exists())
+        self.assertEqual(list(Order.objects.values_list('item_type', 'status')), [(2, Order.STATUS1)])
+        self.assertEqual(state.snapshot().conveyors, [[1], [], [], []])
+        self.assertEqual(state.snapshot().order_counts, {(2, Order.STATUS1): 1})
+        self.assertEqual(state.first_order(2, Order.STATUS1).status, Order.STATUS1)
+        self.assertEqual(state.pending(), 1)
+
+        state.flush()
+        self.assertEqual(list(Inventory.objects.values_list('item_type', 'stored')), [(1, 0)])
+
+    def test_retry_after_a_failed_message_writes_once(self):
+        self.registry.handle_start(1, 'SAS', 'Random')
+        failing = [True]
+
+        def handler(target):
+            # The same message twice, it fails after its first flush the first time
+            target.classification_processed(4, 2)
+            target.state.flush()
+            if failing.pop():
+                raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.registry.handle(1, handler)
+        failing.append(False)
+        self.registry.handle(1, handler)
+
+        self.assertEqual(list(Inventory.objects.values_list('item_type', 'stored')), [(4, 2)])
+        self.assertEqual(self.registry.handle(1, lambda target: target.state.snapshot().conveyors[2]), [4])
+
+    def test_rolled_back_order_is_dropped(self):
+        self.registry.handle_start(1, 'SAS', 'Random')
+
+        def handler(target):
+            target.state.add_order(Order.objects.create(warehouse=1, item_type=2, dest=0))
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.registry.handle(1, handler)
+        self.assertEqual(self.registry.handle(1, lambda target: target.state.order_count(2, Order.STATUS1)), 0)
+
+
+class FastPathTest(TransactionTestCase):
+    def setUp(self):
+        warehouses.start(3, 'SAS', 'Random')
+
+    def tearDown(self):
+        warehouses.warehouses.pop(3).close()
+
+    def poll(self, wait, sender=models.EDGE_CLASSIFICATION, msg=1):
+        scope = {'type': 'http', 'headers': [], 'query_string': ('warehouse=3&sender=%d&msg=%d&wait=%s' % (
+            sender, msg, wait)).encode()}
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(fastpath.handle(scope, receive, send))
+        return sent[0]['status'], sent[1]['body']
+
+    def test_idle_poll_does_not_run_the_check_again(self):
+        with mock.patch.object(warehouses, 'handle', wraps=warehouses.handle) as handle:
+            self.assertEqual(self.poll(0.5), (204, b''))
+        self.assertEqual(handle.call_count, 1)
+
+    def test_poll_answers_when_a_decision_is_made(self):
+        def decide():
+            time.sleep(0.2)
+            warehouses.run(3, lambda target: setattr(target, 'c_allow', 1))
+
+        deciding = threading.Thread(target=decide)
+        deciding.start()
+        started = time.monotonic()
+        self.assertEqual(self.poll(5), (201, b'1'))
+        self.assertLess(time.monotonic() - started, 4)
+        deciding.join()
+
+    def test_check_that_moves_an_item_is_recorded(self):
+        warehouses.run(3, lambda target: target.classification_processed(2, 1))
+
+        self.assertEqual(self.poll(0, models.EDGE_SHIPMENT, 2), (204, b''))
+        self.assertEqual(self.poll(0, models.EDGE_SHIPMENT, 2), (204, b''))
+        self.assertEqual(list(models.Message.objects.values_list('sender', 'title', 'msg')),
+                         [(models.EDGE_SHIPMENT, 'SAS Check', '2')])
+
+    def test_shipment_poll_checks_again_after_a_decision(self):
+        def arrive_and_decide():
+            time.sleep(0.2)
+            warehouses.run(3, lambda target: target.classification_processed(2, 1))
+            warehouses.run(3, lambda target: setattr(target, 's_allow', 0))
+
+        deciding = threading.Thread(target=arrive_and_decide)
+        deciding.start()
+        self.assertEqual(self.poll(5, models.EDGE_SHIPMENT, 2), (201, b'0'))
+        deciding.join()
+
+        self.assertEqual(warehouses.run(3, lambda target: target.state.snapshot().conveyors), [[], [], [], [2]])
+        self.assertEqual(list(models.Message.objects.values_list('sender', 'title', 'msg')),
+                         [(models.EDGE_SHIPMENT, 'SAS Check', '2')])
+
+    def test_bad_location_is_a_bad_request(self):
+        self.assertEqual(self.poll(0, models.EDGE_REPOSITORY, 7)[0], 400)
+
+
+class PushTest(TransactionTestCase):
+    def setUp(self):
+        warehouses.start(4, 'SAS', 'Random')
+
+    def tearDown(self):
+        warehouses.warehouses.pop(4).close()
+
+    def serve(self, sender, frames):
+        scope = {'type': 'websocket', 'query_string': ('warehouse=4&sender=%d' % sender).encode()}
+        messages = [{'type': 'websocket.connect'}] + \
+            [{'type': 'websocket.receive', 'text': json.dumps(frame)} for frame in frames] + \
+            [{'type': 'websocket.disconnect'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(push.serve(scope, receive, send))
+        return [json.loads(message['text']) for message in sent if message['type'] == 'websocket.send']
+
+    def test_every_failed_frame_is_answered(self):
+        frames = [{'title': 'SAS Check', 'msg': '7', 'id': 1}, {'title': 'SAS Check', 'msg': '0', 'id': 2}]
+        with mock.patch.object(push.api, 'handle_edge', side_effect=[RuntimeError('down'), (204, None)]), \
+                self.assertLogs('cloud.push', 'ERROR'):
+            replies = self.serve(models.EDGE_REPOSITORY, frames)
+        self.assertEqual([reply['status'] for reply in replies], [500, 204])
+
+        replies = self.serve(models.EDGE_REPOSITORY, frames[:1])
+        self.assertEqual([reply['status'] for reply in replies], [400])
+
+    def test_frames_do_not_keep_a_connection_open(self):
+        threads = []
+
+        def close_old_connections():
+            threads.append(threading.current_thread())
+
+        frames = [{'title': 'Classification Processed', 'msg': {'item_type': 1, 'stored': 0}}]
+        with mock.patch.object(push, 'close_old_connections', close_old_connections), \
+                mock.patch.object(push.api, 'handle_edge', side_effect=RuntimeError('down')), \
+                self.assertLogs('cloud.push', 'ERROR'):
+            self.serve(models.EDGE_CLASSIFICATION, frames)
+        # Before and after the frame, on the executor thread that wrote its Message row, also when it failed
+        self.assertEqual(models.Message.objects.count(), 1)
+        self.assertEqual(len(threads), 2)
+        self.assertIs(threads[0], threads[1])
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_check_that_moves_an_item_is_recorded(self):
+        warehouses.run(4, lambda target: target.classification_processed(3, 0))
+        self.serve(models.EDGE_SHIPMENT, [{'title': 'SAS Check', 'msg': '3'}, {'title': 'SAS Check', 'msg': '3'}])
+
+        self.assertEqual(list(models.Message.objects.values_list('title', 'msg')), [('SAS Check', '3')])
+        self.assertEqual(warehouses.run(4, lambda target: target.state.snapshot().conveyors),
+                         [[], [], [], [3]])
+
+
+class InventoryCountersTest(TestCase):
+    def setUp(self):
+        self.counters = InventoryCounters()
+        self.counters.subscribe()
+        self.addCleanup(state.listeners.remove, self.counters.changed)
+
+    def count(self, warehouse):
+        with cycle.Cycle():
+            self.counters.ensure()
+            return self.counters.conveyor(0, warehouse)
+
+    def test_warehouses_of_other_processes_are_counted_every_cycle(self):
+        self.assertEqual(self.count(6), 0)
+        Inventory.objects.bulk_create([Inventory(warehouse=6, item_type=1, stored=0) for _ in range(7)])
+        self.assertEqual(self.count(6), 7)
+
+    def test_loaded_warehouse_is_followed_in_memory(self):
+        Inventory.objects.create(warehouse=7, item_type=1, stored=0)
+        warehouse_state = WarehouseState(batch_size=1000, flush_interval=1000, warehouse=7)
+        warehouse_state.add_item(2, 0)
+
+        self.assertEqual(self.count(7), 2)
+        Inventory.objects.create(warehouse=7, item_type=1, stored=0)
+        self.assertEqual(self.count(7), 2)
+
+
+class VerifierTest(TransactionTestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return condition()
+
+    def test_inventory_changes_are_seen_while_it_runs(self):
+        absence, _, existence = rv.properties
+        verifier = rv.Verifier(interval=0.05, log=False)
+        verifier.start()
+        try:
+            self.assertTrue(self.wait_for(lambda: verifier.cycles >= 2))
+            self.assertTrue(absence.status)
+            self.assertFalse(existence.status)
+
+            Inventory.objects.bulk_create([Inventory(warehouse=8, item_type=1, stored=0) for _ in range(7)])
+            self.assertTrue(self.wait_for(lambda: not absence.status and existence.status))
+        finally:
+            verifier.stop()
+
+        self.assertEqual(models.Verification.objects.get(property_name=absence.name).verification_result, False)
+
+    def test_only_the_verifying_process_follows_its_warehouses(self):
+        with mock.patch.object(rv.counters, 'subscribed', False), mock.patch.object(state, 'listeners', []):
+            registry = WarehouseRegistry()
+            registry.create(9, 'SAS', 'Random').close()
+            self.assertEqual(state.listeners, [])
+
+            verifier = rv.Verifier(interval=0.05, log=False)
+            verifier.start()
+            verifier.stop()
+            self.assertEqual(state.listeners, [rv.counters.changed])
+
+
+class CycleTest(TestCase):
+    def test_shared_event_is_evaluated_once_per_cycle(self):
+        absence, existence = spec.compile_text('pattern: absence\nevent: total > 3\n\npattern: existence\n'
+                                               'event: total > 3')
+        self.assertIs(absence.event, existence.event)
+
+        with mock.patch.object(absence.event, 'hold', return_value=False) as hold:
+            for _ in range(2):
+                with cycle.Cycle(snapshot=False):
+                    absence.check()
+                    existence.check()
+        self.assertEqual(hold.call_count, 2)
+
+    def test_counters_are_read_with_one_query_per_cycle(self):
+        properties = spec.compile_text('pattern: absence\nevent: total > 3\n\npattern: existence\n'
+                                       'event: conveyor(1) >= 1\n\npattern: absence\nevent: items(2) > 1\n'
+                                       'warehouse: 5')
+        Inventory.objects.create(warehouse=5, item_type=2, stored=1)
+
+        with mock.patch.multiple(spec.counters, conveyors={}, item_types={}, tracked=set(), replaying=False,
+                                 cycle=None):
+            for _ in range(2):
+                with self.assertNumQueries(1), cycle.Cycle(snapshot=False):
+                    for prop in properties:
+                        prop.check()
+                    self.assertEqual(spec.counters.conveyor(1), 1)
+
+    def test_properties_use_the_time_of_the_cycle(self):
+        start = datetime(2026, 1, 1)
+        with mock.patch.multiple(spec.counters, conveyors={}, item_types={}, replaying=True):
+            with cycle.Cycle(now=start, snapshot=False):
+                # Nothing is in the system: total >= 0 always holds, total > 0 never does
+                properties = spec.compile_text(
+                    'pattern: maximum_duration\nevent: total >= 0\nduration: 10\n\n'
+                    'pattern: recurrence\nevent: total > 0\nduration: 10\n\n'
+                    'pattern: universality\nevent: total > 0\nfrom: 2026-01-01T00:00:10\nto: 2026-01-01T00:01:00')
+                for prop in properties:
+                    prop.check()
+
+            statuses = []
+            for seconds in [5, 11]:
+                with cycle.Cycle(now=start + timedelta(seconds=seconds), snapshot=False):
+                    for prop in properties:
+                        prop.check()
+                statuses.append([prop.status for prop in properties])
+
+        self.assertEqual(statuses, [[True, True, True], [False, False, False]])
+
+
+class SpecTest(TestCase):
+    def test_blocks_are_split_on_blank_lines(self):
+        specs = spec.parse('# comment\npattern: absence\nevent: total > 1  # inline\n\n---\npattern: existence\n'
+                           'event: total >= 1\n')
+        self.assertEqual(specs, [(2, {'pattern': 'absence', 'event': 'total > 1'}),
+                                 (6, {'pattern': 'existence', 'event': 'total >= 1'})])
+
+    def test_errors_name_their_line(self):
+        for text, line in [('pattern: absence\nevent: total > 1\nevent: total > 2', 3),
+                           ('pattern: absence\ncolour: red', 2),
+                           ('pattern: absence\nevent: items() > 1', 1),
+                           ('pattern: absence\nevent: items_except() == 0', 1),
+                           ('pattern: absence\nevent: conveyor(4) > 1', 1),
+                           ('pattern: absence\nevent: total', 1),
+                           ('pattern: sometimes\nevent: total > 1', 1),
+                           ('pattern: bounded_existence\nevent: total > 1', 1),
+                           ('pattern: absence\nevent: total > 1\n\npattern: absence\nevent: total > 1', 4)]:
+            with self.assertRaises(spec.SpecError) as raised:
+                spec.compile_text(text)
+            self.assertEqual(raised.exception.line, line, text)
+
+    def test_equal_events_and_scopes_are_shared(self):
+        first, second = spec.compile_text('pattern: absence\nevent: max_conveyor > 5\nbetween: total >= 1\n'
+                                          'and: total == 0\n\npattern: existence\nevent: max_conveyor > 5\n'
+                                          'between: total >= 1\nand: total == 0')
+        self.assertIs(first.event, second.event)
+        self.assertIs(first.scope, second.scope)
+        self.assertEqual(first.name, 'It is never the case that max_conveyor > 5 holds between total >= 1 and '
+                                     'total == 0')
+
+    def test_events_compare_the_counters(self):
+        absence, = spec.compile_text('pattern: absence\nevent: items(1, 2) > 1\nwarehouse: 2')
+        with mock.patch.object(spec.counters, 'item_types', {2: {1: 1, 2: 0, 3: 5}, 3: {1: 9}}), \
+                mock.patch.object(spec.counters, 'replaying', True):
+            absence.check()
+            self.assertTrue(absence.status)
+            spec.counters.item_types[2][2] += 1
+            absence.check()
+            self.assertFalse(absence.status)
+
+    def test_shipped_properties_keep_their_names(self):
+        self.assertEqual([prop.name for prop in rv.properties], [
+            'It is never the case that The number of items is over the capacity holds',
+            'It is always the case that Items entering the system are one of red, white, yellow, blue holds',
+            'Total number of items in the system reaches ”1 holds eventually',
+        ])
+
+
+class ReplayTest(TestCase):
+    def setUp(self):
+        # The replay takes over the item counters of the process, the other tests get them back
+        patcher = mock.patch.multiple(trace.counters, conveyors={}, item_types={}, tracked=set(), replaying=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time = datetime(2026, 1, 1, 10, 0)
+
+    def record(self, sender, title, msg, warehouse=0):
+        self.time += timedelta(seconds=1)
+        models.Message.objects.create(warehouse=warehouse, sender=sender, title=title, msg=msg, datetime=self.time)
+
+    def classify(self, item_type, stored):
+        self.record(models.EDGE_CLASSIFICATION, 'Classification Processed',
+                    json.dumps({'item_type': item_type, 'stored': stored}))
+
+    def replay(self, text):
+        replay = trace.Replay(spec.compile_text(text))
+        replay.run(trace.trace())
+        return replay
+
+    def test_items_are_rebuilt_from_the_messages(self):
+        self.record(models.USER, 'Start', 'SAS')
+        for item_type in [1, 2, 1]:
+            self.classify(item_type, 0)
+        Order.objects.create(item_type=1, dest=0, made=self.time + timedelta(seconds=1))
+        self.time += timedelta(seconds=1)
+        self.record(models.EDGE_REPOSITORY, 'Order Processed', '0')
+        self.record(models.EDGE_SHIPMENT, 'Order Processed', json.dumps({'item_type': 1, 'dest': 0}))
+
+        replay = self.replay('name: full\npattern: absence\nevent: conveyor(0) > 3\n\n'
+                             'name: started\npattern: existence\nevent: total >= 1')
+        self.assertEqual(replay.status, {'full': True, 'started': True})
+        self.assertEqual(replay.conveyors[0], [[2, 1], [], [], []])
+        self.assertEqual((replay.completed[0], replay.trash[0], replay.missing), (1, 0, 0))
+        self.assertEqual([change[1:] for change in replay.changes], [('started', True)])
+
+    def test_property_fails_at_the_message_that_breaks_it(self):
+        for item_type in [1, 2, 3]:
+            self.classify(item_type, 1)
+        breaking = self.time
+        replay = self.replay('name: full\npattern: absence\nevent: conveyor(1) > 2')
+        self.assertEqual(replay.changes, [(breaking, 'full', False)])
+
+    def test_moves_of_unrecorded_items_are_reported(self):
+        self.record(models.USER, 'Start', 'SAS')
+        self.record(models.EDGE_SHIPMENT, 'Order Processed', json.dumps({'item_type': 4, 'dest': 0}))
+        self.record(models.USER, 'Start', 'SAS')
+
+        output = io.StringIO()
+        with mock.patch.object(spec, 'load', return_value=spec.compile_text('pattern: existence\nevent: total >= 1')):
+            call_command('replay', stdout=output)
+        self.assertIn('1 moves of items that are not in the trace', output.getvalue())
+        self.assertIn('warehouse 0: 2 experiments', output.getvalue())
+
+    def test_recorded_shipment_check_moves_the_item(self):
+        self.classify(3, 2)
+        self.record(models.EDGE_SHIPMENT, 'SAS Check', '3')
+        self.record(models.EDGE_SHIPMENT, 'Order Processed', json.dumps({'item_type': 3, 'dest': -1}))
+
+        replay = self.replay('pattern: existence\nevent: total >= 1')
+        self.assertEqual(replay.conveyors[0], [[], [], [], []])
+        self.assertEqual((replay.trash[0], replay.missing), (1, 0))
@@ -0,0 +1,305 @@
+import bisect
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from warehouse_cloud.settings import settings
+
+from .models import SensorySegment
+
+
+def floor_hour(time):
+    return time.replace(minute=0, second=0, microsecond=0)
+
+
+def pack(points):
+    data = array('d')
+    for time, value in points:
+        data.append(time.timestamp())
+        data.append(value)
+    return data.tobytes()
+
+
+def interleave(timestamps, values):
+    pairs = array('d', [0.0]) * (2 * len(timestamps))
+    pairs[0::2] = timestamps
+    pairs[1::2] = values
+    return pairs.tobytes()
+
+
+def unpack(data):
+    pairs = array('d')
+    pairs.frombytes(data)
+    return pairs[0::2], pairs[1::2]
+
+
+def make_segment(sensor_id, hour, points):
+    values = [value for _, value in points]
+    return SensorySegment(sensorID=sensor_id, hour=hour, first=points[0][0], last=points[-1][0],
+                          count=len(points), minimum=min(values), maximum=max(values), total=sum(values),
+                          data=pack(points))
+
+
+def append(rows):
+    # Every batch becomes new segments, one per (sensor, hour), so ingest never rewrites stored data
+    chunks = {}
+    for row in rows:
+        key = (row['sensorID'], floor_hour(row['datetime']))
+        chunks.setdefault(key, []).append((row['datetime'], float(row['value'])))
+
+    segments = []
+    for (sensor_id, hour), points in chunks.items():
+        points.sort(key=lambda point: point[0])
+        segments.append(make_segment(sensor_id, hour, points))
+
+    return SensorySegment.objects.bulk_create(segments)
+
+
+def segments(sensor_id, start=None, end=None):
+    queryset = SensorySegment.objects.filter(sensorID=sensor_id)
+    if start is not None:
+        queryset = queryset.filter(hour__gte=floor_hour(start))
+    if end is not None:
+        queryset = queryset.filter(hour__lte=end)
+    return queryset.order_by('hour', 'first', 'id')
+
+
+def read(sensor_id, start=None, end=None):
+    # Yields (timestamps, values) arrays per hour, in time order
+    start_ts = start.timestamp() if start is not None else float('-inf')
+    end_ts = end.timestamp() if end is not None else float('inf')
+
+    def merge(chunk):
+        timestamps = array('d')
+        values = array('d')
+        for segment_ts, segment_values in chunk:
+            timestamps.extend(segment_ts)
+            values.extend(segment_values)
+
+        if len(chunk) > 1:
+            pairs = sorted(zip(timestamps, values))
+            timestamps = array('d', [pair[0] for pair in pairs])
+            values = array('d', [pair[1] for pair in pairs])
+
+        if timestamps and (timestamps[0] < start_ts or timestamps[-1] > end_ts):
+            kept = [i for i, timestamp in enumerate(timestamps) if start_ts <= timestamp <= end_ts]
+            timestamps = array('d', [timestamps[i] for i in kept])
+            values = array('d', [values[i] for i in kept])
+        return timestamps, values
+
+    hour = None
+    chunk = []
+    for segment_hour, first, last, count, total, data in segments(sensor_id, start, end) \
+            .values_list('hour', 'first', 'last', 'count', 'total', 'data').iterator():
+        if segment_hour != hour and chunk:
+            yield merge(chunk)
+            chunk = []
+        hour = segment_hour
+
+        if data is not None:
+            chunk.append(unpack(bytes(data)))
+        else:
+            # Downsampled segment: a single mean point in the middle of the recorded span
+            middle = first.timestamp() + (last.timestamp() - first.timestamp()) / 2
+            chunk.append((array('d', [middle]), array('d', [total / count])))
+
+    if chunk:
+        yield merge(chunk)
+
+
+def parse_cursor(cursor):
+    # 'timestamp:skip' continues after the first `skip` points at timestamp, a bare timestamp after all of them
+    timestamp, _, skip = cursor.partition(':')
+    return float(timestamp), int(skip) if skip else None
+
+
+def next_cursor(timestamps, after=None):
+    # Points sharing the last timestamp may continue on the next page, so the cursor counts those already sent
+    last = timestamps[-1]
+    skip = len(timestamps) - bisect.bisect_left(timestamps, last)
+    if after is not None and after[0] == last and skip == len(timestamps):
+        skip += after[1] if after[1] is not None else 0
+    return '%r:%d' % (last, skip)
+
+
+def page(sensor_id, start=None, after=None, limit=None):
+    # Like read, but only points after the (timestamp, skip) cursor and at most `limit` points
+    if after is not None:
+        after_time = datetime.fromtimestamp(after[0])
+        start = after_time if start is None else max(start, after_time)
+        skip = after[1]
+
+    remaining = limit
+    for timestamps, values in read(sensor_id, start):
+        if after is not None and timestamps and timestamps[0] <= after[0]:
+            kept = bisect.bisect_left(timestamps, after[0])
+            equal = bisect.bisect_right(timestamps, after[0]) - kept
+            if skip is None or skip >= equal:
+                kept += equal
+                skip = None if skip is None else skip - equal
+            else:
+                kept += skip
+                skip = 0
+            timestamps, values = timestamps[kept:], values[kept:]
+        if remaining is not None:
+            timestamps, values = timestamps[:remaining], values[:remaining]
+            remaining -= len(timestamps)
+
+        if timestamps:
+            yield timestamps, values
+        if remaining == 0:
+            return
+
+
+def load(sensor_id, start=None, end=None):
+    timestamps = []
+    values = []
+    for chunk_timestamps, chunk_values in read(sensor_id, start, end):
+        timestamps.append(np.frombuffer(chunk_timestamps, dtype=np.float64))
+        values.append(np.frombuffer(chunk_values, dtype=np.float64))
+
+    if not timestamps:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(timestamps), np.concatenate(values)
+
+
+def reduce_buckets(keys, counts, minimums, maximums, totals):
+    # keys must be sorted; rows with the same key are merged into one bucket
+    if len(keys) == 0:
+        return {'timestamp': keys, 'count': counts, 'min': minimums, 'max': maximums, 'mean': totals}
+
+    buckets, first = np.unique(keys, return_index=True)
+    count = np.add.reduceat(counts, first)
+    return {
+        'timestamp': buckets,
+        'count': count,
+        'min': np.minimum.reduceat(minimums, first),
+        'max': np.maximum.reduceat(maximums, first),
+        'mean': np.add.reduceat(totals, first) / count,
+    }
+
+
+def summaries(sensor_id, start=None, end=None, hours=None):
+    # (timestamps, counts, minimums, maximums, totals) in time order: one row per stored point, and one per
+    # downsampled segment (at the middle of its span) with the counts it was stored with
+    start_ts = start.timestamp() if start is not None else float('-inf')
+    end_ts = end.timestamp() if end is not None else float('inf')
+
+    queryset = segments(sensor_id, start, end)
+    if hours is not None:
+        queryset = queryset.filter(hour__in=hours)
+
+    parts = []
+    for first, last, count, minimum, maximum, total, data in queryset \
+            .values_list('first', 'last', 'count', 'minimum', 'maximum', 'total', 'data').iterator():
+        if data is not None:
+            pairs = np.frombuffer(bytes(data), dtype=np.float64).reshape(-1, 2)
+            pairs = pairs[(pairs[:, 0] >= start_ts) & (pairs[:, 0] <= end_ts)]
+            values = pairs[:, 1]
+            parts.append((pairs[:, 0], np.ones(len(pairs), dtype=np.int64), values, values, values))
+        else:
+            middle = first.timestamp() + (last.timestamp() - first.timestamp()) / 2
+            if start_ts <= middle <= end_ts:
+                parts.append((np.array([middle]), np.array([count], dtype=np.int64), np.array([minimum]),
+                              np.array([maximum]), np.array([total])))
+
+    if not parts:
+        return np.empty(0), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0)
+    timestamps, counts, minimums, maximums, totals = (np.concatenate(column) for column in zip(*parts))
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], counts[order], minimums[order], maximums[order], totals[order]
+
+
+def aggregate(sensor_id, bucket, start=None, end=None):
+    # min/max/mean/count per bucket of `bucket` seconds, buckets aligned on multiples of `bucket`
+    if bucket % 3600 != 0:
+        timestamps, counts, minimums, maximums, totals = summaries(sensor_id, start, end)
+        return reduce_buckets(timestamps // bucket * bucket, counts, minimums, maximums, totals)
+
+    # Whole hours: hours inside the range are grouped from the per-segment aggregates in SQL, the hours cut by
+    # start or end are clipped point by point
+    edges = set()
+    if start is not None and start != floor_hour(start):
+        edges.add(floor_hour(start))
+    if end is not None:
+        edges.add(floor_hour(end))
+
+    rows = list(segments(sensor_id, start, end).exclude(hour__in=edges).values_list('hour').order_by('hour')
+                .annotate(Sum('count'), Min('minimum'), Max('maximum'), Sum('total')))
+    hours = np.array([row[0].timestamp() for row in rows])
+    counts, minimums, maximums, totals = (np.array([row[i] for row in rows]) for i in range(1, 5))
+
+    if edges:
+        timestamps, edge_counts, edge_minimums, edge_maximums, edge_totals = \
+            summaries(sensor_id, start, end, sorted(edges))
+        hours = np.concatenate([hours, timestamps])
+        counts = np.concatenate([counts, edge_counts])
+        minimums = np.concatenate([minimums, edge_minimums])
+        maximums = np.concatenate([maximums, edge_maximums])
+        totals = np.concatenate([totals, edge_totals])
+
+    keys = hours // bucket * bucket
+    order = np.argsort(keys, kind='stable')
+    return reduce_buckets(keys[order], counts[order].astype(np.int64), minimums[order].astype(np.float64),
+                          maximums[order].astype(np.float64), totals[order].astype(np.float64))
+
+
+def lttb(timestamps, values, threshold):
+    # Largest-Triangle-Three-Buckets downsampling to `threshold` points
+    length = len(timestamps)
+    if threshold >= length or threshold < 3:
+        return timestamps, values
+
+    selected = np.zeros(threshold, dtype=np.int64)
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for i in range(threshold - 2):
+        begin, finish = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < threshold - 1 else length
+        average_x = timestamps[finish:next_end].mean() if next_end > finish else timestamps[-1]
+        average_y = values[finish:next_end].mean() if next_end > finish else values[-1]
+
+        area = np.abs((timestamps[previous] - average_x) * (values[begin:finish] - values[previous]) -
+                      (timestamps[previous] - timestamps[begin:finish]) * (average_y - values[previous]))
+        previous = begin + int(area.argmax())
+        selected[i + 1] = previous
+
+    selected[-1] = length - 1
+    return timestamps[selected], values[selected]
+
+
+def compact(before):
+    # Merge the segments of each finished hour into a single segment
+    groups = SensorySegment.objects.filter(hour__lt=before, data__isnull=False).values('sensorID', 'hour') \
+        .annotate(segment_count=Count('id')).filter(segment_count__gt=1).order_by()
+
+    for group in groups:
+        with transaction.atomic():
+            queryset = SensorySegment.objects.filter(sensorID=group['sensorID'], hour=group['hour'],
+                                                     data__isnull=False)
+            points = []
+            ids = []
+            for segment_id, data in queryset.values_list('id', 'data'):
+                ids.append(segment_id)
+                timestamps, values = unpack(bytes(data))
+                points.extend(zip(timestamps, values))
+
+            points.sort()
+            points = [(datetime.fromtimestamp(timestamp), value) for timestamp, value in points]
+            SensorySegment.objects.filter(id__in=ids).delete()
+            make_segment(group['sensorID'], group['hour'], points).save()
+
+
+def apply_retention(now=None):
+    if now is None:
+        now = datetime.now()
+
+    compact(floor_hour(now))
+
+    raw_cutoff = floor_hour(now - timedelta(hours=settings.get('sensory_raw_retention_hours', 24)))
+    SensorySegment.objects.filter(hour__lt=raw_cutoff, data__isnull=False).update(data=None)
+
+    cutoff = floor_hour(now - timedelta(days=settings.get('sensory_retention_days', 30)))
+    SensorySegment.objects.filter(hour__lt=cutoff).delete()
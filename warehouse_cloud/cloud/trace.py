@@ -0,0 +1,168 @@
+import heapq
+import json
+
+from runtime_verification import cycle
+from runtime_verification.counters import counters
+
+from . import models
+from .models import Message, Order, SHIPMENT, COMPLETED
+
+MESSAGE = 0
+ORDER = 1
+
+
+def messages(warehouse=None, since=None, until=None, chunk_size=10000):
+    # Plain tuples in time order, without building a model instance per row
+    queryset = Message.objects.all()
+    if warehouse is not None:
+        queryset = queryset.filter(warehouse=warehouse)
+    if since is not None:
+        queryset = queryset.filter(datetime__gte=since)
+    if until is not None:
+        queryset = queryset.filter(datetime__lt=until)
+    for row in queryset.order_by('datetime', 'id') \
+            .values_list('datetime', 'warehouse', 'sender', 'title', 'msg').iterator(chunk_size=chunk_size):
+        yield (row[0], MESSAGE) + row[1:]
+
+
+def orders(warehouse=None, since=None, until=None, chunk_size=10000):
+    # Orders are not messages, those of the current experiment of each warehouse are still in the Order table
+    queryset = Order.objects.all()
+    if warehouse is not None:
+        queryset = queryset.filter(warehouse=warehouse)
+    if since is not None:
+        queryset = queryset.filter(made__gte=since)
+    if until is not None:
+        queryset = queryset.filter(made__lt=until)
+    for row in queryset.order_by('made', 'id').values_list('made', 'warehouse', 'item_type') \
+            .iterator(chunk_size=chunk_size):
+        yield (row[0], ORDER) + row[1:]
+
+
+def trace(warehouse=None, since=None, until=None, chunk_size=10000):
+    return heapq.merge(messages(warehouse, since, until, chunk_size), orders(warehouse, since, until, chunk_size),
+                       key=lambda entry: entry[0])
+
+
+class Replay:
+    def __init__(self, properties):
+        # Rebuilds each warehouse from its messages, the properties are checked on the message times
+        self.properties = properties
+        self.conveyors = {}
+        self.orders = {}
+        self.completed = {}
+        self.trash = {}
+        self.messages = 0
+        self.invalid = 0
+        # Moves of items the trace does not have, and Starts per warehouse (Start deletes the orders of the last run)
+        self.missing = 0
+        self.starts = {}
+        self.changes = []
+        self.status = {prop.name: prop.status for prop in properties}
+        counters.offline()
+
+    def warehouse(self, warehouse):
+        conveyors = self.conveyors.get(warehouse)
+        if conveyors is None:
+            conveyors = self.reset(warehouse)
+        return conveyors
+
+    def reset(self, warehouse):
+        conveyors = [[] for _ in range(COMPLETED)]
+        self.conveyors[warehouse] = conveyors
+        self.orders[warehouse] = {}
+        self.completed[warehouse] = 0
+        self.trash[warehouse] = 0
+        counters.clear(warehouse)
+        return conveyors
+
+    def add(self, warehouse, item_type, stored):
+        self.warehouse(warehouse)[stored].append(item_type)
+        counters.move(warehouse, item_type, None, stored)
+
+    def move(self, warehouse, src, dest, item_type=None):
+        # Same item as WarehouseState.move_item: the first one on src, or the first one of the type
+        conveyor = self.warehouse(warehouse)[src]
+        if item_type is None:
+            if len(conveyor) == 0:
+                return None
+            item_type = conveyor.pop(0)
+        elif item_type in conveyor:
+            conveyor.remove(item_type)
+        else:
+            return None
+
+        if dest != COMPLETED:
+            self.conveyors[warehouse][dest].append(item_type)
+        counters.move(warehouse, item_type, src, dest)
+        return item_type
+
+    def apply(self, entry):
+        if entry[1] == ORDER:
+            _, _, warehouse, item_type = entry
+            self.warehouse(warehouse)
+            open_orders = self.orders[warehouse]
+            open_orders[item_type] = open_orders.get(item_type, 0) + 1
+            return
+
+        _, _, warehouse, sender, title, msg = entry
+        self.messages += 1
+        if sender == models.USER:
+            if title == 'Start':
+                self.reset(warehouse)
+                self.starts[warehouse] = self.starts.get(warehouse, 0) + 1
+
+        elif sender == models.EDGE_CLASSIFICATION:
+            if title == 'Classification Processed':
+                data = json.loads(msg)
+                self.add(warehouse, int(data['item_type']), int(data['stored']))
+
+        elif sender == models.EDGE_REPOSITORY:
+            if title == 'Order Processed':
+                if self.move(warehouse, int(msg), SHIPMENT) is None:
+                    self.missing += 1
+
+        elif sender == models.EDGE_SHIPMENT:
+            if title == 'Order Processed':
+                data = json.loads(msg)
+                item_type = int(data['item_type'])
+                if self.move(warehouse, SHIPMENT, COMPLETED, item_type) is None:
+                    self.missing += 1
+                if int(data['dest']) == -1:
+                    self.trash[warehouse] += 1
+                elif self.orders[warehouse].get(item_type, 0) > 0:
+                    self.orders[warehouse][item_type] -= 1
+                    self.completed[warehouse] += 1
+
+            elif title == 'SAS Check':
+                self.shipment_check(warehouse, int(msg))
+
+    def shipment_check(self, warehouse, recent_s):
+        # The fast path and the edge channels only record the checks that moved an item
+        conveyors = self.warehouse(warehouse)
+        if recent_s in conveyors[SHIPMENT]:
+            return
+        for idx in range(5):
+            for src in (1, 0, 2):
+                if len(conveyors[src]) > idx and conveyors[src][idx] == recent_s:
+                    self.move(warehouse, src, SHIPMENT)
+                    return
+
+    def check(self, now):
+        with cycle.Cycle(now, snapshot=False):
+            for prop in self.properties:
+                prop.check()
+
+        for prop in self.properties:
+            if prop.status != self.status[prop.name]:
+                self.status[prop.name] = prop.status
+                self.changes.append((now, prop.name, prop.status))
+
+    def run(self, entries):
+        for entry in entries:
+            try:
+                self.apply(entry)
+            except (KeyError, TypeError, ValueError):
+                self.invalid += 1
+            self.check(entry[0])
+        return self.status
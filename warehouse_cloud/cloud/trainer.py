@@ -0,0 +1,98 @@
+import contextlib
+import copy
+import logging
+import queue
+import threading
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class Trainer:
+    def __init__(self, model, cadence=1, steps=1, queue_size=10000, threaded=True):
+        self.training = model
+        self.cadence = cadence
+        self.steps = steps
+        self.pushed = 0
+
+        # Two inference copies: decisions read the front one while the back one receives new weights
+        self.buffers = [self.inference_copy(model), self.inference_copy(model)]
+        self.front = 0
+        self.version = 0
+        self.readers = [0, 0]
+        self.condition = threading.Condition()
+
+        self.transitions = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self.run, name='trainer', daemon=True)
+            self.thread.start()
+
+    @staticmethod
+    def inference_copy(model):
+        inference = copy.deepcopy(model)
+        inference.eval()
+        for parameter in inference.parameters():
+            parameter.requires_grad_(False)
+        return inference
+
+    @contextlib.contextmanager
+    def reading(self):
+        with self.condition:
+            index = self.front
+            self.readers[index] += 1
+        try:
+            yield self.buffers[index]
+        finally:
+            with self.condition:
+                self.readers[index] -= 1
+                self.condition.notify_all()
+
+    def push(self, state, tactic, reward, next_state):
+        if self.thread is None:
+            # Without a thread (offline simulation) the step runs in the caller
+            self.step((state, tactic, reward, next_state))
+            return
+
+        try:
+            self.transitions.put_nowait((state, tactic, reward, next_state))
+        except queue.Full:
+            logger.warning('Training queue is full, dropped a transition')
+
+    def stop(self):
+        if self.thread is not None:
+            self.transitions.put(None)
+
+    def step(self, transition):
+        self.training.push(*transition)
+        self.pushed += 1
+        if self.pushed % self.cadence == 0:
+            self.training.optimize_model(steps=self.steps)
+            self.publish()
+
+    def run(self):
+        while True:
+            transition = self.transitions.get()
+            if transition is None:
+                return
+
+            try:
+                self.step(transition)
+            except Exception:
+                logger.exception('Training step failed')
+
+    def publish(self):
+        back = 1 - self.front
+        # Decisions that started before the last swap may still be reading the back copy
+        with self.condition:
+            self.condition.wait_for(lambda: self.readers[back] == 0)
+
+        # New decisions only take the front copy, and only this thread moves it
+        with torch.no_grad():
+            for target, source in zip(self.buffers[back].parameters(), self.training.parameters()):
+                target.copy_(source)
+
+        with self.condition:
+            self.front = back
+            self.version += 1
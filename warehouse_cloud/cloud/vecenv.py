@@ -0,0 +1,324 @@
+import numpy as np
+
+from .models import SHIPMENT
+
+# c_allow / s_allow value when nothing may move, as in Warehouse
+NONE = 3
+
+
+class VecWarehouse:
+    # Same configuration as Warehouse
+    cap_conveyor = 5
+    cap_wait = 5
+
+    reward_order = 30
+    reward_trash = 70
+    reward_wait = 1
+
+    order_total = 20
+    order_delay = 0
+
+    anomaly_mtbf = 5
+    anomaly_duration = 10
+    anomaly_wait = 3
+
+    item_buy = 5
+
+    def __init__(self, num_envs, anomaly_aware=False, anomaly=True, experiment_type='SAS', max_ticks=1000,
+                 seed=None):
+        # N warehouses and their simulated edges stepped together, every field is an array with N rows
+        self.num_envs = num_envs
+        self.anomaly_aware = anomaly_aware
+        self.anomaly = anomaly
+        self.experiment_type = experiment_type
+        self.max_ticks = max_ticks
+        self.random = np.random.default_rng(seed)
+
+        # Conveyors hold item types front to back, 0 is an empty slot and the last column is always empty
+        self.width = 2 * self.cap_conveyor
+        self.rows = np.arange(num_envs)
+        self.weights = 5.0 ** (4 - np.arange(self.width))
+        self.completed = []
+
+        n = num_envs
+        self.conveyors = np.zeros((n, 4, self.width + 1), dtype=np.int64)
+        self.lengths = np.zeros((n, 4), dtype=np.int64)
+        # Orders per item type: repository processing, shipment processing, completed
+        self.orders = np.zeros((n, 4, 3), dtype=np.int64)
+        self.c = np.zeros((n, 4), dtype=np.int64)
+
+        self.tick = np.zeros(n, dtype=np.int64)
+        self.recent_c = np.zeros(n, dtype=np.int64)
+        self.recent_s = np.zeros(n, dtype=np.int64)
+        self.c_allow = np.zeros(n, dtype=np.int64)
+        self.r_allow = np.zeros((n, 3), dtype=bool)
+        self.s_allow = np.zeros(n, dtype=np.int64)
+
+        self.r_wait = np.zeros((n, 3), dtype=np.int64)
+        self.s_wait = np.zeros(n, dtype=np.int64)
+        self.stuck = np.zeros((n, 3), dtype=bool)
+        self.count = np.zeros((n, 3), dtype=np.int64)
+        self.current_anomaly = np.zeros((n, 3), dtype=np.int64)
+
+        self.reward = np.zeros(n, dtype=np.int64)
+        self.trash = np.zeros(n, dtype=np.int64)
+        self.decisions = np.zeros(n, dtype=np.int64)
+        self.ordered = np.zeros(n, dtype=np.int64)
+        self.decide = np.zeros(n, dtype=bool)
+
+    def clear(self, m):
+        self.conveyors[m] = 0
+        self.lengths[m] = 0
+        self.orders[m] = 0
+        self.c[m] = 0
+
+        self.tick[m] = 0
+        self.recent_c[m] = 0
+        self.recent_s[m] = 0
+        self.c_allow[m] = NONE
+        self.r_allow[m] = False
+        self.s_allow[m] = NONE
+
+        self.r_wait[m] = 0
+        self.s_wait[m] = 0
+        self.stuck[m] = False
+        self.count[m] = 0
+        self.current_anomaly[m] = -1
+
+        self.reward[m] = 0
+        self.trash[m] = 0
+        self.decisions[m] = 0
+        self.ordered[m] = 0
+        self.decide[m] = False
+
+    def reset(self):
+        m = np.ones(self.num_envs, dtype=bool)
+        self.clear(m)
+        self.edges(m)
+        self.begin(m)
+        return self.observe(), {'decide': self.decide.copy(), 'available': self.available()}
+
+    def step(self, actions):
+        # actions[i] is the repository conveyor for the classified item, used where info['decide'] was set
+        before = self.reward.copy()
+        m = np.ones(self.num_envs, dtype=bool)
+
+        self.finish(np.asarray(actions))
+        self.edges(m)
+        ended = self.begin(m)
+
+        rewards = self.reward - before
+        dones = ended | (self.tick >= self.max_ticks)
+        terminal = self.observe()
+        if dones.any():
+            # Finished warehouses start their next episode right away
+            for i in np.nonzero(dones)[0]:
+                self.completed.append(self.result(i, ended[i]))
+            self.clear(dones)
+            self.edges(dones)
+            self.begin(dones)
+
+        info = {'decide': self.decide.copy(), 'available': self.available(), 'terminal': terminal}
+        return self.observe(), rewards, dones, info
+
+    def result(self, i, ended):
+        return {
+            'reward': int(self.reward[i]),
+            'ticks': int(self.tick[i]),
+            'ended': bool(ended),
+            'completed': int(self.orders[i, :, 2].sum()),
+            'trash': int(self.trash[i]),
+            'decisions': int(self.decisions[i]),
+        }
+
+    def observe(self):
+        # Matches Warehouse.get_state: tick, recent_c, the four conveyors in base 5, orders per item type
+        conveyors = (self.conveyors[:, :, :self.width] * self.weights).sum(2)
+        return np.column_stack([self.tick, self.recent_c, conveyors, self.orders.sum(2)]).astype(np.float32)
+
+    def available(self):
+        ans = self.lengths[:, :3] < self.cap_conveyor
+        if self.anomaly_aware:
+            ans &= self.current_anomaly == -1
+        return ans
+
+    def sample_actions(self, available):
+        # Uniform choice among the available conveyors, the Random decision mode
+        return (self.random.random(available.shape) * available).argmax(1)
+
+    def inventory(self):
+        return (self.conveyors[:, :, :self.width, None] == np.arange(1, 5)).sum((1, 2))
+
+    # Conveyors
+    def push_items(self, rows, conveyor, item_types):
+        self.conveyors[rows, conveyor, self.lengths[rows, conveyor]] = item_types
+        self.lengths[rows, conveyor] += 1
+
+    def remove_items(self, rows, conveyor, positions):
+        line = self.conveyors[rows, conveyor]
+        removed = line[np.arange(len(rows)), positions]
+
+        index = np.arange(self.width + 1)
+        source = np.minimum(index + (index >= positions[:, None]), self.width)
+        self.conveyors[rows, conveyor] = np.take_along_axis(line, source, 1)
+        self.lengths[rows, conveyor] -= 1
+        return removed
+
+    def find_items(self, rows, conveyor, item_types):
+        match = self.conveyors[rows, conveyor, :self.width] == item_types[:, None]
+        return match.any(1), match.argmax(1)
+
+    # Customer and edges, in the order the simulator runs them
+    def edges(self, m):
+        self.make_orders(m)
+        self.repository(m)
+        self.shipment(m)
+        self.classification(m)
+
+    def make_orders(self, m):
+        while True:
+            rows = np.nonzero(m & (self.ordered < self.order_total) &
+                              (self.tick >= self.ordered * self.order_delay))[0]
+            if len(rows) == 0:
+                return
+
+            item_types = self.random.integers(1, 5, len(rows))
+            ready = (self.conveyors[rows, SHIPMENT, :self.width] == item_types[:, None]).sum(1)
+            if self.experiment_type == 'SAS':
+                ready += (self.stuck[rows] & (self.conveyors[rows, :3, 0] == item_types[:, None])).sum(1)
+
+            t = item_types - 1
+            status = np.where(ready <= self.orders[rows, t, 1], 0, 1)
+            self.orders[rows, t, status] += 1
+            self.ordered[rows] += 1
+
+    def repository(self, m):
+        for i in range(3):
+            rows = np.nonzero(m & self.r_allow[:, i])[0]
+            self.r_allow[rows, i] = False
+
+            rows = rows[self.lengths[rows, i] > 0]
+            item_types = self.remove_items(rows, i, np.zeros(len(rows), dtype=np.int64))
+            self.push_items(rows, SHIPMENT, item_types)
+
+            if self.experiment_type != 'SAS':
+                t = item_types - 1
+                has = self.orders[rows, t, 0] > 0
+                self.orders[rows[has], t[has], 0] -= 1
+                self.orders[rows[has], t[has], 1] += 1
+
+    def shipment(self, m):
+        rows = np.nonzero(m & (self.recent_s != 0) & (self.s_allow != NONE))[0]
+        item_types = self.recent_s[rows]
+        found, positions = self.find_items(rows, SHIPMENT, item_types)
+        self.remove_items(rows[found], SHIPMENT, positions[found])
+
+        trash = self.s_allow[rows] == -1
+        self.reward[rows[trash]] -= self.reward_trash
+        self.trash[rows[trash]] += 1
+
+        delivered = rows[~trash]
+        t = item_types[~trash] - 1
+        has = self.orders[delivered, t, 1] > 0
+        delivered, t = delivered[has], t[has]
+        self.orders[delivered, t, 1] -= 1
+        self.orders[delivered, t, 2] += 1
+        self.reward[delivered] += self.reward_order
+
+        self.s_allow[rows] = NONE
+        self.recent_s[rows] = 0
+
+        # The shipment edge reports the item in front of it
+        self.recent_s[m] = self.conveyors[m, SHIPMENT, 0]
+
+    def classification(self, m):
+        rows = np.nonzero(m & (self.recent_c != 0) & (self.c_allow != NONE))[0]
+        item_types = self.recent_c[rows]
+        self.push_items(rows, self.c_allow[rows], item_types)
+
+        t = item_types - 1
+        self.c[rows, t] = np.maximum(self.c[rows, t] - 1, 0)
+        self.c_allow[rows] = NONE
+        self.recent_c[rows] = 0
+
+        # The next purchased item arrives at the classification edge
+        rows = np.nonzero(m & (self.recent_c == 0) & (self.c.sum(1) > 0))[0]
+        self.recent_c[rows] = (self.random.random((len(rows), 4)) * (self.c[rows] > 0)).argmax(1) + 1
+
+    # Process, split around the decision so the observation is taken where Warehouse takes it
+    def begin(self, m):
+        open_orders = self.orders[:, :, :2].sum((1, 2))
+        ended = m & (open_orders == 0) & (self.tick > self.order_total)
+        m = m & ~ended
+
+        self.reward[m] -= open_orders[m] * self.reward_wait
+        self.tick[m] += 1
+
+        # New anomaly
+        if self.anomaly:
+            for i in [0, 2]:
+                new = m & (self.current_anomaly[:, i] == -1) & \
+                    (self.random.random(self.num_envs) < 1 / self.anomaly_mtbf)
+                self.current_anomaly[new, i] = self.tick[new]
+
+        decide = (self.c.sum(1) > 0) & (self.available().sum(1) > 1)
+        self.decide = np.where(m, decide, self.decide & ~ended)
+        return ended
+
+    def finish(self, actions):
+        # Move c to r
+        available = self.available()
+        first = np.where(available.any(1), available.argmax(1), NONE)
+        c_decision = np.where(self.decide, actions, np.where(self.recent_c != 0, first, NONE))
+        self.decisions += self.decide
+
+        # R to S
+        r_decision = np.zeros((self.num_envs, 3), dtype=bool)
+        shipment_cap = self.cap_conveyor - self.lengths[:, SHIPMENT] - self.stuck.sum(1)
+        for i in [1, 0, 2]:
+            heads = self.conveyors[:, i, 0]
+            ready = ~self.stuck[:, i] & (self.lengths[:, i] > 0) & (shipment_cap > 0)
+            ordered = ready & (self.orders[self.rows, heads - 1, 0] > 0)
+            waited = ready & ~ordered & (self.r_wait[:, i] > self.cap_wait)
+
+            r_decision[:, i] = ordered | waited
+            shipment_cap -= r_decision[:, i]
+            self.r_wait[:, i] = np.where(ordered | waited, 0, self.r_wait[:, i] + ready)
+
+            rows = np.nonzero(ordered)[0]
+            self.orders[rows, heads[rows] - 1, 0] -= 1
+            self.orders[rows, heads[rows] - 1, 1] += 1
+
+        for i in [0, 2]:
+            anomalous = self.current_anomaly[:, i] != -1
+            stuck = self.stuck[:, i].copy()
+
+            # Make stuck
+            stick = anomalous & r_decision[:, i] & ~stuck
+            hold = anomalous & stuck & (self.count[:, i] < self.anomaly_wait)
+            release = anomalous & stuck & (self.count[:, i] == self.anomaly_wait)
+            self.stuck[:, i] = (stuck | stick) & ~release
+            r_decision[:, i] = (r_decision[:, i] & ~stick) | release
+            self.count[:, i] = np.where(release, 0, self.count[:, i] + (stick | hold))
+
+            # Solve anomaly
+            solved = anomalous & (self.current_anomaly[:, i] + self.anomaly_duration < self.tick)
+            r_decision[:, i] |= solved & self.stuck[:, i]
+            self.stuck[solved, i] = False
+            self.count[solved, i] = 0
+            self.current_anomaly[solved, i] = -1
+
+        # s, any destination of a matching order delivers it
+        waiting = self.recent_s != 0
+        has_order = waiting & (self.orders[self.rows, self.recent_s - 1, 1] > 0)
+        expired = waiting & ~has_order & (self.s_wait > self.cap_wait)
+        s_decision = np.where(has_order, 0, np.where(expired, -1, NONE))
+        self.s_wait = np.where(has_order | expired, 0, self.s_wait + waiting)
+
+        # Request Item
+        need = self.orders[:, :, :2].sum(2)
+        self.c += np.where(self.c + self.inventory() < need, self.item_buy, 0)
+
+        self.c_allow = c_decision
+        self.r_allow = r_decision
+        self.s_allow = s_decision
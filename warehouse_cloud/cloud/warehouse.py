@@ -1,9 +1,26 @@
-from . import rl
-from .models import Inventory, Order
+import contextlib
+import functools
+import random
+import time
+import uuid
+
+from django.db import transaction
+from warehouse_cloud.settings import settings
+
+from . import inference, rl
+from .checkpoints import registry
+from .models import SHIPMENT, COMPLETED
+from .state import WarehouseState
+from .trainer import Trainer
+
+# Decision variables shared between worker processes through the Experiment table
+VARIABLES = ['tick', 'c', 'recent_c', 'recent_s', 'c_waiting', 'c_allow', 'r_allow', 's_allow', 'r_wait', 's_wait',
+             'stuck', 'count', 'current_anomaly', 'reward', 'old_state', 'old_decision', 'old_reward', 'episode',
+             'trash', 'decisions', 'decision_time', 'anomaly_aware']
 
 
 class Warehouse:
-    def __init__(self, anomaly_aware):
+    def __init__(self, anomaly_aware, state=None, trainable=False, threaded=True):
         # config
         self.cap_conveyor = 5
         self.cap_wait = 5
@@ -22,15 +39,23 @@ class Warehouse:
         self.item_buy = 5
 
         # Warehouse
+        self.experiment_type = 'SAS'
+        self.dm_type = 'ORL'
         self.tick = 0
         self.anomaly_aware = anomaly_aware
-        try:
-            self.rl_model = rl.DQN(path='../model/rl.pth')
-            self.a_rl_models = [rl.DQN(path='../model/a_rl_0.pth'),
-                                None,
-                                rl.DQN(path='../model/a_rl_2.pth')]
-        except:
-            pass
+        self.state = state if state is not None else WarehouseState()
+        self.trainer = None
+        self.shared_rl_model = None
+        if trainable:
+            training_model = registry.trainable('rl')
+            if training_model is not None:
+                self.trainer = Trainer(training_model, cadence=settings.get('rl_train_every', 1),
+                                       steps=settings.get('rl_train_steps', 1), threaded=threaded)
+        else:
+            self.shared_rl_model = registry.get('rl')
+        self.a_rl_models = [registry.get('a_rl_0'),
+                            None,
+                            registry.get('a_rl_2')]
 
         self.c = [0] * 4
         self.recent_c = 0
@@ -53,67 +78,119 @@ class Warehouse:
         self.old_decision = None
         self.old_reward = 0
 
-    def need_decision(self):
+        self.episode = uuid.uuid4().hex
+        self.record_path = settings.get('rl_record_path')
+
+        # Decisions go through the shared batching service unless the caller runs its own loop
+        self.batched_inference = threaded
+        self.random = random
+        self.trash = 0
+        self.decisions = 0
+        self.decision_time = 0.0
+
+    @contextlib.contextmanager
+    def rl_model(self):
+        # The trainer does not write into the copy a decision is reading
+        if self.trainer is not None:
+            with self.trainer.reading() as model:
+                yield model
+        else:
+            yield self.shared_rl_model
+
+    def variables(self):
+        ans = {name: getattr(self, name) for name in VARIABLES}
+        if ans['old_decision'] is not None:
+            ans['old_decision'] = int(ans['old_decision'])
+        return ans
+
+    def restore(self, variables):
+        for name in VARIABLES:
+            if name in variables:
+                setattr(self, name, variables[name])
+
+    def close(self):
+        if self.trainer is not None:
+            self.trainer.stop()
+
+    def record(self, state, tactic, reward, next_state):
+        if self.record_path:
+            rl.record(self.record_path, self.episode, state, tactic, reward, next_state)
+
+    def learn(self, dm_type, transition):
+        if dm_type == 'ORL' and self.trainer is not None:
+            self.trainer.push(*transition)
+        self.record(*transition)
+
+    def need_decision(self, snapshot=None):
         if sum(self.c) == 0:
             return False
 
         num_true = 0
-        for ans in self.available():
+        for ans in self.available(snapshot=snapshot):
             if ans:
                 num_true += 1
 
         return num_true > 1
 
-    def available(self, i=None):
+    def available(self, i=None, snapshot=None):
+        if snapshot is None:
+            snapshot = self.state.snapshot()
+
         if i is not None:
-            inventory_objects = Inventory.objects.filter(stored=i)
-            ans = len(inventory_objects) < self.cap_conveyor
+            ans = len(snapshot.conveyors[i]) < self.cap_conveyor
             if not self.anomaly_aware:
                 return ans
             return ans and self.current_anomaly[i] == -1
 
         ans = []
         for i in range(3):
-            inventory_objects = Inventory.objects.filter(stored=i)
-            single_ans = len(inventory_objects) < self.cap_conveyor
+            single_ans = len(snapshot.conveyors[i]) < self.cap_conveyor
             if not self.anomaly_aware:
                 ans.append(single_ans)
             else:
                 ans.append(single_ans and self.current_anomaly[i] == -1)
         return ans
 
-    def get_available(self):
-        available = self.available()
+    def get_available(self, snapshot=None):
+        available = self.available(snapshot=snapshot)
         ans = []
         for i, avail in enumerate(available):
             if avail:
                 ans.append(i)
         return ans
 
-    def get_inventory(self, item):
-        return self.c[item - 1] + len(Inventory.objects.filter(item_type=item, stored__lt=4))
+    def get_inventory(self, item, snapshot=None):
+        if snapshot is None:
+            snapshot = self.state.snapshot()
+        return self.c[item - 1] + snapshot.count_items(item)
+
+    def get_order(self, is_sum=True, snapshot=None):
+        if snapshot is None:
+            snapshot = self.state.snapshot()
 
-    def get_order(self, is_sum=True):
         if is_sum:
-            return len(Order.objects.all())
+            return snapshot.total_orders()
 
         orders = []
         for i in range(4):
-            orders.append(len(Order.objects.filter(item_type=i + 1)))
+            orders.append(snapshot.total_orders(i + 1))
 
         return orders
 
-    def get_state(self):
+    def get_state(self, snapshot=None):
         def repr_list(conveyor):
             ans = 0
-            for i, item in enumerate(conveyor):
-                ans += item.item_type * (5 ** (5 - i - 1))
+            for i, item_type in enumerate(conveyor):
+                ans += item_type * (5 ** (5 - i - 1))
             return ans
 
+        if snapshot is None:
+            snapshot = self.state.snapshot()
+
         ans = [self.tick, self.recent_c]
         for i in range(4):
-            ans.append(repr_list(Inventory.objects.filter(stored=i)))
-        ans.extend(self.get_order(False))
+            ans.append(repr_list(snapshot.conveyors[i]))
+        ans.extend(self.get_order(False, snapshot))
 
         return ans
 
@@ -124,3 +201,255 @@ class Warehouse:
                 anomaly_number += (2 ** i)
 
         return anomaly_number
+
+    def select_tactic(self, model, state, available):
+        if self.batched_inference:
+            return inference.service.select_tactic(model, state, available)
+        return model.select_tactic(state, available)
+
+    def place_order(self, order, experiment_type):
+        # Returns the new status: 2 if the repository has to send an item, 3 if one is already on its way
+        item_type = order.item_type
+        shipment_ready = 0
+        for item in self.state.conveyor(SHIPMENT):
+            if item.item_type == item_type:
+                shipment_ready += 1
+
+        if experiment_type == 'SAS':
+            for i in range(3):
+                rep = self.state.first_item(i)
+                if self.stuck[i] and rep is not None and rep.item_type == item_type:
+                    shipment_ready += 1
+
+        status = 2 if shipment_ready <= self.state.order_count(item_type, 3) else 3
+        self.state.set_order_status(order, status)
+        return status
+
+    def process(self, anomaly_0, anomaly_2, dm_type):
+        state = self.state
+        snapshot = state.snapshot()
+        num_orders = snapshot.open_orders()
+        if num_orders == 0 and self.tick > self.order_total:
+            return {
+                'tick': self.tick,
+                'reward': self.reward,
+                'alert': "ended"
+            }
+
+        self.reward -= num_orders * self.reward_wait
+        self.tick += 1
+
+        # ORL
+        if self.old_state is not None:
+            transition = (self.old_state, self.old_decision, self.reward - self.old_reward,
+                          self.get_state(snapshot))
+            if self.state.persist:
+                # Once the tick is committed, a message that is retried after a conflict runs it again
+                transaction.on_commit(functools.partial(self.learn, dm_type, transition))
+            else:
+                self.learn(dm_type, transition)
+            self.old_state = None
+            self.old_reward = self.reward
+
+        # New anomaly
+        if self.current_anomaly[0] == -1 and anomaly_0:
+            self.current_anomaly[0] = self.tick
+        if self.current_anomaly[2] == -1 and anomaly_2:
+            self.current_anomaly[2] = self.tick
+
+        # Move c to r
+        c_decision = 3
+        # Decision making
+        if self.need_decision(snapshot):
+            started = time.perf_counter()
+            if dm_type == 'Random':
+                candidate = self.get_available(snapshot)
+                if len(candidate) != 0:
+                    c_decision = self.random.choice(candidate)
+            else:
+                self.old_state = self.get_state(snapshot)
+                if self.anomaly_state() != 0 and dm_type == 'AAAA':
+                    model = self.a_rl_models[0] if self.current_anomaly[0] != -1 else self.a_rl_models[2]
+                    self.old_decision = self.select_tactic(model, self.old_state, self.available(snapshot=snapshot))
+                else:
+                    with self.rl_model() as model:
+                        self.old_decision = self.select_tactic(model, self.old_state,
+                                                               self.available(snapshot=snapshot))
+                c_decision = int(self.old_decision)
+            self.decisions += 1
+            self.decision_time += time.perf_counter() - started
+
+        elif self.recent_c != 0:
+            avail = self.get_available(snapshot)
+            if len(avail) != 0:
+                c_decision = avail[0]
+
+        # R to S
+        r_decision = [False] * 3
+        shipment_cap = self.cap_conveyor - len(snapshot.conveyors[SHIPMENT]) - self.stuck.count(True)
+        for i in [1, 0, 2]:
+            target_item = state.first_item(i)
+            if not self.stuck[i] and target_item is not None and shipment_cap > 0:
+                order = state.first_order(target_item.item_type, 2)
+                if order is not None:
+                    r_decision[i] = True
+                    shipment_cap -= 1
+                    self.r_wait[i] = 0
+                    state.set_order_status(order, 3)
+                elif self.r_wait[i] > self.cap_wait:
+                    r_decision[i] = True
+                    shipment_cap -= 1
+                    self.r_wait[i] = 0
+                else:
+                    self.r_wait[i] += 1
+
+        # Make stuck
+        for i in [0, 2]:
+            if self.current_anomaly[i] != -1 and r_decision[i] and self.stuck[i] == 0:
+                self.stuck[i] = True
+                r_decision[i] = False
+                self.count[i] += 1
+
+            elif self.current_anomaly[i] != -1 and self.stuck[i] and self.count[i] < self.anomaly_wait:
+                self.count[i] += 1
+
+            elif self.current_anomaly[i] != -1 and self.stuck[i] and self.count[i] == self.anomaly_wait:
+                self.count[i] = 0
+                r_decision[i] = True
+                self.stuck[i] = False
+
+        # Solve anomaly
+        for i in [0, 2]:
+            if self.current_anomaly[i] != -1 and self.current_anomaly[i] + self.anomaly_duration < self.tick:
+                if self.stuck[i]:
+                    r_decision[i] = True
+                    self.stuck[i] = False
+                self.count[i] = 0
+                self.current_anomaly[i] = -1
+
+        # s
+        s_decision = 3
+        if self.recent_s != 0:
+            order = state.first_order(self.recent_s, 3)
+            if order is not None:
+                s_decision = order.dest
+                self.s_wait = 0
+            elif self.s_wait > self.cap_wait:
+                s_decision = -1
+                self.s_wait = 0
+            else:
+                self.s_wait += 1
+
+        # Request Item
+        snapshot = state.snapshot()
+        request = ''
+        for i in range(1, 5):
+            need = snapshot.open_orders(i)
+            if self.get_inventory(i, snapshot) < need:
+                self.c[i - 1] += self.item_buy
+                request += str(i) + ' &'
+
+        inventories = []
+        for i in range(4):
+            ans = ''
+            for item_type in snapshot.conveyors[i]:
+                ans += str(item_type) + ','
+            inventories.append(ans)
+
+        result = {
+            'tick': self.tick - 1,
+            'reward': self.reward,
+            'request': request,
+            'recent_c': self.recent_c,
+            'c_decision': c_decision,
+            'r_decision': r_decision,
+            's_decision': s_decision,
+            'anomaly_0': 1 if self.current_anomaly[0] != -1 else 0,
+            'anomaly_2': 1 if self.current_anomaly[2] != -1 else 0,
+            'stuck_0': 1 if self.stuck[0] else 0,
+            'stuck_2': 1 if self.stuck[2] else 0,
+            'inventory_0': inventories[0],
+            'inventory_1': inventories[1],
+            'inventory_2': inventories[2],
+            'inventory_3': inventories[3],
+            'order_r_1': snapshot.order_count(1, 2),
+            'order_r_2': snapshot.order_count(2, 2),
+            'order_r_3': snapshot.order_count(3, 2),
+            'order_r_4': snapshot.order_count(4, 2),
+            'order_s_1': snapshot.order_count(1, 3),
+            'order_s_2': snapshot.order_count(2, 3),
+            'order_s_3': snapshot.order_count(3, 3),
+            'order_s_4': snapshot.order_count(4, 3)
+        }
+
+        self.c_allow = c_decision
+        self.r_allow = r_decision
+        self.s_allow = s_decision
+        state.maybe_flush()
+
+        return result
+
+    def classification_processed(self, item_type, stored):
+        self.c_allow = 3
+        self.recent_c = 0
+
+        self.state.add_item(item_type, stored)
+        if self.c[item_type - 1] != 0:
+            self.c[item_type - 1] -= 1
+
+    def classification_check(self, recent_c):
+        self.recent_c = recent_c
+        return self.c_allow
+
+    def repository_processed(self, stored, experiment_type):
+        self.r_allow[stored] = False
+        target_item = self.state.move_item(stored, SHIPMENT)
+
+        if experiment_type != 'SAS' and target_item is not None:
+            target_order = self.state.first_order(target_item.item_type, 2)
+            if target_order is not None:
+                self.state.set_order_status(target_order, 3)
+
+    def repository_check(self, location):
+        return self.r_allow[location]
+
+    def shipment_processed(self, item_type, dest):
+        self.s_allow = 3
+        self.recent_s = 0
+
+        self.state.move_item(SHIPMENT, COMPLETED, item_type)
+
+        if dest == -1:
+            self.reward -= self.reward_trash
+            self.trash += 1
+        else:
+            target_order = self.state.first_order(item_type, 3, dest)
+            if target_order is not None:
+                self.state.set_order_status(target_order, 4)
+                self.reward += self.reward_order
+
+    def shipment_check(self, recent_s):
+        self.recent_s = recent_s
+
+        state = self.state
+        if state.first_item(SHIPMENT, recent_s) is None:
+            idx = 0
+            while idx < 5:
+                rep = state.conveyor(1)
+                if len(rep) > idx and rep[idx].item_type == recent_s:
+                    state.move_item(1, SHIPMENT)
+                    break
+
+                rep = state.conveyor(0)
+                if len(rep) > idx and rep[idx].item_type == recent_s:
+                    state.move_item(0, SHIPMENT)
+                    break
+
+                rep = state.conveyor(2)
+                if len(rep) > idx and rep[idx].item_type == recent_s:
+                    state.move_item(2, SHIPMENT)
+                    break
+
+                idx += 1
+
+        return self.s_allow
@@ -0,0 +1,184 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from warehouse_cloud.settings import settings
+
+from .models import Experiment, Inventory, Order
+from .state import WarehouseState
+from .warehouse import Warehouse
+
+
+class Conflict(Exception):
+    pass
+
+
+def build(warehouse_id, experiment_type, dm_type, started=True):
+    # Same models as Start: AAAA switches to the anomaly models, ORL keeps training its own copy.
+    # A warehouse that was never started is anomaly aware, as before the first Start
+    anomaly_aware = not started or experiment_type != 'SAS' or dm_type == 'AAAA'
+    target = Warehouse(anomaly_aware, state=WarehouseState(warehouse=warehouse_id), trainable=dm_type == 'ORL')
+    target.experiment_type = experiment_type
+    target.dm_type = dm_type
+    return target
+
+
+class WarehouseRegistry:
+    def __init__(self, shared=False, retries=3):
+        # Without a shared store every warehouse lives in this process only (single worker deployments)
+        self.shared = shared
+        self.retries = retries
+        self.warehouses = {}
+        self.versions = {}
+        self.actors = {}
+        self.lock = threading.Lock()
+        # Run handlers in the calling thread instead, for callers that hold their own transaction
+        self.inline = False
+        # Called with the warehouse ID after a message for it was committed
+        self.listeners = []
+
+    def actor(self, warehouse_id):
+        with self.lock:
+            actor = self.actors.get(warehouse_id)
+            if actor is None:
+                actor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='warehouse-%d' % warehouse_id)
+                self.actors[warehouse_id] = actor
+            return actor
+
+    def submit(self, warehouse_id, function, *args):
+        # Messages for one warehouse are handled one at a time on its own thread, warehouses run in parallel
+        if self.inline:
+            return function(*args)
+        return self.actor(warehouse_id).submit(self.in_actor, function, *args).result()
+
+    def future(self, warehouse_id, handler, readonly=False):
+        # Same as run, without blocking the caller
+        return self.actor(warehouse_id).submit(self.in_actor, self.handle, warehouse_id, handler, readonly)
+
+    @staticmethod
+    def in_actor(function, *args):
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+
+    def run(self, warehouse_id, handler):
+        return self.submit(warehouse_id, self.handle, warehouse_id, handler)
+
+    def start(self, warehouse_id, experiment_type, dm_type=None):
+        return self.submit(warehouse_id, self.handle_start, warehouse_id, experiment_type, dm_type)
+
+    def handle(self, warehouse_id, handler, readonly=False):
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    with transaction.atomic():
+                        target = self.get(warehouse_id)
+                        target.state.begin()
+                        result = handler(target)
+                        if not readonly:
+                            self.save(target)
+                    target.state.commit()
+                    if not readonly:
+                        self.notify(warehouse_id)
+                    return result
+                except Conflict:
+                    # Another process committed first, reload its version and run the handler again
+                    self.versions[warehouse_id] = None
+                    if attempt == self.retries:
+                        raise
+        except Exception:
+            self.invalidate(warehouse_id)
+            raise
+
+    def handle_start(self, warehouse_id, experiment_type, dm_type):
+        target = None
+        try:
+            with transaction.atomic():
+                experiment = Experiment.objects.select_for_update().get_or_create(warehouse=warehouse_id)[0]
+                if dm_type is None:
+                    dm_type = experiment.dm_type
+
+                Inventory.objects.filter(warehouse=warehouse_id).delete()
+                Order.objects.filter(warehouse=warehouse_id).delete()
+
+                target = self.create(warehouse_id, experiment_type, dm_type)
+                target.state.reset()
+
+                experiment.experiment_type = experiment_type
+                experiment.dm_type = dm_type
+                experiment.variables = json.dumps(target.variables())
+                experiment.version += 1
+                experiment.save()
+        except Exception:
+            # The warehouse keeps running as it was before the Start
+            if target is not None:
+                target.close()
+            self.invalidate(warehouse_id)
+            raise
+
+        previous = self.warehouses.get(warehouse_id)
+        if previous is not None:
+            previous.close()
+        self.warehouses[warehouse_id] = target
+        self.versions[warehouse_id] = experiment.version
+        self.notify(warehouse_id)
+        return target
+
+    def create(self, warehouse_id, experiment_type, dm_type, started=True):
+        return build(warehouse_id, experiment_type, dm_type, started)
+
+    def notify(self, warehouse_id):
+        for listener in self.listeners:
+            listener(warehouse_id)
+
+    def invalidate(self, warehouse_id):
+        # The state goes back to where the failed message found it, a shared warehouse is reloaded as well
+        self.versions[warehouse_id] = None
+        target = self.warehouses.get(warehouse_id)
+        if target is not None:
+            target.state.rollback()
+
+    def get(self, warehouse_id):
+        target = self.warehouses.get(warehouse_id)
+        if target is not None and not self.shared:
+            return target
+
+        # The row lock serializes the warehouse across processes until the transaction ends
+        experiment = Experiment.objects.select_for_update().get_or_create(warehouse=warehouse_id)[0]
+        if target is None or target.experiment_type != experiment.experiment_type or \
+                target.dm_type != experiment.dm_type:
+            if target is not None:
+                target.close()
+            target = self.create(warehouse_id, experiment.experiment_type, experiment.dm_type,
+                                 started=experiment.variables != '')
+            self.warehouses[warehouse_id] = target
+            self.versions[warehouse_id] = None
+
+        if self.shared and self.versions[warehouse_id] != experiment.version:
+            # Another process changed this warehouse since this process last saw it
+            if experiment.variables:
+                target.restore(json.loads(experiment.variables))
+            target.state.load()
+            self.versions[warehouse_id] = experiment.version
+
+        return target
+
+    def save(self, target):
+        # Publishes the warehouse after a message changed it, a no-op without a shared store
+        if not self.shared:
+            return
+
+        target.state.flush()
+        warehouse_id = target.state.warehouse
+        version = self.versions[warehouse_id]
+        updated = Experiment.objects.filter(warehouse=warehouse_id, version=version) \
+            .update(variables=json.dumps(target.variables()), version=F('version') + 1)
+        if updated == 0:
+            raise Conflict('Warehouse %d changed since version %d' % (warehouse_id, version))
+        self.versions[warehouse_id] = version + 1
+
+
+warehouses = WarehouseRegistry(shared=settings.get('warehouse_shared_state', False))
@@ -0,0 +1,38 @@
+import datetime
+
+from runtime_verification import event, scope
+
+# What properties, scopes and events learn while they are checked, everything else comes from their definition
+STATE = ['status', 'is_confirmed', 'confirmedAt', 'current_count', 'started', 'cause_occurred', 'ongoing',
+         'recent_hold', 'is_started', 'is_ended']
+
+
+def encode(value):
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict) and 'datetime' in value:
+        return datetime.datetime.fromisoformat(value['datetime'])
+    return value
+
+
+def dump(checked):
+    values = {key: encode(value) for key, value in vars(checked).items() if key in STATE}
+    for key, value in vars(checked).items():
+        if isinstance(value, (event.Event, scope.Scope)):
+            nested = dump(value)
+            if nested:
+                values[key] = nested
+    return values
+
+
+def load(checked, values):
+    for key, value in values.items():
+        current = getattr(checked, key, None)
+        if isinstance(current, (event.Event, scope.Scope)):
+            load(current, value)
+        elif key in STATE:
+            setattr(checked, key, decode(value))
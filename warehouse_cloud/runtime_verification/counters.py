@@ -0,0 +1,137 @@
+import threading
+
+from django.db.models import Count
+
+from cloud import state
+from runtime_verification import cycle
+from cloud.models import Inventory, COMPLETED
+
+
+class InventoryCounters:
+    def __init__(self):
+        # Items in the system (not completed) per warehouse, by conveyor and by item type
+        self.conveyors = {}
+        self.item_types = {}
+        # Warehouses whose counts come from a warehouse state of this process instead of the database
+        self.tracked = set()
+        self.subscribed = False
+        self.replaying = False
+        self.cycle = None
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        # Called by the verifier, warehouses of its process are followed item by item once their state is loaded
+        with self.lock:
+            if not self.subscribed:
+                state.listeners.append(self.changed)
+                self.subscribed = True
+
+    def refresh(self):
+        with self.lock:
+            tracked = list(self.tracked)
+        queryset = Inventory.objects.filter(stored__lt=COMPLETED)
+        if tracked:
+            queryset = queryset.exclude(warehouse__in=tracked)
+
+        conveyors = {}
+        item_types = {}
+        for row in queryset.values('warehouse', 'stored', 'item_type').annotate(count=Count('id')).order_by():
+            conveyors.setdefault(row['warehouse'], [0] * COMPLETED)[row['stored']] += row['count']
+            types = item_types.setdefault(row['warehouse'], {})
+            types[row['item_type']] = types.get(row['item_type'], 0) + row['count']
+
+        with self.lock:
+            for warehouse in self.tracked:
+                conveyors[warehouse] = self.conveyors[warehouse]
+                item_types[warehouse] = self.item_types[warehouse]
+            self.conveyors = conveyors
+            self.item_types = item_types
+
+    def ensure(self):
+        # Warehouses that are not tracked here are changed by other processes, they are counted again once per cycle
+        if self.replaying:
+            return
+
+        current = cycle.current()
+        if current is not None and current is self.cycle:
+            return
+        self.refresh()
+        self.cycle = current
+
+    def changed(self, warehouse_state, item_type, src, dest):
+        warehouse = warehouse_state.warehouse
+        with self.lock:
+            if item_type is None:
+                counts = [0] * COMPLETED
+                types = {}
+                for stored, conveyor in enumerate(warehouse_state.conveyors):
+                    for item in conveyor:
+                        counts[stored] += 1
+                        types[item.item_type] = types.get(item.item_type, 0) + 1
+                self.conveyors[warehouse] = counts
+                self.item_types[warehouse] = types
+                self.tracked.add(warehouse)
+                return
+
+        self.move(warehouse, item_type, src, dest)
+
+    def move(self, warehouse, item_type, src, dest):
+        # src is None for a new item
+        with self.lock:
+            counts = self.conveyors.setdefault(warehouse, [0] * COMPLETED)
+            types = self.item_types.setdefault(warehouse, {})
+            if src is None:
+                counts[dest] += 1
+                types[item_type] = types.get(item_type, 0) + 1
+                return
+
+            counts[src] -= 1
+            if dest == COMPLETED:
+                types[item_type] = types.get(item_type, 0) - 1
+            else:
+                counts[dest] += 1
+
+    def clear(self, warehouse):
+        with self.lock:
+            self.conveyors[warehouse] = [0] * COMPLETED
+            self.item_types[warehouse] = {}
+            self.tracked.add(warehouse)
+
+    def offline(self):
+        # Only move and clear change the counters from now on, for replaying a recorded trace
+        with self.lock:
+            self.conveyors = {}
+            self.item_types = {}
+            self.replaying = True
+
+    @staticmethod
+    def selected(table, warehouse):
+        # All warehouses, or only one of them
+        if warehouse is None:
+            return list(table.values())
+        return [table[warehouse]] if warehouse in table else []
+
+    def max_conveyor(self, warehouse=None):
+        with self.lock:
+            return max((max(counts) for counts in self.selected(self.conveyors, warehouse)), default=0)
+
+    def conveyor(self, stored, warehouse=None):
+        with self.lock:
+            return sum(counts[stored] for counts in self.selected(self.conveyors, warehouse))
+
+    def total(self, warehouse=None):
+        with self.lock:
+            return sum(sum(types.values()) for types in self.selected(self.item_types, warehouse))
+
+    def count(self, item_types, warehouse=None):
+        with self.lock:
+            return sum(types.get(item_type, 0) for types in self.selected(self.item_types, warehouse)
+                       for item_type in item_types)
+
+    def count_except(self, item_types, warehouse=None):
+        with self.lock:
+            return sum(count for types in self.selected(self.item_types, warehouse)
+                       for item_type, count in types.items() if item_type not in item_types)
+
+
+counters = InventoryCounters()
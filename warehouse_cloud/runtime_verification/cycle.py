@@ -0,0 +1,45 @@
+import datetime
+import threading
+
+from django.db import transaction
+
+local = threading.local()
+
+
+class Cycle:
+    def __init__(self, now=None, snapshot=True):
+        # One verification cycle: a single timestamp, one database snapshot, each event and scope evaluated once
+        self.now = now if now is not None else datetime.datetime.now()
+        self.values = {}
+        self.previous = None
+        # Replayed traces do not read the database
+        self.snapshot = snapshot
+        self.atomic = None
+
+    def __enter__(self):
+        self.previous = getattr(local, 'cycle', None)
+        local.cycle = self
+        if self.snapshot:
+            self.atomic = transaction.atomic()
+            self.atomic.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        local.cycle = self.previous
+        if self.atomic is not None:
+            return self.atomic.__exit__(exc_type, exc_value, traceback)
+        return False
+
+    def memoize(self, checked, function):
+        if checked not in self.values:
+            self.values[checked] = function()
+        return self.values[checked]
+
+
+def current():
+    return getattr(local, 'cycle', None)
+
+
+def now():
+    cycle = current()
+    return cycle.now if cycle is not None else datetime.datetime.now()
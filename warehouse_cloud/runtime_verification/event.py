@@ -1,4 +1,5 @@
-from cloud.models import Inventory
+from runtime_verification import cycle
+from runtime_verification.counters import counters
 
 
 class Event:
@@ -6,41 +7,26 @@ class Event:
         self.name = name
 
     def check_hold(self):
-        return False
-
-class InventoryOverEvent(Event):
-    def __init__(self):
-        super().__init__("The number of items is over the capacity")
-
-    def check_hold(self):
-        for i in range(4):
-            items = Inventory.objects.filter(stored=i)
-            if len(items) > 5:
-                return True
+        # Evaluated once per verification cycle, however many properties and scopes ask
+        current = cycle.current()
+        if current is None:
+            return self.hold()
+        return current.memoize(self, self.hold)
 
+    def hold(self):
         return False
 
-class ItemTypeValidEvent(Event):
-    def __init__(self):
-        super().__init__("Items entering the system are one of red, white, yellow, blue")
-
-    def check_hold(self):
-        items = Inventory.objects.filter(stored__lt=4)
-        for item in items:
-            if item.item_type not in [1, 2, 3, 4]:
-                return False
-
-        return True
-
-class ItemNumberEvent(Event):
-    def __init__(self, x):
-        super().__init__("Total number of items in the system reaches ”" + str(x))
-        self.limit = x
-        self.past = False
-
-    def check_hold(self):
-        items = Inventory.objects.filter(stored__lt=4)
-        if len(items) >= self.limit:
-            return True
-
-        return False or self.past
+class CounterEvent(Event):
+    def __init__(self, name, metric, compare, value):
+        # Compiled from a property spec: a comparison on the item counters, shared by every property that uses it
+        super().__init__(name)
+        self.metric = metric
+        self.compare = compare
+        self.value = value
+
+    def hold(self):
+        counters.ensure()
+        current = cycle.current()
+        # Events on the same counter with different bounds read it once per cycle
+        measured = self.metric() if current is None else current.memoize(self.metric, self.metric)
+        return self.compare(measured, self.value)
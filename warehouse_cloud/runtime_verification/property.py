@@ -1,6 +1,4 @@
-import datetime
-
-from runtime_verification import event, scope
+from runtime_verification import cycle, event, scope
 
 
 class Property:
@@ -17,8 +15,7 @@ class Property:
 
     def be_confirmed(self):
         self.is_confirmed = True
-        current_time = datetime.datetime.now()
-        self.confirmedAt = current_time
+        self.confirmedAt = cycle.now()
 
     def check(self):
         if not self.is_confirmed:
@@ -44,10 +41,10 @@ class Absence(Property):
 class BoundedExistence(Property):
     def __init__(self, event: event.Event, scope, target_count, is_most):
         if is_most:
-            super().__init__(scope, event.name + " holds at most " + target_count + " times")
+            super().__init__(scope, event.name + " holds at most " + str(target_count) + " times")
         else:
+            super().__init__(scope, event.name + " holds at least " + str(target_count) + " times")
             self.status = False
-            super().__init__(scope, event.name + " holds at least " + target_count + " times")
 
         self.event = event
         self.target_count = target_count
@@ -80,7 +77,7 @@ class Existence(Property):
 
 class MinimumDuration(Property):
     def __init__(self, event: event.Event, scope, target):
-        super().__init__(scope, event.name + " remains at least " + target)
+        super().__init__(scope, event.name + " remains at least " + str(target))
         self.event = event
         self.target = target
         self.started = None
@@ -88,9 +85,9 @@ class MinimumDuration(Property):
     def evaluate(self):
         if self.event.check_hold():
             if self.started is None:
-                self.started = datetime.datetime.now()
+                self.started = cycle.now()
         elif self.started is not None:
-            current_duration = datetime.datetime.now() - self.started
+            current_duration = cycle.now() - self.started
             if current_duration < self.target:
                 self.status = False
                 self.be_confirmed()
@@ -99,7 +96,7 @@ class MinimumDuration(Property):
 
 class MaximumDuration(Property):
     def __init__(self, event: event.Event, scope, target):
-        super().__init__(scope, event.name + " remains at most " + target)
+        super().__init__(scope, event.name + " remains at most " + str(target))
         self.event = event
         self.target = target
         self.started = None
@@ -107,9 +104,9 @@ class MaximumDuration(Property):
     def evaluate(self):
         if self.event.check_hold():
             if self.started is None:
-                self.started = datetime.datetime.now()
+                self.started = cycle.now()
             else:
-                current_duration = datetime.datetime.now() - self.started
+                current_duration = cycle.now() - self.started
                 if current_duration > self.target:
                     self.status = False
                     self.be_confirmed()
@@ -156,20 +153,20 @@ class Prevention(Property):
 
 class Recurrence(Property):
     def __init__(self, event: event.Event, scope, duration):
-        super().__init__(scope, event.name + " holds repeatedly at most every " + duration)
+        super().__init__(scope, event.name + " holds repeatedly at most every " + str(duration))
         self.event = event
         self.duration = duration
         self.ongoing = False
-        self.recent_hold = datetime.datetime.now()
+        self.recent_hold = cycle.now()
 
     def evaluate(self):
         if self.event.check_hold():
             if not self.ongoing:
                 self.ongoing = True
-            self.recent_hold = datetime.datetime.now()
+            self.recent_hold = cycle.now()
         else:
             self.ongoing = False
-            interval = datetime.datetime.now() - self.recent_hold
+            interval = cycle.now() - self.recent_hold
 
             if interval > self.duration:
                 self.status = False
@@ -1,5 +1,4 @@
-import datetime
-from runtime_verification import event
+from runtime_verification import cycle, event
 
 class Scope:
     def __init__(self, name):
@@ -8,6 +7,13 @@ class Scope:
         self.is_ended = False
 
     def check_hold(self):
+        # A scope shared by several properties gives all of them the same answer within a cycle
+        current = cycle.current()
+        if current is None:
+            return self.hold()
+        return current.memoize(self, self.hold)
+
+    def hold(self):
         return False
 
 
@@ -16,7 +22,7 @@ class AfterScope(Scope):
         super().__init__("After " + event.name)
         self.end_event = event
 
-    def check_hold(self):
+    def hold(self):
         if self.is_started:
             return True
 
@@ -33,7 +39,7 @@ class BeforeScope(Scope):
         self.start_event = event
         self.is_started = True
 
-    def check_hold(self):
+    def hold(self):
         if self.is_ended:
             return False
 
@@ -50,7 +56,7 @@ class BetweenScope(Scope):
         self.start_event = start_event
         self.end_event = end_event
 
-    def check_hold(self):
+    def hold(self):
         if not self.is_started:
             if self.start_event.check_hold():
                 self.is_started = True
@@ -70,7 +76,7 @@ class DuringScope(Scope):
         super().__init__("During " + event.name)
         self.event = event
 
-    def check_hold(self):
+    def hold(self):
         return self.event.check_hold()
 
 
@@ -79,15 +85,15 @@ class GloballyScope(Scope):
         super().__init__("Globally")
         self.is_started = True
 
-    def check_hold(self):
+    def hold(self):
         return True
 
 
 class IntervalScope(Scope):
     def __init__(self, start, end):
-        super().__init__("Interval from " + start + " to " + end)
+        super().__init__("Interval from " + str(start) + " to " + str(end))
         self.start = start
         self.end = end
 
-    def check_hold(self):
-        return self.start <= datetime.datetime.now() <= self.end
+    def hold(self):
+        return self.start <= cycle.now() <= self.end
@@ -0,0 +1,236 @@
+import datetime
+import functools
+import operator
+import re
+
+from runtime_verification import event, property, scope
+from runtime_verification.counters import counters
+from cloud.models import COMPLETED
+
+# A spec file is a list of properties separated by blank lines (or '---'), each a flat 'key: value' block:
+#
+#   name: It is never the case that the number of items is over the capacity
+#   pattern: absence
+#   event: max_conveyor > 5
+#   between: total >= 1
+#   and: total == 0
+#
+# Events compare an item counter with a number: max_conveyor, total, conveyor(stored), items(type, ...) or
+# items_except(type, ...), over all warehouses or the one given by 'warehouse'. Every counter is filled by the same
+# grouped query (or kept in memory by the warehouses of this process), so the number of properties does not add
+# queries. Scopes are 'before', 'after', 'during', 'between' with 'and', 'from' with 'to' (ISO datetimes), and
+# globally when none is given.
+
+EXPRESSION = re.compile(r'^(\w+)(?:\(([\d,\s]*)\))?\s*(<=|>=|==|!=|<|>)\s*(-?\d+)$')
+
+COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+METRICS = {
+    'max_conveyor': (0, counters.max_conveyor),
+    'total': (0, counters.total),
+    'conveyor': (1, counters.conveyor),
+    'items': (None, counters.count),
+    'items_except': (None, counters.count_except),
+}
+
+PATTERNS = {
+    'absence': property.Absence,
+    'universality': property.Universality,
+    'existence': property.Existence,
+    'bounded_existence': property.BoundedExistence,
+    'precedence': property.Precedence,
+    'prevention': property.Prevention,
+    'response': property.Response,
+    'until': property.Until,
+    'minimum_duration': property.MinimumDuration,
+    'maximum_duration': property.MaximumDuration,
+    'recurrence': property.Recurrence,
+}
+
+KEYS = {'name', 'pattern', 'event', 'cause', 'effect', 'until', 'at_most', 'at_least', 'duration', 'warehouse',
+        'before', 'after', 'during', 'between', 'and', 'from', 'to'}
+
+
+class SpecError(ValueError):
+    def __init__(self, line, message):
+        super().__init__('line %d: %s' % (line, message))
+        self.line = line
+
+
+def parse(text):
+    # Returns (line, {key: value}) for each property
+    specs = []
+    current = None
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.split('#', 1)[0].strip()
+        if line == '' or line == '---':
+            current = None
+            continue
+
+        key, separator, value = line.partition(':')
+        key = key.strip()
+        if separator == '' or key not in KEYS:
+            raise SpecError(number, 'expected one of %s, got %r' % (', '.join(sorted(KEYS)), line))
+        if current is None:
+            current = (number, {})
+            specs.append(current)
+        if key in current[1]:
+            raise SpecError(number, '%s is given twice' % key)
+        current[1][key] = value.strip()
+    return specs
+
+
+class Compiler:
+    def __init__(self):
+        # Equal events and scopes compile to the same object, so a cycle evaluates each of them once
+        self.metrics = {}
+        self.events = {}
+        self.scopes = {}
+
+    def metric(self, line, name, arguments, warehouse):
+        if name not in METRICS:
+            raise SpecError(line, 'unknown counter %r' % name)
+        count, function = METRICS[name]
+        if count is not None and len(arguments) != count:
+            raise SpecError(line, '%s takes %d argument(s)' % (name, count))
+        if count is None and len(arguments) == 0:
+            raise SpecError(line, '%s takes at least one item type' % name)
+        if name == 'conveyor' and not 0 <= arguments[0] < COMPLETED:
+            raise SpecError(line, 'conveyor is one of 0 to %d' % (COMPLETED - 1))
+
+        if count is None:
+            arguments = [tuple(arguments)]
+        key = (name, tuple(arguments), warehouse)
+        if key not in self.metrics:
+            self.metrics[key] = functools.partial(function, *arguments, warehouse=warehouse)
+        return self.metrics[key]
+
+    def event(self, line, text, warehouse):
+        match = EXPRESSION.match(text)
+        if match is None:
+            raise SpecError(line, 'expected "counter comparison number", got %r' % text)
+        name, arguments, comparison, value = match.groups()
+        arguments = [int(argument) for argument in arguments.split(',') if argument.strip()] if arguments else []
+
+        metric = self.metric(line, name, arguments, warehouse)
+
+        key = (name, tuple(arguments), comparison, int(value), warehouse)
+        if key not in self.events:
+            if METRICS[name][0] != 0:
+                name += '(%s)' % ', '.join(map(str, arguments))
+            text = '%s %s %s' % (name, comparison, value)
+            if warehouse is not None:
+                text += ' in warehouse %d' % warehouse
+            self.events[key] = event.CounterEvent(text, metric, COMPARISONS[comparison], int(value))
+        return self.events[key]
+
+    def scope(self, line, spec, warehouse):
+        given = [key for key in ('before', 'after', 'during', 'between', 'from') if key in spec]
+        if len(given) > 1:
+            raise SpecError(line, 'only one scope may be given, got %s' % ', '.join(given))
+        if len(given) == 0:
+            kind, key = 'globally', ()
+        elif given[0] == 'between':
+            kind, key = 'between', (self.event(line, spec['between'], warehouse),
+                                    self.event(line, required(line, spec, 'and'), warehouse))
+        elif given[0] == 'from':
+            kind, key = 'interval', (timestamp(line, spec['from']), timestamp(line, required(line, spec, 'to')))
+        else:
+            kind, key = given[0], (self.event(line, spec[given[0]], warehouse),)
+
+        if (kind, key) not in self.scopes:
+            self.scopes[(kind, key)] = {
+                'globally': scope.GloballyScope,
+                'before': scope.BeforeScope,
+                'after': scope.AfterScope,
+                'during': scope.DuringScope,
+                'between': scope.BetweenScope,
+                'interval': scope.IntervalScope,
+            }[kind](*key)
+        return self.scopes[(kind, key)]
+
+    def compile(self, line, spec):
+        pattern = required(line, spec, 'pattern')
+        if pattern not in PATTERNS:
+            raise SpecError(line, 'unknown pattern %r, expected one of %s' % (pattern, ', '.join(sorted(PATTERNS))))
+        warehouse = integer(line, spec['warehouse']) if 'warehouse' in spec else None
+
+        def compiled(key):
+            return self.event(line, required(line, spec, key), warehouse)
+
+        found = self.scope(line, spec, warehouse)
+        if pattern == 'bounded_existence':
+            if ('at_most' in spec) == ('at_least' in spec):
+                raise SpecError(line, 'bounded_existence needs either at_most or at_least')
+            is_most = 'at_most' in spec
+            prop = property.BoundedExistence(compiled('event'), found,
+                                             integer(line, spec['at_most' if is_most else 'at_least']), is_most)
+        elif pattern in ('precedence', 'prevention', 'response'):
+            prop = PATTERNS[pattern](compiled('effect'), compiled('cause'), found)
+        elif pattern == 'until':
+            prop = property.Until(compiled('event'), compiled('until'), found)
+        elif pattern in ('minimum_duration', 'maximum_duration'):
+            prop = PATTERNS[pattern](compiled('event'), found, seconds(line, required(line, spec, 'duration')))
+        elif pattern == 'recurrence':
+            prop = property.Recurrence(compiled('event'), found, seconds(line, required(line, spec, 'duration')))
+        else:
+            prop = PATTERNS[pattern](compiled('event'), found)
+
+        if found.name != 'Globally':
+            prop.name += ' ' + found.name[0].lower() + found.name[1:]
+        if 'name' in spec:
+            prop.name = spec['name']
+        return prop
+
+
+def required(line, spec, key):
+    if key not in spec:
+        raise SpecError(line, '%s is required here' % key)
+    return spec[key]
+
+
+def integer(line, value):
+    try:
+        return int(value)
+    except ValueError:
+        raise SpecError(line, 'expected a number, got %r' % value)
+
+
+def seconds(line, value):
+    try:
+        return datetime.timedelta(seconds=float(value))
+    except ValueError:
+        raise SpecError(line, 'expected seconds, got %r' % value)
+
+
+def timestamp(line, value):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise SpecError(line, 'expected an ISO datetime, got %r' % value)
+
+
+def compile_text(text):
+    compiler = Compiler()
+    properties = []
+    names = set()
+    for line, spec in parse(text):
+        prop = compiler.compile(line, spec)
+        # Checkpoints are stored by name
+        if prop.name in names:
+            raise SpecError(line, 'another property is also named %r' % prop.name)
+        names.add(prop.name)
+        properties.append(prop)
+    return properties
+
+
+def load(path):
+    with open(path, encoding='utf-8') as spec_file:
+        return compile_text(spec_file.read())
@@ -13,4 +13,27 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'warehouse_cloud.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once get_asgi_application has loaded the apps
+from cloud import fastpath, outbox, push
+
+# Messages left in the outbox by a previous run are delivered without waiting for a new one
+outbox.worker.start()
+
+
+async def application(scope, receive, send):
+    # Edge SAS Check polls skip Django and DRF entirely
+    if scope['type'] == 'http' and scope['path'] == fastpath.PATH:
+        await fastpath.handle(scope, receive, send)
+        return
+
+    if scope['type'] == 'websocket':
+        if scope['path'] == push.PATH:
+            await push.serve(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 4004})
+        return
+
+    await django_application(scope, receive, send)
@@ -115,10 +115,8 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 CRONJOBS = [
-    ('* * * * *', 'cloud.rv.run', [10], {}, '>> ' + str(BASE_DIR) + '/cron.log'),
-    ('* * * * *', 'cloud.rv.run', [25], {}, '>> ' + str(BASE_DIR) + '/cron.log'),
-    ('* * * * *', 'cloud.rv.run', [40], {}, '>> ' + str(BASE_DIR) + '/cron.log'),
-    ('* * * * *', 'cloud.rv.run', [55], {}, '>> ' + str(BASE_DIR) + '/cron.log'),
+    ('5 * * * *', 'cloud.timeseries.apply_retention', [], {}, '>> ' + str(BASE_DIR) + '/cron.log'),
+    ('10 * * * *', 'cloud.outbox.purge', [], {}, '>> ' + str(BASE_DIR) + '/cron.log'),
 ]
 
 # Internationalization
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'warehouse_cloud.settings')
 
 application = get_wsgi_application()
+
+# Messages left in the outbox by a previous run are delivered without waiting for a new one
+from cloud import outbox
+
+outbox.worker.start()